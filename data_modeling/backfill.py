@@ -0,0 +1,194 @@
+import asyncio
+import time
+from datetime import datetime, timezone, timedelta
+
+from manifest import INTERVAL_MS
+from profiling import timed
+from scraper import EXCHANGE_ID, INTERVAL, CandleBuffer, FetchStats, exchange_id, page_limit, response_bytes, save_daily_parquet_to_s3, split_by_day
+
+# === CONFIG ===
+CONCURRENCY = 8
+WEIGHT_PER_MINUTE = 4800    # ~80% of binance's 6000/min REQUEST_WEIGHT budget
+BURST_SECONDS = 5           # bucket capacity, in seconds of refill
+KLINES_WEIGHT = 2           # weight of one /api/v3/klines call with limit <= 1000
+MAX_RETRIES = 5
+SPAN_DAYS = 30              # contiguous days fetched as one page walk
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+class TokenBucket:
+    """
+    Shared async rate limiter. Every request takes `cost` tokens; tokens refill
+    continuously at `rate` per second up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_weight_budget(cls, weight_per_minute=WEIGHT_PER_MINUTE, burst_seconds=BURST_SECONDS):
+        rate = weight_per_minute / 60.0
+        return cls(rate, max(rate * burst_seconds, KLINES_WEIGHT))
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, cost=1):
+        # the lock keeps waiters FIFO so one slow acquirer can't be starved
+        async with self._lock:
+            self._refill()
+            if self.tokens < cost:
+                delay = (cost - self.tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self.tokens -= cost
+
+
+def day_bounds(day):
+    since_ts = int(datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc).timestamp() * 1000)
+    return since_ts, since_ts + DAY_MS
+
+
+def make_exchange():
+    # imported here: ccxt.async_support takes ~1s and fake-exchange runs never need it
+    import ccxt.async_support as ccxt_async
+
+    # ccxt's own throttler is off: the token bucket is the only limiter
+    return getattr(ccxt_async, EXCHANGE_ID)({'enableRateLimit': False})
+
+
+@timed()
+async def fetch_range_ohlcv_async(exchange, bucket, symbol, since_ts, until_ts, limit, stats=None,
+                                  interval=INTERVAL):
+    step = INTERVAL_MS[interval]
+    all_candles = CandleBuffer(int((until_ts - since_ts) // step))
+    ts = since_ts
+    retries = 0
+    while ts < until_ts:
+        await bucket.acquire(KLINES_WEIGHT)
+        try:
+            candles = await exchange.fetch_ohlcv(symbol, timeframe=interval, since=ts, limit=limit)
+        except Exception as e:
+            retries += 1
+            print(f"[Error] {symbol} @ {datetime.fromtimestamp(ts / 1000, timezone.utc)} : {e}")
+            if retries > MAX_RETRIES:
+                raise
+            await asyncio.sleep(min(2 ** retries * 0.5, 30))
+            continue
+        retries = 0
+        if stats is not None:
+            stats.add_page(candles, response_bytes(exchange))
+        if not candles:
+            break
+        all_candles.extend(candles, until_ts)
+        ts = candles[-1][0] + step
+        if len(candles) < limit:
+            # a short page means the exchange has nothing newer yet
+            break
+    return all_candles
+
+
+async def _worker(exchange, bucket, queue, on_day, results, manifest, limit):
+    stats = results['stats']
+    while True:
+        symbol, first_day, last_day = await queue.get()
+        try:
+            since_ts, _ = day_bounds(first_day)
+            _, until_ts = day_bounds(last_day)
+            candles = await fetch_range_ohlcv_async(exchange, bucket, symbol, since_ts, until_ts, limit, stats)
+            for day, day_candles in split_by_day(candles, first_day, last_day):
+                # parquet encoding is CPU/disk bound, keep it off the event loop
+                await asyncio.to_thread(on_day, symbol, day.isoformat(), day_candles)
+                if manifest is not None:
+                    manifest.record_candles(exchange_id(), INTERVAL, symbol, day.isoformat(), day_candles,
+                                            fetched=True)
+                stats.days += 1
+                results['done'] += 1
+            results['candles'] += len(candles)
+        except Exception as e:
+            print(f"[❌ Failed] {symbol} {first_day}..{last_day} : {e}")
+            results['failed'].append((symbol, first_day, last_day))
+        finally:
+            queue.task_done()
+
+
+def work_items(symbols, start_date, end_date):
+    """(symbol, day) pairs, newest day first like the serial scraper."""
+    items = []
+    for symbol in symbols:
+        day = end_date
+        while day >= start_date:
+            items.append((symbol, day))
+            day -= timedelta(days=1)
+    return items
+
+
+def plan_spans(items, max_days=SPAN_DAYS):
+    """
+    Group (symbol, day) items into (symbol, first_day, last_day) spans of
+    consecutive days, so pages are planned across day edges. Spans are capped
+    at `max_days` to keep enough work items for the worker pool.
+    """
+    by_symbol = {}
+    for symbol, day in items:
+        by_symbol.setdefault(symbol, set()).add(day)
+    spans = []
+    for symbol, days in by_symbol.items():
+        days = sorted(days, reverse=True)
+        last = first = days[0]
+        for day in days[1:]:
+            if day == first - timedelta(days=1) and (last - day).days < max_days:
+                first = day
+                continue
+            spans.append((symbol, first, last))
+            last = first = day
+        spans.append((symbol, first, last))
+    return spans
+
+
+async def run_backfill(symbols, start_date, end_date, exchange=None, concurrency=CONCURRENCY,
+                       bucket=None, on_day=save_daily_parquet_to_s3, items=None, manifest=None):
+    """
+    Fetch every (symbol, day) in [start_date, end_date] with `concurrency`
+    workers sharing one token bucket, handing each finished day to `on_day`.
+    Pass `items` to fetch only a subset (e.g. the manifest's missing days);
+    completed days are recorded in `manifest` when one is given, as soon as
+    `on_day` returns, so only pass it with an on_day that has stored the day
+    by then (UploadPipeline.submit only enqueues: use its on_uploaded
+    instead). Consecutive days are fetched as one span of max-size pages and
+    split afterwards.
+    """
+    own_exchange = exchange is None
+    exchange = exchange or make_exchange()
+    bucket = bucket or TokenBucket.from_weight_budget()
+    limit = page_limit(exchange)
+    queue = asyncio.Queue()
+    for span in plan_spans(items if items is not None else work_items(symbols, start_date, end_date)):
+        queue.put_nowait(span)
+
+    results = {'done': 0, 'candles': 0, 'failed': [], 'seconds': 0.0, 'stats': FetchStats()}
+    started = time.monotonic()
+    workers = [asyncio.create_task(_worker(exchange, bucket, queue, on_day, results, manifest, limit))
+               for _ in range(concurrency)]
+    try:
+        await queue.join()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        if own_exchange:
+            await exchange.close()
+    results['seconds'] = time.monotonic() - started
+    results['rate_limited_seconds'] = bucket.waited
+    print(f"[✅ Backfill] {results['done']} days, {results['candles']} candles, "
+          f"{len(results['failed'])} failed in {results['seconds']:.1f}s")
+    print(f"[📊 Fetch] {results['stats']}")
+    return results
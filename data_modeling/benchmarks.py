@@ -0,0 +1,377 @@
+import argparse
+import asyncio
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+# === CONFIG ===
+SIZES = {'day': 1, 'year': 365, '5y': 1826}
+DEFAULT_SIZES = ['day', 'year']
+SYMBOLS = 3
+START = date(2024, 1, 1)
+CASES = ['imports', 'fetch_day', 'backfill', 'save', 'load', 'features', 'features_ab']
+# the synchronous scraper paces full pages with time.sleep, so it is only timed on one day per symbol
+MAX_DAYS = {'fetch_day': 1, 'imports': 1}
+# cold import of each entry module in a fresh interpreter (best of IMPORT_REPEATS)
+IMPORT_MODULES = ['loader', 'feature_registry', 'features', 'scraper', 'backfill', 'build_features', 'quality']
+IMPORT_REPEATS = 3
+# optional heavy dependencies none of the import cases should pull in
+HEAVY_MODULES = ['ccxt', 'boto3', 'lightgbm', 'sklearn', 'matplotlib']
+# calculate_all_indicators holds every feature at once (~1.4 KB per bar): skip it above this many bars
+FULL_FEATURES_MAX_ROWS = 600_000
+REGRESSION_TOLERANCE = 1.25     # --compare fails when throughput drops below baseline / this
+MINUTE_MS = 60_000
+DAY_MS = 24 * 60 * 60 * 1000
+
+# Every case runs in a fresh spawned process, so peak RSS (ru_maxrss, a
+# high-water mark that never resets) belongs to that case alone. Fixtures are
+# seeded and built before the timed section; `setup_rss_mb` is the RSS after
+# building them, so peak - setup is what the measured code itself added.
+
+
+def synthetic_ohlcv(n_rows, seed=0, start_ms=None, price=30000.0):
+    """Seeded random-walk 1m bars: (int64 timestamps, (5, n) float64 open/high/low/close/volume)."""
+    rng = np.random.default_rng(seed)
+    start_ms = start_ms if start_ms is not None else _day_ms(START)
+    ts = start_ms + np.arange(n_rows, dtype=np.int64) * MINUTE_MS
+    close = price * np.exp(np.cumsum(rng.normal(0, 0.001, n_rows)))
+    open_ = np.r_[price, close[:-1]]
+    wick = np.abs(rng.normal(0, 0.0005, (2, n_rows)))
+    high = np.maximum(open_, close) * (1 + wick[0])
+    low = np.minimum(open_, close) * (1 - wick[1])
+    volume = rng.exponential(10.0, n_rows)
+    return ts, np.vstack([open_, high, low, close, volume])
+
+
+def synthetic_frame(n_rows, seed=0, symbol='BTC/USDT'):
+    """synthetic_ohlcv as the DataFrame TechnicalIndicators takes."""
+    ts, values = synthetic_ohlcv(n_rows, seed=seed)
+    return pd.DataFrame({'timestamp': ts.astype('datetime64[ms]'), 'open': values[0], 'high': values[1],
+                         'low': values[2], 'close': values[3], 'volume': values[4], 'symbol': symbol})
+
+
+def _day_ms(day):
+    return int(datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _symbols(n):
+    return [f'SYM{i}/USDT' for i in range(n)]
+
+
+def _rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _fixture_rows(days, symbols):
+    rows = {}
+    for i, symbol in enumerate(symbols):
+        ts, values = synthetic_ohlcv(days * 1440, seed=i)
+        rows[symbol] = [[t, *bar] for t, bar in zip(ts.tolist(), values.T.tolist())]
+    return rows
+
+
+def _day_buffers(days, symbols):
+    from scraper import CandleBuffer
+
+    out = []
+    for i, symbol in enumerate(symbols):
+        ts, values = synthetic_ohlcv(days * 1440, seed=i)
+        for k in range(days):
+            buf = CandleBuffer(1440)
+            buf.size = 1440
+            buf.timestamp[:] = ts[k * 1440:(k + 1) * 1440]
+            buf.values[:] = values[:, k * 1440:(k + 1) * 1440]
+            out.append((symbol, (START + timedelta(days=k)).isoformat(), buf))
+    return out
+
+
+# === CASES ===
+# each returns (timed seconds, items processed, unit, details) and records setup RSS via `setup`
+_IMPORT_PROBE = '''
+import json, resource, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{'seconds': seconds, 'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def measure_import(module, repeats=IMPORT_REPEATS):
+    """Wall time, peak RSS and heavy dependencies loaded by `import module` in a fresh interpreter."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, '-c', _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                             capture_output=True, text=True, cwd=here, check=True).stdout
+        runs.append(json.loads(out.splitlines()[-1]))
+    best = min(runs, key=lambda r: r['seconds'])
+    rss_mb = best['rss_kb'] / 1024 ** 2 if sys.platform == 'darwin' else best['rss_kb'] / 1024
+    return {'seconds': best['seconds'], 'rss_mb': rss_mb, 'heavy': best['heavy']}
+
+
+def bench_imports(days, symbols, tmp, setup):
+    setup()
+    modules = {module: measure_import(module) for module in IMPORT_MODULES}
+    return sum(m['seconds'] for m in modules.values()), len(modules), 'imports', {'modules': modules}
+
+
+def bench_fetch_day(days, symbols, tmp, setup):
+    import scraper
+    from fake_exchange import SyncFakeExchange
+
+    scraper.exchange = SyncFakeExchange(_fixture_rows(days, symbols), id='binance')
+    stats = scraper.FetchStats()
+    setup()
+    started = time.perf_counter()
+    candles = 0
+    for symbol in symbols:
+        for k in range(days):
+            since = _day_ms(START + timedelta(days=k))
+            candles += len(scraper.fetch_day_ohlcv(symbol, since, since + DAY_MS, stats))
+    return time.perf_counter() - started, candles, 'candles', {'requests': stats.requests}
+
+
+def bench_backfill(days, symbols, tmp, setup):
+    from backfill import TokenBucket, run_backfill
+    from fake_exchange import FakeExchange
+    from scraper import save_daily_parquet_to_s3
+
+    exchange = FakeExchange(_fixture_rows(days, symbols), id='binance')
+    on_day = partial(_save_flat, save_daily_parquet_to_s3, tmp)
+    setup()
+    started = time.perf_counter()
+    results = asyncio.run(run_backfill(symbols, START, START + timedelta(days=days - 1), exchange=exchange,
+                                       bucket=TokenBucket(1e9, 1e9), on_day=on_day))
+    return time.perf_counter() - started, results['candles'], 'candles', {
+        'requests': results['stats'].requests, 'days': results['done'], 'failed': len(results['failed'])}
+
+
+def _save_flat(save, root, symbol, day, candles):
+    save(symbol, day, candles, 'flat', root)
+
+
+def bench_save(days, symbols, tmp, setup):
+    from scraper import save_daily_parquet_to_s3
+
+    buffers = _day_buffers(days, symbols)
+    setup()
+    started = time.perf_counter()
+    for symbol, day, buf in buffers:
+        save_daily_parquet_to_s3(symbol, day, buf, 'flat', tmp)
+    seconds = time.perf_counter() - started
+    nbytes = sum(os.path.getsize(os.path.join(tmp, n)) for n in os.listdir(tmp))
+    return seconds, len(buffers) * 1440, 'candles', {'files': len(buffers), 'mb_written': nbytes / 1e6,
+                                                      'mb_per_second': nbytes / 1e6 / seconds}
+
+
+def bench_load(days, symbols, tmp, setup):
+    from features import get_df_from_local_path
+    from scraper import save_daily_parquet_to_s3
+
+    for symbol, day, buf in _day_buffers(days, symbols):
+        save_daily_parquet_to_s3(symbol, day, buf, 'flat', tmp)
+    setup()
+    started = time.perf_counter()
+    df = get_df_from_local_path(tmp)
+    return time.perf_counter() - started, len(df), 'rows', {'files': days * len(symbols)}
+
+
+def bench_features(days, symbols, tmp, setup):
+    from features import TechnicalIndicators
+
+    frames = [synthetic_frame(days * 1440, seed=i, symbol=symbol) for i, symbol in enumerate(symbols)]
+    setup()
+    groups = dict.fromkeys(TechnicalIndicators.GROUPS, 0.0)
+    full = 0.0
+    started = time.perf_counter()
+    for df in frames:
+        ti = TechnicalIndicators(df)
+        for group in groups:
+            t = time.perf_counter()
+            getattr(ti, f'calculate_{group}')()
+            groups[group] += time.perf_counter() - t
+        if len(df) <= FULL_FEATURES_MAX_ROWS:
+            t = time.perf_counter()
+            ti.calculate_all_indicators()
+            full += time.perf_counter() - t
+    seconds = time.perf_counter() - started
+    details = {'groups_seconds': groups,
+               'calculate_all_seconds': full if days * 1440 <= FULL_FEATURES_MAX_ROWS else None}
+    return seconds, days * 1440 * len(symbols), 'rows', details
+
+
+def _baseline_all(df):
+    from features_baseline import TechnicalIndicators as BaselineIndicators
+
+    # the baseline ran with every warning silenced (fragmented-frame inserts)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return BaselineIndicators(df).calculate_all_indicators()
+
+
+def _block_all(df, dtype=np.float64):
+    from features import TechnicalIndicators
+
+    return TechnicalIndicators(df, dtype=dtype).calculate_all_indicators()
+
+
+# calculate_all_indicators before the registry (per-group frames + pd.concat) against the block writer
+FEATURE_VARIANTS = {'baseline_concat': _baseline_all, 'block_float64': _block_all,
+                    'block_float32': partial(_block_all, dtype=np.float32)}
+
+
+def _traced(func, df):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    out = func(df)
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result_mb = out.memory_usage(deep=False, index=False).sum() / 1e6
+    del out
+    return seconds, peak / 1e6, result_mb
+
+
+def bench_features_ab(days, symbols, tmp, setup):
+    """Time and traced peak memory of each FEATURE_VARIANTS entry on the same frames; throughput is block_float64."""
+    rows = min(days * 1440, FULL_FEATURES_MAX_ROWS)
+    frames = [synthetic_frame(rows, seed=i, symbol=symbol) for i, symbol in enumerate(symbols)]
+    setup()
+    variants = {name: {'seconds': 0.0, 'peak_mb': 0.0, 'result_mb': 0.0} for name in FEATURE_VARIANTS}
+    for df in frames:
+        for name, func in FEATURE_VARIANTS.items():
+            seconds, peak_mb, result_mb = _traced(func, df)
+            v = variants[name]
+            v['seconds'] += seconds
+            v['peak_mb'] = max(v['peak_mb'], peak_mb)
+            v['result_mb'] = max(v['result_mb'], result_mb)
+    block = variants['block_float64']['seconds']
+    details = {'variants': variants, 'rows_per_symbol': rows,
+               'speedup_vs_baseline': variants['baseline_concat']['seconds'] / block if block else None}
+    return block, rows * len(frames), 'rows', details
+
+
+BENCHES = {'imports': bench_imports, 'fetch_day': bench_fetch_day, 'backfill': bench_backfill, 'save': bench_save, 'load': bench_load,
+           'features': bench_features, 'features_ab': bench_features_ab}
+
+
+def run_case(case, size, n_symbols, profile=False):
+    """Run one case in the current process; call through `run_isolated` for a clean RSS reading."""
+    from profiling import PROFILER
+
+    days = min(SIZES[size], MAX_DAYS.get(case, SIZES[size]))
+    symbols = _symbols(n_symbols)
+    marks = {}
+    if profile:
+        PROFILER.enable()
+    with tempfile.TemporaryDirectory() as tmp:
+        seconds, items, unit, details = BENCHES[case](days, symbols, tmp,
+                                                      lambda: marks.setdefault('setup_rss_mb', _rss_mb()))
+    result = {'case': case, 'size': size, 'days': days, 'symbols': n_symbols, 'seconds': seconds,
+              'items': items, 'unit': unit, 'throughput': items / seconds if seconds else 0.0,
+              'setup_rss_mb': marks.get('setup_rss_mb'), 'peak_rss_mb': _rss_mb(), 'details': details}
+    if profile:
+        result['profile'] = PROFILER.report()
+    return result
+
+
+def run_isolated(case, size, n_symbols, profile=False):
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(run_case, case, size, n_symbols, profile).result()
+
+
+def environment():
+    import pandas as pd
+    import pyarrow as pa
+    import talib
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'commit': commit,
+            'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'pyarrow': pa.__version__,
+            'talib': talib.__version__}
+
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Throughput of each case against a previous run's JSON; returns the regressed cases."""
+    previous = {(r['case'], r['size'], r['symbols']): r for r in baseline['results']}
+    regressed = []
+    for r in results:
+        old = previous.get((r['case'], r['size'], r['symbols']))
+        if old is None or not old['throughput']:
+            continue
+        ratio = r['throughput'] / old['throughput']
+        flag = ' ← regression' if ratio < 1 / tolerance else ''
+        print(f"  {r['case']:<10} {r['size']:<5} {ratio:6.2f}x throughput, "
+              f"peak RSS {old['peak_rss_mb']:.0f} → {r['peak_rss_mb']:.0f} MB{flag}")
+        if flag:
+            regressed.append(r)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingestion and feature benchmarks on synthetic fixtures')
+    parser.add_argument('--cases', nargs='*', default=CASES, choices=CASES)
+    parser.add_argument('--sizes', nargs='*', default=DEFAULT_SIZES, choices=list(SIZES))
+    parser.add_argument('--symbols', type=int, default=SYMBOLS)
+    parser.add_argument('--profile', action='store_true', help='include the library profiling spans per case')
+    parser.add_argument('--out', help='write results as JSON here')
+    parser.add_argument('--compare', help='baseline JSON from an earlier run; exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    results = []
+    for case in args.cases:
+        seen = set()
+        for size in args.sizes:
+            days = min(SIZES[size], MAX_DAYS.get(case, SIZES[size]))
+            if days in seen:
+                continue
+            seen.add(days)
+            r = run_isolated(case, size, args.symbols, args.profile)
+            results.append(r)
+            print(f"[⏱️ Bench] {case:<10} {size:<5} {r['items']:>10} {r['unit']:<8} {r['seconds']:8.2f}s "
+                  f"{r['throughput']:12.0f}/s  peak RSS {r['peak_rss_mb']:7.1f} MB "
+                  f"(setup {r['setup_rss_mb']:.1f})")
+            for name, v in r['details'].get('variants', {}).items():
+                print(f"    {name:<16} {v['seconds']:8.2f}s  traced peak {v['peak_mb']:8.1f} MB  "
+                      f"result {v['result_mb']:8.1f} MB")
+    report = {'meta': environment(), 'results': results}
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(results, json.load(f), args.tolerance)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
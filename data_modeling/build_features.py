@@ -0,0 +1,383 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from feature_registry import REGISTRY
+from feature_storage import feature_bytes, to_storage, write_options
+from features import TechnicalIndicators
+from lake import write_atomic
+from loader import DAY_MS, load_ohlcv, to_ms
+from manifest import INTERVAL_MS, day_start_ms, normalize_symbol, parse_partition_key
+from profiling import timed
+from workers import pool_context
+
+# === CONFIG ===
+WORKERS = os.cpu_count() or 1
+# 每个时间块向前多读的K线数; None 表示按所选特征的 lookback + 收敛窗口 (REGISTRY.max_warmup) 决定
+WARMUP_BARS = None
+MAX_TASKS_PER_CHILD = 8         # worker 处理这么多块后重启, 释放内存碎片
+# forkserver 里预先导入的模块; 新 worker (包括重启的) 直接从这个进程 fork, 不用每次重新 import talib/pandas
+WORKER_PRELOAD = ['build_features', 'features', 'feature_registry', 'loader', 'pyarrow.parquet']
+OUTPUT_NAME = 'data.parquet'
+METADATA_KEY = b'crypxo.features'
+OHLCV = ['open', 'high', 'low', 'close', 'volume']
+INTERVAL = '1m'                 # 其他周期先由 resample.py 从1m生成; 预热等一律按该周期的K线根数计
+
+# 输出布局: {out_root}/symbol=BTC-USDT/year=2024/month=01/data.parquet
+# 每个文件的 schema metadata 记录源文件和特征配置的指纹, 重跑时指纹一致就跳过
+HIVE_PARTITION_RE = re.compile(r'symbol=(?P<symbol>[^/]+)/year=(?P<year>\d{4})/(?:month=(?P<month>\d{2})/)?[^/]+$')
+
+
+def _month_start(ts_ms: int) -> int:
+    d = datetime.fromtimestamp(ts_ms / 1000, timezone.utc)
+    return int(datetime(d.year, d.month, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _next_month(ts_ms: int) -> int:
+    d = datetime.fromtimestamp(ts_ms / 1000, timezone.utc)
+    year, month = (d.year + 1, 1) if d.month == 12 else (d.year, d.month + 1)
+    return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def index_sources(src_root, interval: str = INTERVAL) -> Dict[str, List[tuple]]:
+    """
+    symbol (规范化形式) -> [(first_ms, end_ms, path, size, mtime_ns)], 只含 interval 周期的文件
+    支持 lake 的 data.parquet / day-*.parquet 和扁平/嵌套的日文件
+    """
+    index = defaultdict(list)
+    for dirpath, _, filenames in os.walk(src_root):
+        for name in filenames:
+            if not name.endswith('.parquet') or name.startswith('.'):
+                continue
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, src_root).replace(os.sep, '/')
+            key = parse_partition_key(rel)
+            if key is not None:
+                if key[1] != interval:
+                    continue
+                symbol, first = normalize_symbol(key[2]), day_start_ms(key[3])
+                end = first + DAY_MS
+            else:
+                # 压缩后的 lake 文件: 覆盖整月 (或整年)
+                m = HIVE_PARTITION_RE.search(rel)
+                if m is None or ('interval=' in rel and f'interval={interval}/' not in rel):
+                    continue
+                symbol, year = m.group('symbol'), int(m.group('year'))
+                first = int(datetime(year, int(m.group('month') or 1), 1, tzinfo=timezone.utc).timestamp() * 1000)
+                end = _next_month(first) if m.group('month') else \
+                    int(datetime(year + 1, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+            st = os.stat(path)
+            index[symbol].append((first, end, path, st.st_size, st.st_mtime_ns))
+    for files in index.values():
+        files.sort()
+    return dict(index)
+
+
+def select_features(features: Optional[List[str]]) -> List[str]:
+    """
+    features 为 None 时构建全部特征, 但不含 REGISTRY.lookahead() (按整段历史 close 最大值归一化):
+    它们带未来信息, 而且任何新高都会改变所有月份; 需要时显式写出名字
+    """
+    if features is None:
+        lookahead = set(REGISTRY.lookahead())
+        return [name for name in REGISTRY.select(None) if name not in lookahead]
+    return REGISTRY.select(features)
+
+
+def resolve_warmup(features: Optional[List[str]], warmup_bars: Optional[int]) -> int:
+    return REGISTRY.max_warmup(REGISTRY.select(features)) if warmup_bars is None else warmup_bars
+
+
+def history_end(names: List[str], chunk_start: int, range_end: int) -> Optional[int]:
+    """
+    块起点状态 (scan_anchors) 依赖的历史截止时间: global 节点归约到 range_end 之前的全部数据;
+    cumulative 节点只依赖块起点之前的数据, 所以追加新数据不影响旧块; 两者都没有时为 None
+    """
+    if REGISTRY.stateful(names, 'global'):
+        return range_end
+    if REGISTRY.stateful(names, 'cumulative'):
+        return chunk_start
+    return None
+
+
+def config_fingerprint(features: Optional[List[str]], dtype: str, warmup_bars: int,
+                       storage: Optional[str] = None) -> str:
+    names = REGISTRY.select(features)
+    payload = json.dumps({'features': names, 'dtype': dtype, 'warmup_bars': warmup_bars, 'storage': storage})
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def source_fingerprint(files: List[tuple], start_ms: int, end_ms: int) -> str:
+    """与 [start_ms, end_ms) 有交集的源文件的 (路径, 大小, 修改时间) 指纹"""
+    h = hashlib.sha1()
+    for first, end, path, size, mtime_ns in files:
+        if first < end_ms and end > start_ms:
+            h.update(f'{path}|{size}|{mtime_ns}\n'.encode())
+    return h.hexdigest()
+
+
+def output_path(out_root, symbol, chunk_start_ms) -> str:
+    d = datetime.fromtimestamp(chunk_start_ms / 1000, timezone.utc)
+    return os.path.join(out_root, f'symbol={normalize_symbol(symbol)}', f'year={d.year:04d}',
+                        f'month={d.month:02d}', OUTPUT_NAME)
+
+
+def is_up_to_date(path, fingerprint: Dict[str, str]) -> bool:
+    if not os.path.exists(path):
+        return False
+    try:
+        meta = pq.read_schema(path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    return json.loads(meta.get(METADATA_KEY, b'{}')) == fingerprint
+
+
+def scan_anchors(src_root, symbol, files: List[tuple], starts: List[int], end_ms: Optional[int] = None,
+                 features: Optional[List[str]] = None, interval: str = INTERVAL) -> Dict[int, Dict]:
+    """
+    分块计算前的一遍顺序扫描, 只读 state 节点用到的列, 内存按月有界
+
+    'global' 节点 (如 _CLOSE_MAX) 对 end_ms 之前的整段历史归约; 'cumulative' 节点 (AD/OBV) 记录
+    每个块起点 (starts 中每个时间戳之后的第一根K线) 上的整段历史累积值, 供 compute_chunk 平移
+
+    返回 {start_ms: {'global': {name: value}, 'cumulative': {name: [ts_ms, value]}}}, 无 state 节点时为 {}
+    """
+    names = REGISTRY.select(features)
+    reductions, cumulative = REGISTRY.stateful(names, 'global'), REGISTRY.stateful(names, 'cumulative')
+    if not reductions and not cumulative:
+        return {}
+    columns = sorted({name for f in reductions + cumulative for name in f.inputs})
+    partials = {f.outputs[0]: [] for f in reductions}
+    totals: Dict[str, float] = {}
+    anchors = {start: {'global': {}, 'cumulative': {}} for start in starts}
+    previous = None
+    for _, chunk_start, chunk_end in month_chunks(files, None, end_ms):
+        df = load_ohlcv(src_root, symbols=[symbol], start=chunk_start, end=chunk_end, columns=columns,
+                        time_columns=False, interval=interval)
+        if len(df) == 0:
+            continue
+        ts = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+        arrays = {c: np.ascontiguousarray(df[c].to_numpy(), dtype=np.float64) for c in columns}
+        for f in reductions:
+            partials[f.outputs[0]].append(f.compute(*[arrays[c] for c in f.inputs])[0])
+        inside = [s for s in starts if chunk_start <= s < chunk_end]
+        for f in cumulative:
+            name = f.outputs[0]
+            if previous is None:
+                full = f.compute(*[arrays[c] for c in f.inputs])[0]
+            else:
+                # 带上前一块的最后一根K线, 保证第一根的增量 (如 OBV 的涨跌方向) 与整段计算一致
+                values = f.compute(*[np.concatenate([previous[c], arrays[c]]) for c in f.inputs])[0]
+                full = totals[name] + (values[1:] - values[0])
+            totals[name] = full[-1]
+            for start in inside:
+                row = np.searchsorted(ts, start)
+                if row < len(ts):
+                    anchors[start]['cumulative'][name] = [int(ts[row]), float(full[row])]
+        previous = {c: arrays[c][-1:] for c in columns}
+    for f in reductions:
+        value = float(f.func(np.asarray(partials[f.outputs[0]]))) if partials[f.outputs[0]] else np.nan
+        for start in starts:
+            anchors[start]['global'][f.outputs[0]] = value
+    return anchors
+
+
+@timed()
+def compute_chunk(src_root, symbol, start_ms, end_ms, warmup_bars=WARMUP_BARS, features=None,
+                  dtype='float64', anchors: Optional[Dict] = None, interval: str = INTERVAL):
+    """
+    读 [start - warmup, end) 的K线并计算特征, 返回去掉预热部分后的 DataFrame (可能为空)
+
+    anchors: scan_anchors 给出的该块起点的状态; 有了它 global / cumulative 特征与整段计算一致,
+    没有时按块内数据计算
+    """
+    warmup_bars = resolve_warmup(features, warmup_bars)
+    df = load_ohlcv(src_root, symbols=[symbol], start=start_ms - warmup_bars * INTERVAL_MS[interval], end=end_ms,
+                    columns=OHLCV, time_columns=False, interval=interval)
+    df = df[['timestamp'] + OHLCV]
+    if len(df) == 0:
+        return df
+    anchors = anchors or {}
+    result = TechnicalIndicators(df, dtype=np.dtype(dtype)).calculate_all_indicators(
+        features, overrides=anchors.get('global'))
+    ts = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+    for name, (anchor_ts, value) in anchors.get('cumulative', {}).items():
+        # 累积量在块内与整段计算只差一个常数
+        row = np.searchsorted(ts, anchor_ts)
+        if name in result.columns and row < len(ts) and ts[row] == anchor_ts:
+            result[name] = result[name] + (value - float(result[name].iat[row]))
+    return result[ts >= start_ms].reset_index(drop=True)
+
+
+def build_chunk(src_root, out_path, symbol, start_ms, end_ms, warmup_bars, features, dtype, fingerprint,
+                storage=None, anchors=None, interval=INTERVAL):
+    """
+    worker: 计算一个 (symbol, 月) 的特征并写入 out_path
+    storage 为 'dense' / 'sparse' 时按 feature_storage 的紧凑格式写入 (int8 形态, float32 特征)
+    返回 (symbol, start_ms, 行数, 秒)
+    """
+    started = time.monotonic()
+    result = compute_chunk(src_root, symbol, start_ms, end_ms, warmup_bars, features, dtype, anchors, interval)
+    if len(result) == 0:
+        return symbol, start_ms, 0, time.monotonic() - started
+
+    if storage:
+        table = to_storage(result, patterns=storage)
+        options = write_options(table)
+    else:
+        table = pa.Table.from_pandas(result, preserve_index=False)
+        options = {'compression': 'snappy', 'write_statistics': True}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           METADATA_KEY: json.dumps(fingerprint).encode()})
+    write_atomic(table, out_path, **options)
+    return symbol, start_ms, table.num_rows, time.monotonic() - started
+
+
+def month_chunks(files: List[tuple], start_ms: Optional[int] = None, end_ms: Optional[int] = None):
+    """源文件覆盖范围 (与 [start_ms, end_ms) 取交集) 按自然月切分: [(chunk, chunk_start, chunk_end)]"""
+    lo = max(start_ms, files[0][0]) if start_ms is not None else files[0][0]
+    hi = min(end_ms, max(f[1] for f in files)) if end_ms is not None else max(f[1] for f in files)
+    chunks = []
+    chunk = _month_start(lo)
+    while chunk < hi:
+        chunks.append((chunk, max(chunk, lo), min(_next_month(chunk), hi)))
+        chunk = _next_month(chunk)
+    return chunks
+
+
+def plan_tasks(src_root, out_root, symbols=None, start=None, end=None, features=None,
+               dtype='float64', warmup_bars=WARMUP_BARS, force=False, storage=None, interval=INTERVAL):
+    """
+    把 (symbol, 月) 切成任务, 跳过指纹没变的输出; 返回 (tasks, 跳过数)
+    global / cumulative 特征依赖的历史源文件 (history_end) 也计入指纹; 只为需要重算的块扫描
+    scan_anchors, 全部最新时不读数据
+    """
+    index = index_sources(src_root, interval)
+    symbols = [normalize_symbol(s) for s in symbols] if symbols else sorted(index)
+    features = select_features(features)
+    warmup_bars = resolve_warmup(features, warmup_bars)
+    config = config_fingerprint(features, dtype, warmup_bars, storage)
+    start_ms, end_ms = to_ms(start), to_ms(end)
+    warmup_ms = warmup_bars * INTERVAL_MS[interval]
+    needs_global = bool(REGISTRY.stateful(features, 'global'))
+    tasks, skipped = [], 0
+    for symbol in symbols:
+        files = index.get(symbol)
+        if not files:
+            print(f"[⚠️ Features] no source files for {symbol}")
+            continue
+        chunks = month_chunks(files, start_ms, end_ms)
+        if not chunks:
+            continue
+        range_end = chunks[-1][2]
+        stale = []
+        for chunk, chunk_start, chunk_end in chunks:
+            path = output_path(out_root, symbol, chunk)
+            history = history_end(features, chunk_start, range_end)
+            fingerprint = {'config': config,
+                           'source': source_fingerprint(files, chunk_start - warmup_ms, chunk_end),
+                           'start_ms': chunk_start, 'end_ms': chunk_end,
+                           'history': None if history is None else source_fingerprint(files, files[0][0], history)}
+            if not force and is_up_to_date(path, fingerprint):
+                skipped += 1
+            else:
+                stale.append((path, chunk_start, chunk_end, fingerprint))
+        if not stale:
+            continue
+        # global 归约要读到 range_end; 只有 cumulative 时读到最后一个要重算的块即可
+        anchors = scan_anchors(src_root, symbol, files, [c[1] for c in stale],
+                               range_end if needs_global else stale[-1][2], features, interval)
+        for path, chunk_start, chunk_end, fingerprint in stale:
+            tasks.append((src_root, path, symbol, chunk_start, chunk_end, warmup_bars, features, dtype,
+                          fingerprint, storage, anchors.get(chunk_start), interval))
+    return tasks, skipped
+
+
+def build_features(src_root, out_root, symbols=None, start=None, end=None, features=None,
+                   workers=WORKERS, dtype='float64', warmup_bars=WARMUP_BARS, force=False,
+                   max_tasks_per_child=MAX_TASKS_PER_CHILD, storage=None, interval=INTERVAL):
+    """
+    并行构建特征: 每个 (symbol, 月) 一个任务, 由进程池计算并直接写入分区 parquet
+
+    Parameters:
+    src_root: K线 lake 或扁平日文件目录
+    out_root: 特征输出根目录
+    features: 特征名或通配符, None 表示全部 (不含带未来信息的 REGISTRY.lookahead(), 见 select_features)
+    workers: 进程数; 1 时在当前进程内顺序执行
+    force: 忽略指纹, 全部重算
+    storage: None 为普通 float 输出; 'dense' / 'sparse' 为紧凑存储格式, 用 feature_storage.read_features 读回
+    interval: 在哪个周期的K线上计算 (如 '1h'), 只读该周期, 不加载1m历史
+    """
+    started = time.monotonic()
+    tasks, skipped = plan_tasks(src_root, out_root, symbols, start, end, features, dtype, warmup_bars, force,
+                                storage, interval)
+    results = {'built': 0, 'skipped': skipped, 'rows': 0, 'failed': [], 'task_seconds': 0.0}
+
+    def _record(outcome):
+        _, _, rows, seconds = outcome
+        results['built'] += 1
+        results['rows'] += rows
+        results['task_seconds'] += seconds
+
+    if workers <= 1:
+        for task in tasks:
+            _record(build_chunk(*task))
+    else:
+        # forkserver: 与 max_tasks_per_child 兼容, 也不会把父进程的大对象 fork 进 worker
+        ctx = pool_context(WORKER_PRELOAD)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 max_tasks_per_child=max_tasks_per_child) as pool:
+            futures = {pool.submit(build_chunk, *task): task for task in tasks}
+            for future in as_completed(futures):
+                task = futures[future]
+                try:
+                    _record(future.result())
+                except Exception as e:
+                    print(f"[❌ Features] {task[2]} {task[1]} : {e}")
+                    results['failed'].append((task[2], task[3]))
+
+    results['seconds'] = time.monotonic() - started
+    print(f"[🧪 Features] {results['built']} built, {results['skipped']} up to date, "
+          f"{len(results['failed'])} failed, {results['rows']} rows in {results['seconds']:.1f}s "
+          f"({results['task_seconds']:.1f} task-seconds, {workers} workers)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并行构建特征并写入分区 parquet')
+    parser.add_argument('src', help='K线 lake 或日文件目录')
+    parser.add_argument('out', help='特征输出目录')
+    parser.add_argument('--symbols', nargs='*', help='如 BTC/USDT ETH-USDT, 默认全部')
+    parser.add_argument('--start', help='YYYY-MM-DD')
+    parser.add_argument('--end', help='YYYY-MM-DD (不含)')
+    parser.add_argument('--features', nargs='*',
+                        help="特征名或通配符, 如 'SMA_*' RSI 'CDL*'; 默认全部, 但不含 ACOS 等按历史最大值归一化的")
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--float32', action='store_true', help='特征以 float32 存储')
+    parser.add_argument('--warmup-bars', type=int, default=WARMUP_BARS, help='默认按所选特征自动决定')
+    parser.add_argument('--force', action='store_true', help='忽略已有输出, 全部重算')
+    parser.add_argument('--storage', choices=['dense', 'sparse'],
+                        help='紧凑存储: int8 形态列 (dense 每列一个 / sparse 只存命中), float32 特征')
+    parser.add_argument('--report', action='store_true', help='构建后打印每个特征占用的字节数')
+    parser.add_argument('--interval', default=INTERVAL, help="K线周期, 如 5m 1h 1d (需先运行 resample.py)")
+    args = parser.parse_args()
+    build_features(args.src, args.out, args.symbols, args.start, args.end, args.features, args.workers,
+                   'float32' if args.float32 else 'float64', args.warmup_bars, args.force,
+                   storage=args.storage, interval=args.interval)
+    if args.report:
+        print(feature_bytes(args.out).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import warnings
+from typing import Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+TRANSFORMS = ('rank', 'zscore', 'demean', 'winsorize')
+BLOCK_BYTES = 256 * 1024 * 1024     # 每个时间块的 (时间, symbol, 特征) 矩阵的大小上限
+WINSOR_LIMITS = (0.01, 0.99)
+
+
+def _layout(timestamps) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    长表 -> 时间 x symbol 矩阵的下标
+
+    返回 (order, t, j, starts): 按时间排好的行号 order, 第 k 行落在矩阵的 [t[k], j[k]],
+    j 是该行在同一时间戳内的序号 (cumcount); starts[i] 是第 i 个时间戳在 order 中的起点
+    """
+    codes, _ = pd.factorize(timestamps, sort=True)
+    order = np.argsort(codes, kind='stable')
+    t = codes[order]
+    counts = np.bincount(t)
+    starts = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=starts[1:])
+    j = np.arange(len(order)) - starts[t]
+    return order, t, j, starts
+
+
+def _rank_pct(mat: np.ndarray) -> np.ndarray:
+    """沿 axis=1 的百分比排名, 并列取平均名次, 与 pandas rank(pct=True) 一致"""
+    order = np.argsort(mat, axis=1, kind='stable')      # NaN 排在最后
+    ranked = np.take_along_axis(mat, order, axis=1)
+    n = mat.shape[1]
+    idx = np.broadcast_to(np.arange(n).reshape(1, n, 1), mat.shape)
+    # 每个并列段的首尾位置
+    new_run = np.ones(mat.shape, dtype=bool)
+    new_run[:, 1:] = ranked[:, 1:] != ranked[:, :-1]
+    first = np.maximum.accumulate(np.where(new_run, idx, 0), axis=1)
+    end_run = np.ones(mat.shape, dtype=bool)
+    end_run[:, :-1] = new_run[:, 1:]
+    last = np.flip(np.minimum.accumulate(np.flip(np.where(end_run, idx, n - 1), axis=1), axis=1), axis=1)
+    avg = (first + last) / 2.0 + 1.0
+
+    ranks = np.empty_like(mat)
+    np.put_along_axis(ranks, order, avg, axis=1)
+    valid = ~np.isnan(mat)
+    count = valid.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(valid, ranks / count, np.nan)
+
+
+def _zscore(mat: np.ndarray) -> np.ndarray:
+    """(x - mean) / std (ddof=1); std 不大于0 (含只有一个有效值) 的截面整体为 0"""
+    count = (~np.isnan(mat)).sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(mat, axis=1, keepdims=True) / count
+        std = np.sqrt(np.nansum((mat - mean) ** 2, axis=1, keepdims=True) / (count - 1))
+        z = (mat - mean) / std
+    return np.where(std > 0, z, 0.0)
+
+
+def _demean(mat: np.ndarray) -> np.ndarray:
+    count = (~np.isnan(mat)).sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return mat - np.nansum(mat, axis=1, keepdims=True) / count
+
+
+def _winsorize(mat: np.ndarray, limits: Tuple[float, float]) -> np.ndarray:
+    """按截面分位数截尾 (线性插值, 与 pandas quantile 一致)"""
+    with warnings.catch_warnings():
+        # 全 NaN 的截面: 分位数为 NaN, 结果也是 NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        lo, hi = np.nanquantile(mat, limits, axis=1, keepdims=True)
+    return np.clip(mat, lo, hi)
+
+
+def cross_section_transform(df: pd.DataFrame, columns: Sequence[str], timestamp_col: str = 'timestamp',
+                            transforms: Sequence[str] = ('rank', 'zscore'),
+                            winsor_limits: Tuple[float, float] = WINSOR_LIMITS,
+                            dtype=np.float64, block_bytes: int = BLOCK_BYTES) -> pd.DataFrame:
+    """
+    横截面变换: 每个时间戳内, 对 columns 中的全部特征同时做 rank / zscore / demean / winsorize
+
+    长表按 (时间, 同一时间内的序号) 放进 时间 x symbol x 特征 的稠密矩阵, 用 NaN 感知的 NumPy
+    沿 symbol 轴计算; 按时间分块处理, 每块矩阵不超过 block_bytes
+
+    Parameters:
+    df: 长表, 每行一个 (timestamp, symbol)
+    columns: 需要变换的特征列
+    transforms: TRANSFORMS 的子集, 输出列名为 f'{col}_{transform}'
+    winsor_limits: winsorize 的上下分位数
+
+    Returns:
+    与 df 同索引的 DataFrame, 列顺序为 [col1_t1, col1_t2, ..., col2_t1, ...]
+    """
+    unknown = [t for t in transforms if t not in TRANSFORMS]
+    if unknown:
+        raise ValueError(f"Unknown transforms: {unknown}")
+    columns = list(columns)
+    n_rows, n_feat = len(df), len(columns)
+    order, t, j, starts = _layout(df[timestamp_col].to_numpy())
+    width = int(j.max()) + 1 if n_rows else 0
+    n_times = len(starts) - 1
+
+    outputs = {name: np.empty((n_rows, n_feat), dtype=dtype, order='F') for name in transforms}
+    block_times = max(1, block_bytes // max(width * n_feat * 8, 1))
+    values = df[columns]
+    for t0 in range(0, n_times, block_times):
+        t1 = min(t0 + block_times, n_times)
+        r0, r1 = starts[t0], starts[t1]
+        rows, bt, bj = order[r0:r1], t[r0:r1] - t0, j[r0:r1]
+        mat = np.full((t1 - t0, width, n_feat), np.nan)
+        mat[bt, bj] = values.iloc[rows].to_numpy(dtype=np.float64, na_value=np.nan)
+        for name in transforms:
+            if name == 'rank':
+                res = _rank_pct(mat)
+            elif name == 'zscore':
+                res = _zscore(mat)
+            elif name == 'demean':
+                res = _demean(mat)
+            else:
+                res = _winsorize(mat, winsor_limits)
+            outputs[name][rows] = res[bt, bj]
+
+    parts = [pd.DataFrame(outputs[name], index=df.index, columns=[f'{c}_{name}' for c in columns], copy=False)
+             for name in transforms]
+    result = pd.concat(parts, axis=1)
+    return result[[f'{c}_{name}' for c in columns for name in transforms]]
@@ -0,0 +1,186 @@
+import asyncio
+import bisect
+import json
+import random
+import time
+
+# === CONFIG ===
+MINUTE_MS = 60_000
+PAGE_LIMIT = 1000
+
+
+def synthetic_candles(since_ts, until_ts, step_ms=MINUTE_MS, price=100.0, seed=0):
+    """Random-walk OHLCV rows in the ccxt [ts, o, h, l, c, v] shape."""
+    rng = random.Random(seed)
+    rows = []
+    for ts in range(since_ts, until_ts, step_ms):
+        open_ = price
+        close = max(open_ * (1 + rng.gauss(0, 0.001)), 1e-8)
+        high = max(open_, close) * (1 + abs(rng.gauss(0, 0.0005)))
+        low = min(open_, close) * (1 - abs(rng.gauss(0, 0.0005)))
+        rows.append([ts, open_, high, low, close, rng.expovariate(1.0) * 10])
+        price = close
+    return rows
+
+
+class FakeExchange:
+    """
+    Local stand-in for a ccxt async exchange that serves canned OHLCV pages.
+
+    `candles` maps symbol -> sorted list of [ts, o, h, l, c, v] rows. Every
+    `fail_every`-th call raises, to exercise the caller's retry path.
+    """
+
+    def __init__(self, candles, page_limit=PAGE_LIMIT, latency=0.0, fail_every=0, id='fake'):
+        self.id = id
+        self.candles = candles
+        self.page_limit = page_limit
+        self.features = {'spot': {'fetchOHLCV': {'limit': page_limit}}}
+        self.latency = latency
+        self.fail_every = fail_every
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._index = {s: [row[0] for row in rows] for s, rows in candles.items()}
+
+    async def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params=None):
+        self.calls += 1
+        call = self.calls
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return self._page(call, symbol, since, limit)
+        finally:
+            self.in_flight -= 1
+
+    def _page(self, call, symbol, since, limit):
+        if self.fail_every and call % self.fail_every == 0:
+            raise ConnectionError(f"fake failure on call {call}")
+        rows = self.candles.get(symbol, [])
+        start = bisect.bisect_left(self._index.get(symbol, []), since or 0)
+        n = min(limit or self.page_limit, self.page_limit)
+        page = [list(row) for row in rows[start:start + n]]
+        self.last_http_response = json.dumps(page)
+        return page
+
+    async def close(self):
+        pass
+
+
+class SyncFakeExchange(FakeExchange):
+    """Blocking variant for the scraper's synchronous fetch path (a plain ccxt exchange)."""
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params=None):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self._page(self.calls, symbol, since, limit)
+
+    def close(self):
+        pass
+
+
+def kline_message(symbol, row, interval='1m', interval_ms=MINUTE_MS, closed=True, event_ms=None):
+    """One combined-stream kline event as Binance sends it (numbers as strings)."""
+    ts, open_, high, low, close, volume = row[:6]
+    stream_symbol = symbol.replace('/', '')
+    return json.dumps({
+        'stream': f"{stream_symbol.lower()}@kline_{interval}",
+        'data': {
+            'e': 'kline', 'E': event_ms if event_ms is not None else ts + interval_ms, 's': stream_symbol,
+            'k': {'t': ts, 'T': ts + interval_ms - 1, 's': stream_symbol, 'i': interval,
+                  'o': repr(open_), 'h': repr(high), 'l': repr(low), 'c': repr(close), 'v': repr(volume),
+                  'x': closed},
+        },
+    })
+
+
+class FakeKlineServer:
+    """
+    Local websocket server speaking Binance's combined-stream kline protocol.
+
+    Replays `candles` (symbol -> rows, all on the same timestamps) at
+    `bars_per_second`: each bar is sent as `updates_per_bar` in-progress
+    updates and then as a closed kline, to every subscribed stream. After
+    `drop_every` closed bars a connection is closed and `skip_bars` bars pass
+    while the client is away, so the client has to gap-fill them over REST
+    (serve the same `candles` with FakeExchange).
+    """
+
+    def __init__(self, candles, bars_per_second=100.0, updates_per_bar=1, drop_every=0, skip_bars=0,
+                 interval='1m', interval_ms=MINUTE_MS, host='127.0.0.1', port=0):
+        self.candles = candles
+        self.timeline = sorted({row[0] for rows in candles.values() for row in rows})
+        self._rows = {s: {row[0]: row for row in rows} for s, rows in candles.items()}
+        self._streams = {f"{s.replace('/', '').lower()}@kline_{interval}": s for s in candles}
+        self.bars_per_second = bars_per_second
+        self.updates_per_bar = updates_per_bar
+        self.drop_every = drop_every
+        self.skip_bars = skip_bars
+        self.interval = interval
+        self.interval_ms = interval_ms
+        self.host = host
+        self.port = port
+        self.position = 0
+        self.connections = 0
+        self.sent = 0
+        self.done = asyncio.Event()
+        self._server = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/stream"
+
+    async def start(self):
+        from websockets.asyncio.server import serve
+
+        self._server = await serve(self._handler, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handler(self, ws):
+        self.connections += 1
+        subscribed = set()
+        subscribed_event = asyncio.Event()
+
+        async def read():
+            async for raw in ws:
+                msg = json.loads(raw)
+                if msg.get('method') == 'SUBSCRIBE':
+                    subscribed.update(self._streams[p] for p in msg['params'] if p in self._streams)
+                    subscribed_event.set()
+                    await ws.send(json.dumps({'result': None, 'id': msg.get('id')}))
+
+        reader = asyncio.create_task(read())
+        try:
+            await subscribed_event.wait()
+            closed_bars = 0
+            delay = 1.0 / self.bars_per_second if self.bars_per_second else 0.0
+            while self.position < len(self.timeline):
+                ts = self.timeline[self.position]
+                for symbol in list(subscribed):
+                    row = self._rows[symbol].get(ts)
+                    if row is None:
+                        continue
+                    for _ in range(self.updates_per_bar):
+                        await ws.send(kline_message(symbol, row, self.interval, self.interval_ms, closed=False))
+                    await ws.send(kline_message(symbol, row, self.interval, self.interval_ms, closed=True))
+                    self.sent += 1
+                self.position += 1
+                closed_bars += 1
+                await asyncio.sleep(delay)
+                if self.drop_every and closed_bars >= self.drop_every and self.position < len(self.timeline):
+                    self.position = min(self.position + self.skip_bars, len(self.timeline) - 1)
+                    await ws.close()
+                    return
+            self.done.set()
+            await reader
+        finally:
+            reader.cancel()
@@ -0,0 +1,222 @@
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import talib
+
+from build_features import (INTERVAL, WARMUP_BARS, compute_chunk, history_end, index_sources, month_chunks,
+                            resolve_warmup, scan_anchors, select_features)
+from feature_registry import REGISTRY
+from lake import write_atomic
+from loader import to_ms
+from manifest import INTERVAL_MS, footer_stats, normalize_symbol
+
+# === CONFIG ===
+MAX_BYTES = 20 * 1024 ** 3      # 缓存总大小上限, 超出后按最近最少使用淘汰
+OBJECTS_DIR = 'objects'
+INDEX_NAME = '_index.sqlite'
+# 缓存内容依赖的全部模块: 指标定义、组装、分块计算 (compute_chunk)、读数和存储格式
+CODE_MODULES = ['feature_registry', 'features', 'cross_section', 'build_features', 'loader', 'feature_storage']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key         TEXT PRIMARY KEY,
+    symbol      TEXT NOT NULL,
+    start_ms    INTEGER NOT NULL,
+    end_ms      INTEGER NOT NULL,
+    size        INTEGER NOT NULL,
+    created     REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access);
+CREATE TABLE IF NOT EXISTS footers (
+    path     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    rows     INTEGER,
+    first_ts INTEGER,
+    last_ts  INTEGER
+);
+"""
+
+
+def code_version(modules: List[str] = CODE_MODULES) -> str:
+    """缓存代码的版本: CODE_MODULES 的源码和 TA-Lib 版本, 任何一处变化都会让旧缓存失效"""
+    h = hashlib.sha256()
+    for name in modules:
+        h.update(name.encode())
+        h.update(inspect.getsource(importlib.import_module(name)).encode())
+    h.update(talib.__version__.encode())
+    return h.hexdigest()
+
+
+class FeatureCache:
+    """
+    内容寻址的特征缓存
+
+    每个 (symbol, 月) 的特征存为 objects/{key[:2]}/{key}.parquet, key 是以下内容的哈希:
+    与该月 (含指标预热窗口) 相交的源分区的 footer 统计 (行数、首尾时间戳、大小), 有 AD/OBV 这类
+    累积特征时再加上该月之前的全部源分区, 特征列表及参数, 以及 code_version(); 任何输入变化都会得到
+    新 key, 旧对象随 LRU 淘汰
+    """
+
+    def __init__(self, root, max_bytes: int = MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, OBJECTS_DIR), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, INDEX_NAME), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+        self.hits = self.misses = self.evictions = 0
+        self._code_version = code_version()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # === 键 ===
+    def _footer(self, path, size, mtime_ns):
+        """源文件的 footer 统计, 按 (路径, 大小, 修改时间) 记忆, 文件不变就不再读 footer"""
+        with self._lock:
+            row = self._conn.execute('SELECT size, mtime_ns, rows, first_ts, last_ts FROM footers WHERE path = ?',
+                                     (path,)).fetchone()
+        if row is not None and row[0] == size and row[1] == mtime_ns:
+            return row[2:]
+        stats = footer_stats(path)
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO footers VALUES (?, ?, ?, ?, ?, ?)',
+                               (path, size, mtime_ns, *stats))
+            self._conn.commit()
+        return stats
+
+    def key(self, files: List[tuple], src_root, start_ms: int, end_ms: int, features: Optional[List[str]],
+            warmup_bars: int, dtype: str, history: Optional[int] = None, interval: str = INTERVAL) -> str:
+        """
+        history: build_features.history_end 给出的截止时间; global / cumulative 特征的块起点状态
+        依赖它之前的全部源文件, 这些文件的 footer 也计入 key
+        """
+        spec = [(f.outputs, f.inputs, {k: repr(v) for k, v in f.params.items()})
+                for f in REGISTRY.plan(REGISTRY.select(features))]
+        h = hashlib.sha256()
+        h.update(json.dumps({'start_ms': start_ms, 'end_ms': end_ms, 'features': REGISTRY.select(features),
+                             'spec': spec, 'warmup_bars': warmup_bars, 'dtype': dtype, 'history': history,
+                             'code': self._code_version}, sort_keys=True).encode())
+        # 不同周期的源文件路径不同, 指纹自然区分
+        read_from = start_ms - warmup_bars * INTERVAL_MS[interval]
+        for first, end, path, size, mtime_ns in files:
+            if (first < end_ms and end > read_from) or (history is not None and first < history):
+                rel = os.path.relpath(path, src_root).replace(os.sep, '/')
+                h.update(json.dumps([rel, size, *self._footer(path, size, mtime_ns)]).encode())
+        return h.hexdigest()
+
+    # === 对象 ===
+    def _object_path(self, key) -> str:
+        return os.path.join(self.root, OBJECTS_DIR, key[:2], f'{key}.parquet')
+
+    def get(self, key) -> Optional[pd.DataFrame]:
+        path = self._object_path(key)
+        with self._lock:
+            known = self._conn.execute('SELECT 1 FROM entries WHERE key = ?', (key,)).fetchone()
+        if known is None or not os.path.exists(path):
+            self.misses += 1
+            return None
+        with self._lock:
+            self._conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+            self._conn.commit()
+        self.hits += 1
+        return pq.read_table(path).to_pandas()
+
+    def put(self, key, df: pd.DataFrame, symbol: str, start_ms: int, end_ms: int):
+        path = self._object_path(key)
+        write_atomic(pa.Table.from_pandas(df, preserve_index=False), path, compression='snappy')
+        now = time.time()
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                               (key, symbol, start_ms, end_ms, os.path.getsize(path), now, now))
+            self._conn.commit()
+        self.evict(keep=key)
+
+    def evict(self, keep: Optional[str] = None):
+        """总大小超过 max_bytes 时, 从最久未访问的对象开始删除"""
+        with self._lock:
+            total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self._conn.execute('SELECT key, size FROM entries ORDER BY last_access').fetchall()
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                try:
+                    os.remove(self._object_path(key))
+                except FileNotFoundError:
+                    pass
+                self._conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+                total -= size
+                self.evictions += 1
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions, 'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes}
+
+
+def load_features(src_root, cache: FeatureCache, symbols: Optional[List[str]] = None, start=None, end=None,
+                  features: Optional[List[str]] = None, warmup_bars: int = WARMUP_BARS,
+                  dtype: str = 'float64', interval: str = INTERVAL) -> pd.DataFrame:
+    """
+    带缓存的特征加载: 按 (symbol, 月) 查缓存, 只重算输入变了的月份 (追加数据时通常只有最后一个月,
+    以及预热窗口跨进来的下一个月); features 为 None 时同 build_features, 不含 REGISTRY.lookahead()
+
+    返回 (symbol, timestamp) 排序的长表, 含 symbol 列; interval 为 '1h' 等时只读 resample.py 生成的该周期K线
+    """
+    index = index_sources(src_root, interval)
+    symbols = [normalize_symbol(s) for s in symbols] if symbols else sorted(index)
+    start_ms, end_ms = to_ms(start), to_ms(end)
+    features = select_features(features)
+    warmup_bars = resolve_warmup(features, warmup_bars)
+    frames = []
+    for symbol in symbols:
+        files = index.get(symbol)
+        if not files:
+            continue
+        chunks = month_chunks(files, start_ms, end_ms)
+        if not chunks:
+            continue
+        keys = [cache.key(files, src_root, chunk_start, chunk_end, features, warmup_bars, dtype,
+                          history_end(features, chunk_start, chunks[-1][2]), interval)
+                for _, chunk_start, chunk_end in chunks]
+        cached = [cache.get(key) for key in keys]
+        # 块起点状态只为未命中的块扫描, 全部命中时不读历史
+        misses = [chunk for chunk, df in zip(chunks, cached) if df is None]
+        scan_end = chunks[-1][2] if REGISTRY.stateful(features, 'global') else (misses[-1][2] if misses else None)
+        anchors = scan_anchors(src_root, symbol, files, [c[1] for c in misses], scan_end, features,
+                               interval) if misses else {}
+        for (_, chunk_start, chunk_end), key, df in zip(chunks, keys, cached):
+            if df is None:
+                df = compute_chunk(src_root, symbol, chunk_start, chunk_end, warmup_bars, features, dtype,
+                                   anchors.get(chunk_start), interval)
+                cache.put(key, df, symbol, chunk_start, chunk_end)
+            if len(df):
+                frames.append(df.assign(symbol=symbol))
+    stats = cache.stats()
+    print(f"[🗄️ FeatureCache] {stats['hits']} hits, {stats['misses']} misses, "
+          f"{stats['entries']} entries, {stats['bytes'] / 1e6:.1f} MB")
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,428 @@
+import math
+import time
+from collections import Counter
+from fnmatch import fnmatchcase
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import talib
+from talib import abstract
+
+from profiling import PROFILER
+
+EPSILON = 1e-14                 # TA-Lib 的 TA_IS_ZERO 阈值
+RAW_INPUTS = ['open', 'high', 'low', 'close', 'volume']
+CONVERGENCE_TOL = 1e-7          # 递归指标的初始状态影响衰减到这个比例以下视为收敛 (约 float32 精度)
+
+# 所有K线形态 (TA-Lib CDL* 函数)
+PATTERN_FUNCTIONS = [
+    'CDL2CROWS', 'CDL3BLACKCROWS', 'CDL3INSIDE', 'CDL3LINESTRIKE',
+    'CDL3OUTSIDE', 'CDL3STARSINSOUTH', 'CDL3WHITESOLDIERS', 'CDLABANDONEDBABY',
+    'CDLADVANCEBLOCK', 'CDLBELTHOLD', 'CDLBREAKAWAY', 'CDLCLOSINGMARUBOZU',
+    'CDLCONCEALBABYSWALL', 'CDLCOUNTERATTACK', 'CDLDARKCLOUDCOVER', 'CDLDOJI',
+    'CDLDOJISTAR', 'CDLDRAGONFLYDOJI', 'CDLENGULFING', 'CDLEVENINGDOJISTAR',
+    'CDLEVENINGSTAR', 'CDLGAPSIDESIDEWHITE', 'CDLGRAVESTONEDOJI', 'CDLHAMMER',
+    'CDLHANGINGMAN', 'CDLHARAMI', 'CDLHARAMICROSS', 'CDLHIGHWAVE',
+    'CDLHIKKAKE', 'CDLHIKKAKEMOD', 'CDLHOMINGPIGEON', 'CDLIDENTICAL3CROWS',
+    'CDLINNECK', 'CDLINVERTEDHAMMER', 'CDLKICKING', 'CDLKICKINGBYLENGTH',
+    'CDLLADDERBOTTOM', 'CDLLONGLEGGEDDOJI', 'CDLLONGLINE', 'CDLMARUBOZU',
+    'CDLMATCHINGLOW', 'CDLMATHOLD', 'CDLMORNINGDOJISTAR', 'CDLMORNINGSTAR',
+    'CDLONNECK', 'CDLPIERCING', 'CDLRICKSHAWMAN', 'CDLRISEFALL3METHODS',
+    'CDLSEPARATINGLINES', 'CDLSHOOTINGSTAR', 'CDLSHORTLINE', 'CDLSPINNINGTOP',
+    'CDLSTALLEDPATTERN', 'CDLSTICKSANDWICH', 'CDLTAKURI', 'CDLTASUKIGAP',
+    'CDLTHRUSTING', 'CDLTRISTAR', 'CDLUNIQUE3RIVER', 'CDLUPSIDEGAP2CROWS',
+    'CDLXSIDEGAP3METHODS'
+]
+
+
+class Feature:
+    """
+    特征图中的一个计算节点: func(*inputs, **params) 得到 outputs (一个或多个数组)
+
+    category 为 None 的节点是中间结果, 只在被依赖时计算, 不出现在输出里
+
+    分块计算用到的元数据:
+    lookback: 第一个有效输出之前需要的K线数, TA-Lib 函数默认取 talib.abstract 的 lookback
+    horizon: 递归指标 (EMA/KAMA/MAMA/HT_*...) 初始状态的影响衰减到 CONVERGENCE_TOL 需要的额外K线数
+    state: None 只依赖窗口内的数据; 'cumulative' 为从第一根K线起的累积量 (AD/OBV), 分块之间差一个常数;
+           'global' 为对整段历史的归约 (如 close 的最大值)
+    """
+
+    def __init__(self, outputs: List[str], inputs: List[str], func: Callable,
+                 category: Optional[str] = None, params: Optional[Dict] = None, kind: str = 'f',
+                 lookback: Optional[int] = None, horizon: int = 0, state: Optional[str] = None):
+        self.outputs = outputs
+        self.inputs = inputs
+        self.func = func
+        self.category = category
+        self.params = params or {}
+        self.kind = kind            # 'f' 浮点, 'i' 整数 (K线形态等)
+        self.lookback = self._talib_lookback() if lookback is None else lookback
+        self.horizon = horizon
+        self.state = state
+
+    def _talib_lookback(self) -> int:
+        name = getattr(self.func, '__name__', None)
+        if name is None or getattr(talib, name, None) is not self.func:
+            return 0
+        function = abstract.Function(name)
+        function.parameters = self.params
+        return function.lookback
+
+    @property
+    def public(self) -> bool:
+        return self.category is not None
+
+    def compute(self, *arrays) -> Tuple[np.ndarray, ...]:
+        values = self.func(*arrays, **self.params)
+        return values if isinstance(values, tuple) else (values,)
+
+    def __repr__(self):
+        return f"Feature({self.outputs} <- {self.inputs}, {self.params})"
+
+
+class FeatureRegistry:
+    """
+    声明式的特征注册表
+
+    每个特征声明输入 (OHLCV 或其它节点的输出)、参数和输出名; 按名称或通配符选择一部分特征时,
+    只计算它们依赖的节点, 共享的中间结果 (如 BBANDS 用到的 SMA_20) 只算一次
+    """
+
+    def __init__(self):
+        self.features: List[Feature] = []
+        self._producer: Dict[str, Feature] = {}
+
+    def register(self, outputs, inputs, func, category=None, kind='f', lookback=None, horizon=0, state=None,
+                 **params) -> Feature:
+        outputs = [outputs] if isinstance(outputs, str) else list(outputs)
+        for name in outputs:
+            if name in self._producer or name in RAW_INPUTS:
+                raise ValueError(f"Duplicate feature name: {name!r}")
+        feature = Feature(outputs, list(inputs), func, category, params, kind, lookback, horizon, state)
+        self.features.append(feature)
+        for name in outputs:
+            self._producer[name] = feature
+        return feature
+
+    def names(self, category: Optional[str] = None) -> List[str]:
+        """全部对外特征名 (注册顺序), 可按类别过滤"""
+        return [name for f in self.features if f.public and (category is None or f.category == category)
+                for name in f.outputs]
+
+    @property
+    def categories(self) -> List[str]:
+        return list(dict.fromkeys(f.category for f in self.features if f.public))
+
+    def select(self, patterns: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        按名称或通配符 ('SMA_*', 'CDL*') 选择特征, 结果按注册顺序去重; None 表示全部
+        """
+        public = self.names()
+        if patterns is None:
+            return public
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        chosen = set()
+        for pattern in patterns:
+            matched = [name for name in public if fnmatchcase(name, pattern)]
+            if not matched:
+                raise KeyError(f"No feature matches {pattern!r}")
+            chosen.update(matched)
+        return [name for name in public if name in chosen]
+
+    def plan(self, names: List[str]) -> List[Feature]:
+        """计算 names 需要的节点: 去重, 依赖在前 (深度优先后序)"""
+        order: List[Feature] = []
+        state: Dict[int, str] = {}
+
+        def visit(feature):
+            if state.get(id(feature)) == 'done':
+                return
+            if state.get(id(feature)) == 'visiting':
+                raise ValueError(f"Dependency cycle at {feature}")
+            state[id(feature)] = 'visiting'
+            for name in feature.inputs:
+                if name in RAW_INPUTS:
+                    continue
+                if name not in self._producer:
+                    raise KeyError(f"Unknown input {name!r} for {feature.outputs}")
+                visit(self._producer[name])
+            state[id(feature)] = 'done'
+            order.append(feature)
+
+        for name in names:
+            visit(self._producer[name])
+        return order
+
+    def producer(self, name: str) -> Feature:
+        return self._producer[name]
+
+    def warmup(self, names: List[str]) -> Dict[str, int]:
+        """
+        每个特征在分块计算时需要的预热K线数: 沿依赖链累加 lookback + horizon
+        (取各输入中最大的一条链)
+        """
+        bars: Dict[int, int] = {}
+        for feature in self.plan(names):
+            upstream = [bars[id(self._producer[name])] for name in feature.inputs if name not in RAW_INPUTS]
+            bars[id(feature)] = max(upstream, default=0) + feature.lookback + feature.horizon
+        return {name: bars[id(self._producer[name])] for name in names}
+
+    def max_warmup(self, names: List[str]) -> int:
+        return max(self.warmup(names).values(), default=0)
+
+    def stateful(self, names: List[str], state: str) -> List[Feature]:
+        """names 的计算计划中 state 为给定值的节点"""
+        return [f for f in self.plan(names) if f.state == state]
+
+    def lookahead(self, names: Optional[List[str]] = None) -> List[str]:
+        """
+        依赖 'global' 节点 (整段历史的归约, 如 _CLOSE_MAX) 的特征: 每根K线的值都用到了之后的数据,
+        不能用于回测, 且任何新数据都可能改变全部历史值
+        """
+        names = self.select(None) if names is None else names
+        return [name for name in names if self.stateful([name], 'global')]
+
+    def layout(self, names: List[str]) -> List[Tuple[str, str]]:
+        """FeatureBlock 的列布局 [(列名, 'f'/'i')]"""
+        return [(name, self._producer[name].kind) for name in names]
+
+    def compute(self, inputs: Dict[str, np.ndarray], names: List[str], out) -> None:
+        """
+        按计划依次计算, 请求的输出写入 out (FeatureBlock 或 dict);
+        中间结果在最后一个使用者算完后立即释放
+
+        inputs 除 OHLCV 外也可以给出中间节点的值 (如分块计算时整段历史的 _CLOSE_MAX),
+        这些节点不再计算
+        """
+        plan = [f for f in self.plan(names) if not all(name in inputs for name in f.outputs)]
+        wanted = set(names)
+        remaining = Counter(name for f in plan for name in f.inputs)
+        cache = dict(inputs)
+        for feature in plan:
+            started = time.perf_counter() if PROFILER.enabled else None
+            values = feature.compute(*[cache[name] for name in feature.inputs])
+            if started is not None:
+                # 按类别汇总, 中间节点 (无类别) 记在 internal 下
+                PROFILER.add(f'features.{feature.category or "internal"}', started)
+            for name in feature.inputs:
+                remaining[name] -= 1
+                if remaining[name] == 0 and name not in inputs:
+                    del cache[name]
+            for name, arr in zip(feature.outputs, values):
+                if name in wanted:
+                    out[name] = arr
+                if remaining[name]:
+                    cache[name] = arr
+
+    def summary(self, names: Optional[List[str]] = None) -> Dict:
+        """特征的元数据摘要, 不做任何计算"""
+        names = self.select(names)
+        plan = self.plan(names)
+        categories = Counter(self._producer[name].category for name in names)
+        return {
+            'total_features': len(names),
+            'feature_categories': {c: categories[c] for c in self.categories if categories[c]},
+            'compute_nodes': len(plan),
+            'shared_intermediates': sorted(name for f in plan if not f.public for name in f.outputs),
+            'features': {name: {'category': self._producer[name].category,
+                                'inputs': self._producer[name].inputs,
+                                'params': self._producer[name].params}
+                         for name in names},
+        }
+
+
+# === 由其它节点派生的特征, 运算顺序与 TA-Lib 内部一致, 结果逐位相同 ===
+def _is_zero(x):
+    return (-EPSILON < x) & (x < EPSILON)
+
+
+def _lag(x, timeperiod):
+    out = np.full_like(x, np.nan)
+    out[timeperiod:] = x[:-timeperiod]
+    return out
+
+
+def _safe_ratio(func, x, y):
+    """func(x, y), y == 0 处为 0 (TA-Lib 的除零约定), NaN 保持 NaN"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(y == 0, 0.0, func(x, y))
+
+
+def _adxr(adx, timeperiod):
+    # ADXR[t] = (ADX[t] + ADX[t - (n-1)]) / 2
+    return (adx + _lag(adx, timeperiod - 1)) / 2.0
+
+
+def _dx(plus_di, minus_di):
+    # DI 之和为 0 时 TA-Lib 沿用上一个 DX, 第一个值为 0
+    total = minus_di + plus_di
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dx = 100.0 * (np.abs(minus_di - plus_di) / total)
+    start = np.argmax(~np.isnan(total)) if (~np.isnan(total)).any() else len(total)
+    hold = _is_zero(total)
+    if start < len(total) and hold[start]:
+        dx[start] = 0.0
+        hold[start] = False
+    idx = np.where(hold, 0, np.arange(len(dx)))
+    return dx[np.maximum.accumulate(idx)]
+
+
+def _natr(atr, close):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(_is_zero(close), 0.0, (atr / close) * 100.0)
+
+
+def _bbands(middle, stddev, nbdev):
+    band = stddev * nbdev
+    return middle + band, middle, middle - band
+
+
+def _ppo(fast, slow):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(_is_zero(slow), 0.0, ((fast - slow) / slow) * 100.0)
+
+
+def _stddev(var):
+    with np.errstate(invalid='ignore'):
+        return np.where(var < EPSILON, 0.0, np.sqrt(var))
+
+
+def _horizon(alpha, stages=1):
+    """平滑系数为 alpha 的递归 (stages 级串联) 收敛到 CONVERGENCE_TOL 需要的K线数"""
+    return stages * math.ceil(math.log(CONVERGENCE_TOL) / math.log(1.0 - alpha))
+
+
+def _ema_horizon(timeperiod, stages=1):
+    return _horizon(2.0 / (timeperiod + 1), stages)
+
+
+def _wilder_horizon(timeperiod, stages=1):
+    return _horizon(1.0 / timeperiod, stages)
+
+
+# Hilbert 变换族: 周期的平滑系数为 0.2, 再加上按周期 (最长 50) 取窗口的部分
+HT_HORIZON = _horizon(0.2, 2) + 50
+# SAR 依赖路径, 没有固定的收敛长度; 两条序列在同一根K线反转后完全一致, 这里取经验值
+SAR_HORIZON = 1000
+
+
+REGISTRY = FeatureRegistry()
+_reg = REGISTRY.register
+HLC = ['high', 'low', 'close']
+OHLC = ['open', 'high', 'low', 'close']
+
+# 1. 重叠研究 (Overlap Studies)
+for _period in [5, 10, 20, 30, 50, 100, 200]:
+    _reg(f'SMA_{_period}', ['close'], talib.SMA, 'overlap_studies', timeperiod=_period)
+    _reg(f'EMA_{_period}', ['close'], talib.EMA, 'overlap_studies', horizon=_ema_horizon(_period),
+         timeperiod=_period)
+    _reg(f'WMA_{_period}', ['close'], talib.WMA, 'overlap_studies', timeperiod=_period)
+# DEMA / TEMA 由 EMA_30 的多次 EMA 组合而成
+_reg('_EMA2_30', ['EMA_30'], talib.EMA, horizon=_ema_horizon(30), timeperiod=30)
+_reg('_EMA3_30', ['_EMA2_30'], talib.EMA, horizon=_ema_horizon(30), timeperiod=30)
+_reg('DEMA_30', ['EMA_30', '_EMA2_30'], lambda e1, e2: (2.0 * e1) - e2, 'overlap_studies')
+_reg('TEMA_30', ['EMA_30', '_EMA2_30', '_EMA3_30'], lambda e1, e2, e3: (3.0 * e1) - (3.0 * e2) + e3,
+     'overlap_studies')
+_reg('TRIMA_30', ['close'], talib.TRIMA, 'overlap_studies', timeperiod=30)
+# KAMA 的平滑系数在 (2/31)^2 和 (2/3)^2 之间, 按最慢的估计
+_reg('KAMA_30', ['close'], talib.KAMA, 'overlap_studies', horizon=_horizon((2.0 / 31) ** 2), timeperiod=30)
+_reg(['MAMA', 'FAMA'], ['close'], talib.MAMA, 'overlap_studies', horizon=HT_HORIZON + _horizon(0.05, 2))
+_reg('MIDPOINT', ['close'], talib.MIDPOINT, 'overlap_studies', timeperiod=14)
+_reg('MIDPRICE', ['high', 'low'], talib.MIDPRICE, 'overlap_studies', timeperiod=14)
+_reg('SAR', ['high', 'low'], talib.SAR, 'overlap_studies', horizon=SAR_HORIZON)
+_reg('TSF', ['close'], talib.TSF, 'overlap_studies', timeperiod=14)
+# BBANDS = SMA_20 ± 2 * STDDEV_20
+_reg('_STDDEV_20', ['close'], talib.STDDEV, timeperiod=20, nbdev=1.0)
+_reg(['BB_UPPER', 'BB_MIDDLE', 'BB_LOWER'], ['SMA_20', '_STDDEV_20'], _bbands, 'overlap_studies', nbdev=2.0)
+_reg('HT_TRENDLINE', ['close'], talib.HT_TRENDLINE, 'overlap_studies', horizon=HT_HORIZON)
+
+# 2. 动量指标 (Momentum Indicators)
+_reg('ADX', HLC, talib.ADX, 'momentum_indicators', horizon=_wilder_horizon(14, 2), timeperiod=14)
+_reg('ADXR', ['ADX'], _adxr, 'momentum_indicators', lookback=13, timeperiod=14)
+# APO / PPO 共用 EMA_12 / EMA_26 (talib 默认 matype=1)
+_reg('_EMA_12', ['close'], talib.EMA, horizon=_ema_horizon(12), timeperiod=12)
+_reg('_EMA_26', ['close'], talib.EMA, horizon=_ema_horizon(26), timeperiod=26)
+_reg('APO', ['_EMA_12', '_EMA_26'], np.subtract, 'momentum_indicators')
+_reg(['AROON_UP', 'AROON_DOWN'], ['high', 'low'], talib.AROON, 'momentum_indicators', timeperiod=14)
+_reg('AROONOSC', ['high', 'low'], talib.AROONOSC, 'momentum_indicators', timeperiod=14)
+_reg('BOP', OHLC, talib.BOP, 'momentum_indicators')
+_reg('CCI', HLC, talib.CCI, 'momentum_indicators', timeperiod=14)
+_reg('CMO', ['close'], talib.CMO, 'momentum_indicators', horizon=_wilder_horizon(14), timeperiod=14)
+_reg('DX', ['PLUS_DI', 'MINUS_DI'], _dx, 'momentum_indicators')
+_reg(['MACD', 'MACD_SIGNAL', 'MACD_HIST'], ['close'], talib.MACD, 'momentum_indicators',
+     horizon=_ema_horizon(26) + _ema_horizon(9), fastperiod=12, slowperiod=26, signalperiod=9)
+_reg('MFI', HLC + ['volume'], talib.MFI, 'momentum_indicators', timeperiod=14)
+_reg('MINUS_DI', HLC, talib.MINUS_DI, 'momentum_indicators', horizon=_wilder_horizon(14), timeperiod=14)
+_reg('MINUS_DM', ['high', 'low'], talib.MINUS_DM, 'momentum_indicators', horizon=_wilder_horizon(14),
+     timeperiod=14)
+# MOM / ROC 家族共用滞后10期的收盘价
+_reg('_CLOSE_LAG_10', ['close'], _lag, lookback=10, timeperiod=10)
+_reg('MOM', ['close', '_CLOSE_LAG_10'], np.subtract, 'momentum_indicators')
+_reg('PLUS_DI', HLC, talib.PLUS_DI, 'momentum_indicators', horizon=_wilder_horizon(14), timeperiod=14)
+_reg('PLUS_DM', ['high', 'low'], talib.PLUS_DM, 'momentum_indicators', horizon=_wilder_horizon(14),
+     timeperiod=14)
+_reg('PPO', ['_EMA_12', '_EMA_26'], _ppo, 'momentum_indicators')
+_reg('ROC', ['close', '_CLOSE_LAG_10'], lambda c, p: _safe_ratio(lambda x, y: ((x / y) - 1.0) * 100.0, c, p),
+     'momentum_indicators')
+_reg('ROCP', ['close', '_CLOSE_LAG_10'], lambda c, p: _safe_ratio(lambda x, y: (x - y) / y, c, p),
+     'momentum_indicators')
+_reg('ROCR', ['close', '_CLOSE_LAG_10'], lambda c, p: _safe_ratio(np.divide, c, p), 'momentum_indicators')
+_reg('ROCR100', ['close', '_CLOSE_LAG_10'], lambda c, p: _safe_ratio(lambda x, y: (x / y) * 100.0, c, p),
+     'momentum_indicators')
+_reg('RSI', ['close'], talib.RSI, 'momentum_indicators', horizon=_wilder_horizon(14), timeperiod=14)
+_reg(['STOCH_K', 'STOCH_D'], HLC, talib.STOCH, 'momentum_indicators')
+_reg(['STOCHF_K', 'STOCHF_D'], HLC, talib.STOCHF, 'momentum_indicators')
+_reg(['STOCHRSI_K', 'STOCHRSI_D'], ['close'], talib.STOCHRSI, 'momentum_indicators',
+     horizon=_wilder_horizon(14), timeperiod=14, fastk_period=5, fastd_period=3)
+_reg('TRIX', ['close'], talib.TRIX, 'momentum_indicators', horizon=_ema_horizon(30, 3), timeperiod=30)
+_reg('ULTOSC', HLC, talib.ULTOSC, 'momentum_indicators')
+_reg('WILLR', HLC, talib.WILLR, 'momentum_indicators', timeperiod=14)
+
+# 3. 成交量指标 (Volume Indicators)
+_reg('AD', HLC + ['volume'], talib.AD, 'volume_indicators', state='cumulative')
+# ADOSC 是 AD 的两条 EMA 之差, 与 AD 的起点无关
+_reg('ADOSC', HLC + ['volume'], talib.ADOSC, 'volume_indicators', horizon=_ema_horizon(10))
+_reg('OBV', ['close', 'volume'], talib.OBV, 'volume_indicators', state='cumulative')
+
+# 4. 波动率指标 (Volatility Indicators)
+_reg('ATR', HLC, talib.ATR, 'volatility_indicators', horizon=_wilder_horizon(14), timeperiod=14)
+_reg('NATR', ['ATR', 'close'], _natr, 'volatility_indicators')
+_reg('TRANGE', HLC, talib.TRANGE, 'volatility_indicators')
+
+# 5. 价格变换 (Price Transform)
+_reg('AVGPRICE', OHLC, talib.AVGPRICE, 'price_transform')
+_reg('MEDPRICE', ['high', 'low'], talib.MEDPRICE, 'price_transform')
+_reg('TYPPRICE', HLC, talib.TYPPRICE, 'price_transform')
+_reg('WCLPRICE', HLC, talib.WCLPRICE, 'price_transform')
+
+# 6. 周期指标 (Cycle Indicators)
+_reg('HT_DCPERIOD', ['close'], talib.HT_DCPERIOD, 'cycle_indicators', horizon=HT_HORIZON)
+_reg('HT_DCPHASE', ['close'], talib.HT_DCPHASE, 'cycle_indicators', horizon=HT_HORIZON)
+_reg(['HT_PHASOR_INPHASE', 'HT_PHASOR_QUAD'], ['close'], talib.HT_PHASOR, 'cycle_indicators', horizon=HT_HORIZON)
+_reg(['HT_SINE', 'HT_LEADSINE'], ['close'], talib.HT_SINE, 'cycle_indicators', horizon=HT_HORIZON)
+_reg('HT_TRENDMODE', ['close'], talib.HT_TRENDMODE, 'cycle_indicators', kind='i', horizon=HT_HORIZON)
+
+# 7. 模式识别 (Pattern Recognition)
+for _pattern in PATTERN_FUNCTIONS:
+    if hasattr(talib, _pattern):  # 某些函数可能不存在
+        _reg(_pattern, OHLC, getattr(talib, _pattern), 'pattern_recognition', kind='i')
+
+# 8. 数学变换 (Math Transform)
+# close / close.max(), 与 pandas 的 Series.max() 一致忽略 NaN; 最大值取整段历史, 分块计算时由外部给出
+_reg('_CLOSE_MAX', ['close'], np.nanmax, state='global')
+_reg('_CLOSE_NORM', ['close', '_CLOSE_MAX'], np.divide)
+for _name in ['ACOS', 'ASIN', 'ATAN', 'CEIL', 'COS', 'COSH', 'EXP', 'FLOOR', 'LN', 'LOG10',
+              'SIN', 'SINH', 'SQRT', 'TAN', 'TANH']:
+    _scaled = _name in ('ACOS', 'ASIN', 'COSH', 'EXP', 'SINH', 'TAN', 'TANH')
+    _reg(_name, ['_CLOSE_NORM' if _scaled else 'close'], getattr(talib, _name), 'math_transform')
+
+# 9. 统计函数 (Statistic Functions)
+_reg('CORREL', ['high', 'low'], talib.CORREL, 'statistic_functions', timeperiod=30)
+_reg('LINEARREG', ['close'], talib.LINEARREG, 'statistic_functions', timeperiod=14)
+_reg('LINEARREG_ANGLE', ['close'], talib.LINEARREG_ANGLE, 'statistic_functions', timeperiod=14)
+_reg('LINEARREG_INTERCEPT', ['close'], talib.LINEARREG_INTERCEPT, 'statistic_functions', timeperiod=14)
+_reg('LINEARREG_SLOPE', ['close'], talib.LINEARREG_SLOPE, 'statistic_functions', timeperiod=14)
+_reg('STDDEV', ['VAR'], _stddev, 'statistic_functions')
+_reg('VAR', ['close'], talib.VAR, 'statistic_functions', timeperiod=5)
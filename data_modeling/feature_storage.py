@@ -0,0 +1,213 @@
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from feature_registry import PATTERN_FUNCTIONS
+from lake import write_atomic
+
+STORAGE_KEY = b'crypxo.storage'
+PATTERN_SCALE = 20              # CDL* 的取值都是 20 的倍数 (±80, ±100, ±200), 除以 20 后放进 int8
+HITS_COLUMN = 'CDL_HITS'        # 稀疏模式下的形态列: 每行一个 list<struct<pattern, value>>
+# 这些列保留 float64: 原始价格, 以及相邻差值有意义的大数值累积量
+KEEP_FLOAT64 = ['open', 'high', 'low', 'close', 'volume', 'AD', 'OBV']
+# 只依赖同一根K线 OHLC 的特征, 可以不存, 读取时重新计算
+DERIVABLE_FEATURES = ['AVGPRICE', 'MEDPRICE', 'TYPPRICE', 'WCLPRICE', 'ATAN', 'CEIL', 'COS', 'FLOOR',
+                      'LN', 'LOG10', 'SIN', 'SQRT']
+COMPRESSION = 'zstd'
+
+
+def _pattern_columns(df: pd.DataFrame) -> List[str]:
+    patterns = set(PATTERN_FUNCTIONS)
+    return [c for c in df.columns if c in patterns]
+
+
+def _sparse_patterns(values: np.ndarray) -> pa.Array:
+    """(行, 形态) 的 int8 矩阵 -> 每行非零形态的 list<struct<pattern: int8, value: int8>>"""
+    rows, cols = np.nonzero(values)
+    offsets = np.zeros(len(values) + 1, dtype=np.int32)
+    np.cumsum(np.bincount(rows, minlength=len(values)), out=offsets[1:])
+    hits = pa.StructArray.from_arrays([pa.array(cols.astype(np.int8)), pa.array(values[rows, cols])],
+                                      names=['pattern', 'value'])
+    return pa.ListArray.from_arrays(pa.array(offsets), hits)
+
+
+def _dense_patterns(hits: pa.ChunkedArray, n_patterns: int) -> np.ndarray:
+    hits = hits.combine_chunks()
+    offsets = hits.offsets.to_numpy()
+    rows = np.repeat(np.arange(len(hits)), np.diff(offsets))
+    flat = hits.flatten()
+    out = np.zeros((len(hits), n_patterns), dtype=np.int8)
+    out[rows, flat.field('pattern').to_numpy()] = flat.field('value').to_numpy()
+    return out
+
+
+def to_storage(df: pd.DataFrame, float32: bool = True, patterns: str = 'dense',
+               drop_derivable: bool = False) -> pa.Table:
+    """
+    特征表转为节省空间的 Arrow 表
+
+    Parameters:
+    float32: 除 KEEP_FLOAT64 以外的浮点特征转为 float32
+    patterns: 'dense' 每个形态一列 int8 (值/PATTERN_SCALE); 'sparse' 所有形态合成一列 CDL_HITS, 只存非零
+    drop_derivable: 不存 DERIVABLE_FEATURES, 读取时由 from_storage 重新计算
+    """
+    if patterns not in ('dense', 'sparse'):
+        raise ValueError(f"Unknown pattern encoding: {patterns}")
+    pattern_cols = _pattern_columns(df)
+    dropped = [c for c in DERIVABLE_FEATURES if c in df.columns] if drop_derivable else []
+    meta = {'pattern_scale': PATTERN_SCALE, 'patterns': pattern_cols, 'pattern_encoding': patterns,
+            'dropped': dropped, 'columns': list(df.columns)}
+
+    pattern_values = None
+    if pattern_cols:
+        raw = df[pattern_cols].to_numpy()
+        if np.any(raw % PATTERN_SCALE):
+            raise ValueError("Pattern values are not multiples of PATTERN_SCALE")
+        pattern_values = (raw // PATTERN_SCALE).astype(np.int8)
+
+    columns: Dict[str, pa.Array] = {}
+    for col in df.columns:
+        if col in dropped:
+            continue
+        if col in pattern_cols:
+            if patterns == 'dense':
+                columns[col] = pa.array(pattern_values[:, pattern_cols.index(col)])
+            elif HITS_COLUMN not in columns:
+                columns[HITS_COLUMN] = _sparse_patterns(pattern_values)
+            continue
+        series = df[col]
+        if float32 and series.dtype == np.float64 and col not in KEEP_FLOAT64:
+            series = series.astype(np.float32)
+        columns[col] = pa.array(series.to_numpy(), from_pandas=True) if series.dtype != object \
+            else pa.array(series)
+    table = pa.table(columns)
+    return table.replace_schema_metadata({STORAGE_KEY: json.dumps(meta).encode()})
+
+
+def write_options(table: pa.Table) -> Dict:
+    """
+    按列类型调整 parquet 编码: 形态/整数/字符串列用字典 + RLE (取值极少, 大段的 0 压成游程),
+    浮点列不用字典 (几乎不重复), 改用 BYTE_STREAM_SPLIT, 配合 zstd 压缩效果更好
+    """
+    dictionary, float_cols = [], []
+    for field in table.schema:
+        if pa.types.is_floating(field.type):
+            float_cols.append(field.name)
+        elif field.name != 'timestamp':
+            dictionary.append(field.name)
+    return {'compression': COMPRESSION, 'use_dictionary': dictionary,
+            'column_encoding': {c: 'BYTE_STREAM_SPLIT' for c in float_cols}, 'write_statistics': True}
+
+
+def write_features(df: pd.DataFrame, path, **storage_options):
+    """to_storage + 调整过编码的原子写入"""
+    table = to_storage(df, **storage_options)
+    write_atomic(table, path, **write_options(table))
+    return table
+
+
+def from_storage(table: pa.Table) -> pd.DataFrame:
+    """
+    还原 to_storage 的编码: 形态列恢复为 int32 的原始取值, 被省略的特征重新计算;
+    float32 特征保持 float32
+    """
+    meta = json.loads((table.schema.metadata or {}).get(STORAGE_KEY, b'{}'))
+    if not meta:
+        return table.to_pandas()
+    patterns, scale = meta['patterns'], meta['pattern_scale']
+    df = table.drop_columns([HITS_COLUMN]).to_pandas() if HITS_COLUMN in table.column_names else table.to_pandas()
+    if patterns and meta['pattern_encoding'] == 'sparse':
+        dense = _dense_patterns(table.column(HITS_COLUMN), len(patterns)).astype(np.int32) * scale
+        df = pd.concat([df, pd.DataFrame(dense, index=df.index, columns=patterns, copy=False)], axis=1)
+    elif patterns:
+        for col in patterns:
+            df[col] = df[col].to_numpy().astype(np.int32) * scale
+    if meta['dropped']:
+        from features import TechnicalIndicators
+
+        df = pd.concat([df, TechnicalIndicators(df).calculate(meta['dropped'])], axis=1)
+    return df[[c for c in meta['columns'] if c in df.columns]]
+
+
+def read_features(path) -> pd.DataFrame:
+    return from_storage(pq.read_table(path))
+
+
+def feature_bytes(path) -> pd.DataFrame:
+    """
+    每列的压缩后 / 压缩前字节数和编码, 按压缩后大小降序
+    path 为目录时汇总其下所有 parquet 文件 (如 build_features 的输出)
+    """
+    if os.path.isdir(path):
+        paths = sorted(os.path.join(d, n) for d, _, names in os.walk(path) for n in names
+                       if n.endswith('.parquet') and not n.startswith('.'))
+    else:
+        paths = [path]
+    rows = {}
+    for path in paths:
+        _column_bytes(pq.ParquetFile(path).metadata, rows)
+    report = pd.DataFrame([{**r, 'encodings': ','.join(sorted(r['encodings']))} for r in rows.values()])
+    report['share'] = report['compressed'] / report['compressed'].sum()
+    return report.set_index('feature').sort_values('compressed', ascending=False)
+
+
+def _column_bytes(meta, rows: Dict):
+    for rg in range(meta.num_row_groups):
+        group = meta.row_group(rg)
+        for i in range(group.num_columns):
+            chunk = group.column(i)
+            name = chunk.path_in_schema.split('.')[0]
+            entry = rows.setdefault(name, {'feature': name, 'compressed': 0, 'uncompressed': 0,
+                                           'type': chunk.physical_type, 'encodings': set()})
+            entry['compressed'] += chunk.total_compressed_size
+            entry['uncompressed'] += chunk.total_uncompressed_size
+            entry['encodings'].update(chunk.encodings)
+
+
+def compare_storage(df: pd.DataFrame, out_dir) -> pd.DataFrame:
+    """同一份特征在默认写法和各存储模式下的文件大小与读取耗时"""
+    os.makedirs(out_dir, exist_ok=True)
+    variants = {
+        'float64 snappy': None,
+        'float32 dense': {'patterns': 'dense'},
+        'float32 sparse': {'patterns': 'sparse'},
+        'float32 sparse -derivable': {'patterns': 'sparse', 'drop_derivable': True},
+    }
+    rows = []
+    for label, options in variants.items():
+        path = os.path.join(out_dir, label.replace(' ', '_') + '.parquet')
+        if options is None:
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path, compression='snappy')
+        else:
+            write_features(df, path, **options)
+        started = time.perf_counter()
+        read_features(path)
+        rows.append({'variant': label, 'mb': os.path.getsize(path) / 1e6,
+                     'load_seconds': time.perf_counter() - started})
+    report = pd.DataFrame(rows).set_index('variant')
+    report['size_ratio'] = report['mb'].iloc[0] / report['mb']
+    return report
+
+
+if __name__ == "__main__":
+    # python feature_storage.py [特征文件或目录]: 给路径时打印每个特征的字节数, 否则在一个月的合成数据上对比各模式
+    pd.set_option('display.width', 160)
+    if len(sys.argv) > 1:
+        print(feature_bytes(sys.argv[1]).to_string())
+    else:
+        import tempfile
+
+        from benchmarks import synthetic_frame
+        from features import TechnicalIndicators
+
+        features = TechnicalIndicators(synthetic_frame(43_200)).calculate_all_indicators()
+        with tempfile.TemporaryDirectory() as tmp:
+            print(compare_storage(features, tmp))
+            print(feature_bytes(os.path.join(tmp, 'float32_sparse_-derivable.parquet')).head(20))
@@ -0,0 +1,139 @@
+import os
+from collections import defaultdict
+from datetime import date
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from manifest import daily_stats, normalize_symbol, parse_partition_key
+from profiling import timed
+
+# === CONFIG ===
+GRANULARITY = 'month'           # 'month' -> .../year=/month=/ , 'year' -> .../year=/
+COMPACTED_NAME = 'data.parquet'
+DELTA_PREFIX = 'day-'
+ROW_GROUP_SIZE = 7 * 1440       # one week of 1m bars per row group
+COMPRESSION = 'snappy'
+PARTITION_COLUMNS = ['symbol', 'exchange', 'interval']
+DATA_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+# Hive-partitioned layout of the parquet lake:
+#   {root}/exchange=binance/interval=1m/symbol=BTC-USDT/year=2024/month=01/data.parquet
+# Partition keys live in the path, so files only carry DATA_COLUMNS. New days land
+# next to data.parquet as small day-YYYY-MM-DD.parquet deltas until compacted.
+
+
+def _as_date(day):
+    return date.fromisoformat(day) if isinstance(day, str) else day
+
+
+def partition_dir(root, exchange_id, interval, symbol, day, granularity=GRANULARITY):
+    day = _as_date(day)
+    parts = [root, f"exchange={exchange_id}", f"interval={interval}",
+             f"symbol={normalize_symbol(symbol)}", f"year={day.year:04d}"]
+    if granularity == 'month':
+        parts.append(f"month={day.month:02d}")
+    return os.path.join(*parts)
+
+
+def daily_file(root, exchange_id, interval, symbol, day, granularity=GRANULARITY):
+    day = _as_date(day)
+    return os.path.join(partition_dir(root, exchange_id, interval, symbol, day, granularity),
+                        f"{DELTA_PREFIX}{day.isoformat()}.parquet")
+
+
+def write_atomic(table, path, **kwargs):
+    """Write to a temp file next to `path` and rename, so readers never see half a file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # dot-prefixed so dataset discovery (ignore_prefixes) skips it mid-write
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp-{os.getpid()}")
+    pq.write_table(table, tmp, **kwargs)
+    os.replace(tmp, path)
+
+
+def _read_data_columns(path):
+    table = pq.read_table(path)
+    table = table.select([c for c in DATA_COLUMNS if c in table.column_names])
+    return table.cast(pa.schema([(c, pa.int64() if c == 'timestamp' else pa.float64()) for c in table.column_names]))
+
+
+def sort_dedupe(table):
+    """Sort by timestamp; on duplicate timestamps the row read last wins."""
+    ts = table.column('timestamp').to_numpy()
+    order = np.argsort(ts, kind='stable')
+    ts = ts[order]
+    keep = np.ones(len(ts), dtype=bool)
+    keep[:-1] = ts[1:] != ts[:-1]
+    return table.take(pa.array(order[keep]))
+
+
+def write_compacted(table, path):
+    write_atomic(
+        table, path,
+        compression=COMPRESSION,
+        row_group_size=ROW_GROUP_SIZE,
+        write_statistics=True,
+        sorting_columns=[pq.SortingColumn(0)],
+    )
+
+
+def _collect_sources(src_root, lake_root, granularity):
+    """Map each target partition dir -> (partition key, [daily source files ordered oldest first])."""
+    groups = defaultdict(dict)
+    for root in {src_root, lake_root}:
+        if root is None or not os.path.isdir(root):
+            continue
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                if not name.endswith('.parquet') or name == COMPACTED_NAME:
+                    continue
+                path = os.path.join(dirpath, name)
+                key = parse_partition_key(os.path.relpath(path, root).replace(os.sep, '/'))
+                if key is None:
+                    continue
+                exchange_id, interval, symbol, day = key
+                target = partition_dir(lake_root, exchange_id, interval, symbol, day, granularity)
+                # keyed by absolute path: src_root may contain lake_root
+                groups[target][os.path.abspath(path)] = (day, path, key)
+    return {target: sorted(files.values()) for target, files in groups.items()}
+
+
+@timed()
+def compact(src_root, lake_root, granularity=GRANULARITY, delete_source=False, manifest=None):
+    """
+    Fold daily parquet files into one sorted, deduplicated file per Hive partition.
+
+    Sources are the flat `{exchange}_{interval}_{symbol}_{day}.parquet` files under
+    `src_root` plus any day-*.parquet deltas already inside `lake_root`. An existing
+    data.parquet is merged, not replaced, so this can run after every backfill.
+    Deltas in the lake are always removed once folded; flat sources only with
+    `delete_source`.
+    """
+    groups = _collect_sources(src_root, lake_root, granularity)
+    written = 0
+    for target, files in sorted(groups.items()):
+        out_path = os.path.join(target, COMPACTED_NAME)
+        tables = [_read_data_columns(out_path)] if os.path.exists(out_path) else []
+        tables += [_read_data_columns(path) for _, path, _ in files]
+        table = sort_dedupe(pa.concat_tables(tables))
+        write_compacted(table, out_path)
+        written += table.num_rows
+
+        if manifest is not None:
+            exchange_id, interval, symbol, _ = files[0][2]
+            manifest.record_many([(exchange_id, interval, symbol, *stats, None, None)
+                                  for stats in daily_stats(table.column('timestamp').to_numpy())])
+        for _, path, _ in files:
+            in_lake = os.path.commonpath([os.path.abspath(path), os.path.abspath(lake_root)]) == os.path.abspath(lake_root)
+            if in_lake or delete_source:
+                os.remove(path)
+    print(f"[🧱 Compact] {len(groups)} partitions, {written} rows → {lake_root}")
+    return len(groups)
+
+
+if __name__ == "__main__":
+    from scraper import LAKE_DIR, LOCAL_TMP_DIR, MANIFEST_PATH
+    from manifest import Manifest
+
+    compact(LOCAL_TMP_DIR, LAKE_DIR, manifest=Manifest(MANIFEST_PATH))
@@ -0,0 +1,173 @@
+import os
+from datetime import date, datetime, timezone
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from profiling import timed
+
+DAY_MS = 24 * 60 * 60 * 1000
+MINUTE_MS = 60_000
+
+# lake 的分区字段; 实际用哪些由目录里出现的 key 决定 (lake.GRANULARITY = 'year' 时没有 month)
+LAKE_PARTITION_SCHEMA = pa.schema([('exchange', pa.string()), ('interval', pa.string()), ('symbol', pa.string()),
+                                   ('year', pa.int16()), ('month', pa.int8())])
+IGNORE_PREFIXES = ('.', '_')
+
+TimeLike = Union[None, int, str, date, datetime, pd.Timestamp]
+
+
+def to_ms(value: TimeLike) -> Optional[int]:
+    """毫秒时间戳 (UTC); 接受 int(ms) / 'YYYY-MM-DD' / date / datetime"""
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize(timezone.utc)
+    return int(ts.timestamp() * 1000)
+
+
+def is_lake(root) -> bool:
+    """Hive分区的lake目录下是 key=value 形式的子目录"""
+    return any('=' in name for name in os.listdir(root))
+
+
+def parquet_files(root):
+    """
+    目录下全部 *.parquet 文件 (跳过 . 和 _ 开头的文件/目录, 如写了一半的临时文件),
+    以及路径里出现过的 Hive 分区 key
+    """
+    files, keys = [], set()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(IGNORE_PREFIXES))
+        keys.update(d.split('=', 1)[0] for d in dirnames if '=' in d)
+        files += [os.path.join(dirpath, name) for name in sorted(filenames)
+                  if name.endswith('.parquet') and not name.startswith(IGNORE_PREFIXES)]
+    return files, keys
+
+
+def open_dataset(root) -> ds.Dataset:
+    """
+    打开数据目录: Hive分区的lake (lake.py) 或者扁平的日文件目录都可以
+    只读 *.parquet, 目录里的 sqlite 等其他文件不影响
+    """
+    files, keys = parquet_files(root)
+    partitioning = None
+    if is_lake(root):
+        partitioning = ds.partitioning(pa.schema([f for f in LAKE_PARTITION_SCHEMA if f.name in keys]),
+                                       flavor='hive')
+    return ds.dataset(files, format='parquet', partitioning=partitioning, partition_base_dir=root)
+
+
+def build_filter(lake: bool, symbols: Optional[List[str]] = None,
+                 start_ms: Optional[int] = None, end_ms: Optional[int] = None, interval: Optional[str] = None,
+                 partition_keys=('year', 'month')):
+    """
+    构造下推过滤条件: 分区字段 (interval / symbol / year / month) 用于跳过整个文件,
+    timestamp 范围用于按 row group 统计信息跳过
+    partition_keys: lake 里实际存在的分区字段; 没有 month 时只按 year 跳过
+    """
+    expr = None
+
+    def _and(e):
+        return e if expr is None else expr & e
+
+    if interval is not None:
+        expr = _and(ds.field('interval') == interval)
+
+    if symbols:
+        # lake路径里的symbol是规范化后的 BTC-USDT, 扁平文件列里是 BTC/USDT
+        values = [s.replace('/', '-') for s in symbols] if lake else [s.replace('-', '/') for s in symbols]
+        expr = _and(ds.field('symbol').isin(values))
+    if start_ms is not None:
+        expr = _and(ds.field('timestamp') >= start_ms)
+    if end_ms is not None:
+        expr = _and(ds.field('timestamp') < end_ms)
+    if lake and 'year' in partition_keys and (start_ms is not None or end_ms is not None):
+        start = datetime.fromtimestamp(start_ms / 1000, timezone.utc) if start_ms is not None else None
+        end = datetime.fromtimestamp((end_ms - 1) / 1000, timezone.utc) if end_ms is not None else None
+        year = ds.field('year').cast(pa.int32())
+        if start is not None:
+            expr = _and(year >= start.year)
+        if end is not None:
+            expr = _and(year <= end.year)
+        if 'month' in partition_keys:
+            # 年分区和月分区混在一起时, 年分区的 month 为 null, 只按 year 过滤
+            month_idx = year * 12 + (ds.field('month').cast(pa.int32()) - 1)
+            no_month = ds.field('month').is_null()
+            if start is not None:
+                expr = _and(no_month | (month_idx >= start.year * 12 + start.month - 1))
+            if end is not None:
+                expr = _and(no_month | (month_idx <= end.year * 12 + end.month - 1))
+    return expr
+
+
+def _is_ordered(symbol_codes: Optional[np.ndarray], ts: np.ndarray) -> bool:
+    """(symbol, timestamp) 是否已经有序, O(n) 检查代替 O(n log n) 排序"""
+    if len(ts) < 2:
+        return True
+    ts_up = ts[1:] >= ts[:-1]
+    if symbol_codes is None:
+        return bool(ts_up.all())
+    same = symbol_codes[1:] == symbol_codes[:-1]
+    return bool((symbol_codes[1:] >= symbol_codes[:-1]).all() and (ts_up | ~same).all())
+
+
+@timed()
+def load_ohlcv(root, symbols: Optional[List[str]] = None, start: TimeLike = None, end: TimeLike = None,
+               columns: Optional[List[str]] = None, time_columns: bool = True,
+               interval: Optional[str] = '1m') -> pd.DataFrame:
+    """
+    基于 pyarrow.dataset 的K线加载器
+
+    Parameters:
+    root: lake根目录或扁平日文件目录
+    symbols: 交易对列表, None 表示全部
+    start, end: 时间范围 [start, end)
+    columns: 需要的列 (timestamp 总会带上), None 表示全部
+    time_columns: 是否附加整数的 tradingDay (距epoch天数) 和 mod (当日分钟数)
+    interval: K线周期, 如 '1h' (由 resample.py 从1m生成); lake里多个周期并存, 默认只读1m.
+              None 表示不过滤 (数据里没有 interval 字段时也不过滤)
+    """
+    dataset = open_dataset(root)
+    start_ms, end_ms = to_ms(start), to_ms(end)
+    if 'interval' not in dataset.schema.names:
+        interval = None
+    expr = build_filter(is_lake(root), symbols, start_ms, end_ms, interval, dataset.schema.names)
+
+    if columns is not None:
+        columns = ['timestamp'] + [c for c in columns if c != 'timestamp']
+        if 'symbol' in dataset.schema.names and 'symbol' not in columns:
+            columns.append('symbol')
+    table = dataset.to_table(columns=columns, filter=expr)
+
+    ts = table.column('timestamp').to_numpy()
+    codes = None
+    if 'symbol' in table.column_names:
+        symbol_col = pc.dictionary_encode(table.column('symbol')).combine_chunks()
+        # 按字母序重新编号, 使得 codes 的顺序与 symbol 排序一致
+        order = np.argsort(np.argsort(symbol_col.dictionary.to_numpy(zero_copy_only=False)))
+        codes = order[symbol_col.indices.to_numpy()] if len(order) > 1 else None
+    if not _is_ordered(codes, ts):
+        keys = [('symbol', 'ascending'), ('timestamp', 'ascending')] if codes is not None \
+            else [('timestamp', 'ascending')]
+        table = table.sort_by(keys)
+        ts = table.column('timestamp').to_numpy()
+
+    df = table.to_pandas()
+    if time_columns:
+        df['tradingDay'] = (ts // DAY_MS).astype(np.int32)
+        df['mod'] = ((ts % DAY_MS) // MINUTE_MS).astype(np.int16)
+    df['timestamp'] = ts.astype('datetime64[ms]')
+    return df
+
+
+def trading_day_to_str(trading_day: pd.Series) -> pd.Series:
+    """整数 tradingDay 转回 'YYYY-MM-DD' 字符串, 只对去重后的天做格式化"""
+    uniques, inverse = np.unique(trading_day.to_numpy(), return_inverse=True)
+    labels = (uniques.astype('datetime64[D]')).astype(str)
+    return pd.Series(labels[inverse], index=trading_day.index, name=trading_day.name)
@@ -0,0 +1,263 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime, timezone, timedelta
+
+import numpy as np
+import pyarrow.parquet as pq
+
+# === CONFIG ===
+DAY_MS = 24 * 60 * 60 * 1000
+INTERVAL_MS = {'1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+               '1h': 3_600_000, '4h': 14_400_000, '1d': DAY_MS}
+# a closed day may miss this share of its bars and still count as complete (short exchange outages)
+MISSING_TOLERANCE = 0.01
+
+# binance_1m_BTC-USDT_2024-01-01.parquet  (flattened s3 key, as written by the scraper)
+FLAT_RE = re.compile(r'^(?P<exchange>[^_/]+)_(?P<interval>[^_/]+)_(?P<symbol>.+)_(?P<day>\d{4}-\d{2}-\d{2})\.parquet$')
+# binance/1m/BTC-USDT/2024-01-01.parquet  (s3 key / nested local layout)
+NESTED_RE = re.compile(r'(?:^|/)(?P<exchange>[^_/]+)/(?P<interval>[^/]+)/(?P<symbol>[^/]+)/(?P<day>\d{4}-\d{2}-\d{2})\.parquet$')
+# exchange=binance/interval=1m/symbol=BTC-USDT/year=2024/month=01/day-2024-01-01.parquet  (hive lake delta)
+HIVE_RE = re.compile(r'exchange=(?P<exchange>[^/]+)/interval=(?P<interval>[^/]+)/symbol=(?P<symbol>[^/]+)/(?:[^/]+/)*day-(?P<day>\d{4}-\d{2}-\d{2})\.parquet$')
+# exchange=binance/interval=1m/symbol=BTC-USDT/year=2024/month=01/data.parquet  (hive lake, compacted)
+HIVE_COMPACTED_RE = re.compile(r'exchange=(?P<exchange>[^/]+)/interval=(?P<interval>[^/]+)/symbol=(?P<symbol>[^/]+)/(?:[^/]+/)*data\.parquet$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS partitions (
+    exchange TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    symbol   TEXT NOT NULL,
+    day      TEXT NOT NULL,
+    rows     INTEGER,
+    first_ts INTEGER,
+    last_ts  INTEGER,
+    size     INTEGER,
+    mtime    REAL,
+    checked  INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (exchange, interval, symbol, day)
+)
+"""
+# re-recording a day keeps its `checked` mark only while the row count is unchanged
+UPSERT = """
+INSERT INTO partitions (exchange, interval, symbol, day, rows, first_ts, last_ts, size, mtime)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (exchange, interval, symbol, day) DO UPDATE SET
+    rows = excluded.rows, first_ts = excluded.first_ts, last_ts = excluded.last_ts,
+    size = excluded.size, mtime = excluded.mtime,
+    checked = CASE WHEN partitions.rows IS excluded.rows THEN partitions.checked ELSE 0 END
+"""
+
+
+def normalize_symbol(symbol):
+    return symbol.replace("/", "-")
+
+
+def parse_partition_key(key):
+    """Return (exchange, interval, symbol, day) for a daily parquet key/filename, else None."""
+    m = HIVE_RE.search(key) or NESTED_RE.search(key) or FLAT_RE.match(os.path.basename(key))
+    if m is None:
+        return None
+    return m.group('exchange'), m.group('interval'), m.group('symbol'), m.group('day')
+
+
+def day_start_ms(day):
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    return int(datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def daily_stats(ts):
+    """(day, rows, first_ts, last_ts) per UTC day for a sorted int64 ms timestamp array."""
+    if len(ts) == 0:
+        return []
+    days = ts // DAY_MS
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    ends = np.r_[starts[1:], len(ts)]
+    return [(datetime.fromtimestamp(int(days[s]) * 86400, timezone.utc).date().isoformat(),
+             int(e - s), int(ts[s]), int(ts[e - 1])) for s, e in zip(starts, ends)]
+
+
+def footer_stats(path):
+    """(rows, first_ts, last_ts) from the parquet footer, without reading any data pages."""
+    meta = pq.read_metadata(path)
+    first_ts, last_ts = None, None
+    ts_idx = meta.schema.names.index('timestamp') if 'timestamp' in meta.schema.names else None
+    if ts_idx is not None:
+        for i in range(meta.num_row_groups):
+            stats = meta.row_group(i).column(ts_idx).statistics
+            if stats is None or not stats.has_min_max:
+                continue
+            first_ts = stats.min if first_ts is None else min(first_ts, stats.min)
+            last_ts = stats.max if last_ts is None else max(last_ts, stats.max)
+    return meta.num_rows, first_ts, last_ts
+
+
+class Manifest:
+    """
+    Persistent index of the daily partitions that are already on disk / in S3.
+
+    One row per (exchange, interval, symbol, day) with the row count and the
+    first/last candle timestamp. A day is complete once it is closed, its last
+    candle reaches the end of the day and it holds all but MISSING_TOLERANCE
+    of its bars; the still-open current day never is. A closed day that falls
+    short (or came back empty) is complete only once `checked`: set when a
+    refetch returns the same row count, i.e. the gap is the exchange's, or
+    by mark_checked.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        # the backfill writes from worker threads, so share one connection behind a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(partitions)")}
+            if 'checked' not in columns:
+                self._conn.execute("ALTER TABLE partitions ADD COLUMN checked INTEGER NOT NULL DEFAULT 0")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM partitions LIMIT 1").fetchone() is None
+
+    def record(self, exchange_id, interval, symbol, day, rows, first_ts=None, last_ts=None, size=None, mtime=None):
+        self.record_many([(exchange_id, interval, normalize_symbol(symbol), day, rows, first_ts, last_ts, size, mtime)])
+
+    def record_candles(self, exchange_id, interval, symbol, day, candles, fetched=False, today=None):
+        """
+        Record one day's candles. `fetched`: they come straight from the
+        exchange, so a closed day whose row count matches the previous record
+        is marked checked and not fetched again.
+        """
+        rows, first_ts, last_ts = (len(candles), candles[0][0], candles[-1][0]) if candles else (0, None, None)
+        entry = (exchange_id, interval, normalize_symbol(symbol), day)
+        today = today or datetime.now(timezone.utc).date()
+        with self._lock:
+            previous = None
+            if fetched and date.fromisoformat(day) < today:
+                previous = self._conn.execute(
+                    "SELECT rows FROM partitions WHERE exchange=? AND interval=? AND symbol=? AND day=?", entry).fetchone()
+            self._conn.execute(UPSERT, (*entry, rows, first_ts, last_ts, None, None))
+            if previous is not None and previous[0] == rows:
+                self._conn.execute("UPDATE partitions SET checked=1 WHERE exchange=? AND interval=? AND symbol=? "
+                                   "AND day=?", entry)
+            self._conn.commit()
+
+    def mark_checked(self, exchange_id, interval, symbol, days):
+        """Accept the recorded bars of `days` as all the exchange has (known outages, delisted pairs)."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE partitions SET checked=1 WHERE exchange=? AND interval=? AND symbol=? AND day=?",
+                [(exchange_id, interval, normalize_symbol(symbol), day) for day in days])
+            self._conn.commit()
+
+    def record_many(self, entries):
+        with self._lock:
+            self._conn.executemany(UPSERT, entries)
+            self._conn.commit()
+
+    def entries(self, exchange_id, interval, symbol):
+        """day -> (rows, first_ts, last_ts, checked)"""
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT day, rows, first_ts, last_ts, checked FROM partitions "
+                "WHERE exchange=? AND interval=? AND symbol=?",
+                (exchange_id, interval, normalize_symbol(symbol)),
+            )
+            return {day: (rows, first_ts, last_ts, bool(checked)) for day, rows, first_ts, last_ts, checked in cur}
+
+    @staticmethod
+    def is_complete(day, interval, rows, last_ts, today, checked=False):
+        if date.fromisoformat(day) >= today:
+            return False
+        if rows is None:
+            # listed without stats (s3 reconciliation)
+            return True
+        if checked:
+            return True
+        step = INTERVAL_MS.get(interval, 60_000)
+        expected = DAY_MS // step
+        if rows < expected - int(expected * MISSING_TOLERANCE):
+            # includes empty days: an exchange error can come back as an empty page
+            return False
+        last_bar = day_start_ms(day) + DAY_MS - step
+        return last_ts is not None and last_ts >= last_bar
+
+    def missing_days(self, exchange_id, interval, symbol, start_date, end_date, today=None):
+        """Days in [start_date, end_date] that still need fetching, newest first."""
+        today = today or datetime.now(timezone.utc).date()
+        known = self.entries(exchange_id, interval, symbol)
+        missing = []
+        day = end_date
+        while day >= start_date:
+            entry = known.get(day.isoformat())
+            if entry is None or not self.is_complete(day.isoformat(), interval, entry[0], entry[2], today, entry[3]):
+                missing.append(day)
+            day -= timedelta(days=1)
+        return missing
+
+    # === RECONCILIATION ===
+    def reconcile_local(self, root):
+        """
+        Rebuild entries from the parquet files under `root`. Files whose size and
+        mtime match the manifest are skipped, so only new footers are parsed.
+        """
+        with self._lock:
+            seen = {(e, i, s, d): (size, mtime) for e, i, s, d, size, mtime in
+                    self._conn.execute("SELECT exchange, interval, symbol, day, size, mtime FROM partitions")}
+        entries = []
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                if not name.endswith('.parquet'):
+                    continue
+                path = os.path.join(dirpath, name)
+                rel = os.path.relpath(path, root).replace(os.sep, '/')
+                compacted = HIVE_COMPACTED_RE.search(rel)
+                if compacted:
+                    # a compacted lake file spans many days: only its timestamp column is read
+                    ts = pq.read_table(path, columns=['timestamp']).column('timestamp').to_numpy()
+                    st = os.stat(path)
+                    entries += [(compacted.group('exchange'), compacted.group('interval'), compacted.group('symbol'),
+                                 *stats, st.st_size, st.st_mtime) for stats in daily_stats(ts)]
+                    continue
+                key = parse_partition_key(rel)
+                if key is None:
+                    continue
+                st = os.stat(path)
+                if seen.get(key) == (st.st_size, st.st_mtime):
+                    continue
+                rows, first_ts, last_ts = footer_stats(path)
+                entries.append((*key, rows, first_ts, last_ts, st.st_size, st.st_mtime))
+        self.record_many(entries)
+        print(f"[🗂️ Manifest] reconciled {len(entries)} local partitions from {root}")
+        return len(entries)
+
+    def reconcile_s3(self, s3, bucket, prefix=''):
+        """
+        Rebuild entries from one paginated list-objects walk over `prefix`
+        (1 request per 1000 keys, instead of a head_object per day). Listings
+        carry no row stats, so objects that exist count as complete days.
+        """
+        with self._lock:
+            seen = {(e, i, s, d): size for e, i, s, d, size in
+                    self._conn.execute("SELECT exchange, interval, symbol, day, size FROM partitions")}
+        entries = []
+        paginator = s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                key = parse_partition_key(obj['Key'])
+                if key is None or seen.get(key) == obj['Size']:
+                    continue
+                entries.append((*key, None, None, None, obj['Size'], obj['LastModified'].timestamp()))
+        self.record_many(entries)
+        print(f"[🗂️ Manifest] reconciled {len(entries)} s3 partitions from s3://{bucket}/{prefix}")
+        return len(entries)
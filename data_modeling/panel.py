@@ -0,0 +1,142 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from loader import DAY_MS, MINUTE_MS, load_ohlcv, to_ms
+
+FIELDS = ['open', 'high', 'low', 'close', 'volume']
+BLOCK_DAYS = 7          # 每次从lake读取的时间块, 控制构建时的内存
+META_NAME = 'meta.json'
+MASK_NAME = 'mask.npy'
+
+
+def list_lake_symbols(lake_root, exchange_id='binance', interval='1m') -> List[str]:
+    """lake中某交易所/周期下的全部 symbol (规范化形式, 如 BTC-USDT)"""
+    base = os.path.join(lake_root, f'exchange={exchange_id}', f'interval={interval}')
+    return sorted(name.split('=', 1)[1] for name in os.listdir(base) if name.startswith('symbol='))
+
+
+def build_panel(lake_root, out_dir, start, end, symbols: Optional[List[str]] = None,
+                fields: List[str] = FIELDS, step_ms: int = MINUTE_MS, dtype=np.float64,
+                exchange_id='binance', interval='1m', block_days: int = BLOCK_DAYS) -> 'Panel':
+    """
+    从lake构建 时间 x symbol 对齐的面板, 每个字段一个 .npy 矩阵, 外加缺失K线掩码
+
+    按 block_days 的时间块读取所有symbol并写入 memmap, 峰值内存只和块大小有关
+    """
+    symbols = [s.replace('/', '-') for s in (symbols or list_lake_symbols(lake_root, exchange_id, interval))]
+    start_ms, end_ms = to_ms(start), to_ms(end)
+    n_rows = (end_ms - start_ms) // step_ms
+    os.makedirs(out_dir, exist_ok=True)
+
+    arrays = {f: np.lib.format.open_memmap(os.path.join(out_dir, f'{f}.npy'), mode='w+',
+                                           dtype=dtype, shape=(n_rows, len(symbols)))
+              for f in fields}
+    mask = np.lib.format.open_memmap(os.path.join(out_dir, MASK_NAME), mode='w+',
+                                     dtype=np.bool_, shape=(n_rows, len(symbols)))
+    col_of = {s: i for i, s in enumerate(symbols)}
+
+    block_ms = block_days * DAY_MS
+    for block_start in range(start_ms, end_ms, block_ms):
+        block_end = min(block_start + block_ms, end_ms)
+        r0, r1 = (block_start - start_ms) // step_ms, (block_end - start_ms) // step_ms
+        block = {f: np.full((r1 - r0, len(symbols)), np.nan, dtype=dtype) for f in fields}
+        block_mask = np.zeros((r1 - r0, len(symbols)), dtype=np.bool_)
+
+        df = load_ohlcv(lake_root, symbols=symbols, start=block_start, end=block_end,
+                        columns=fields + ['symbol'], time_columns=False)
+        if len(df):
+            rows = (df['timestamp'].to_numpy().astype(np.int64) - block_start) // step_ms
+            cols = df['symbol'].map(col_of).to_numpy()
+            for f in fields:
+                block[f][rows, cols] = df[f].to_numpy()
+            block_mask[rows, cols] = True
+
+        # 按行块整体写入, 对 C-order 矩阵是连续写
+        for f in fields:
+            arrays[f][r0:r1] = block[f]
+        mask[r0:r1] = block_mask
+
+    for arr in list(arrays.values()) + [mask]:
+        arr.flush()
+    meta = {'symbols': symbols, 'fields': list(fields), 'start_ms': start_ms, 'step_ms': step_ms,
+            'n_rows': int(n_rows), 'dtype': np.dtype(dtype).name, 'exchange': exchange_id, 'interval': interval}
+    with open(os.path.join(out_dir, META_NAME), 'w') as f:
+        json.dump(meta, f)
+    print(f"[🧮 Panel] {n_rows} x {len(symbols)} x {len(fields)} → {out_dir}")
+    return Panel(out_dir)
+
+
+class Panel:
+    """
+    内存映射的多symbol面板 (只读)
+
+    每个字段是 (时间, symbol) 的 C-order 矩阵, 时间窗口切片是连续内存且零拷贝;
+    多个worker进程打开同一目录时共享操作系统的页缓存
+    """
+
+    def __init__(self, root):
+        self.root = root
+        with open(os.path.join(root, META_NAME)) as f:
+            self.meta = json.load(f)
+        self.symbols: List[str] = self.meta['symbols']
+        self.fields: List[str] = self.meta['fields']
+        self.start_ms: int = self.meta['start_ms']
+        self.step_ms: int = self.meta['step_ms']
+        self.n_rows: int = self.meta['n_rows']
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._col_of = {s: i for i, s in enumerate(self.symbols)}
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        """整个字段矩阵的 memmap, 只有被访问到的页会真正读入内存"""
+        if field not in self._arrays:
+            name = MASK_NAME if field == 'mask' else f'{field}.npy'
+            self._arrays[field] = np.load(os.path.join(self.root, name), mmap_mode='r')
+        return self._arrays[field]
+
+    @property
+    def shape(self):
+        return self.n_rows, len(self.symbols)
+
+    def row_of(self, ts) -> int:
+        """时间戳对应的行号, 截断到 [0, n_rows]"""
+        return int(np.clip((to_ms(ts) - self.start_ms) // self.step_ms, 0, self.n_rows))
+
+    def timestamps(self, start_row: int = 0, end_row: Optional[int] = None) -> np.ndarray:
+        end_row = self.n_rows if end_row is None else end_row
+        return (self.start_ms + self.step_ms * np.arange(start_row, end_row, dtype=np.int64)).astype('datetime64[ms]')
+
+    def window(self, start=None, end=None, fields: Optional[List[str]] = None,
+               symbols: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        时间窗口 [start, end) 内各字段的矩阵 (含 'mask')
+
+        不指定 symbols 时返回的是 memmap 视图, 不发生拷贝
+        """
+        r0 = 0 if start is None else self.row_of(start)
+        r1 = self.n_rows if end is None else self.row_of(end)
+        cols = None if symbols is None else [self._col_of[s.replace('/', '-')] for s in symbols]
+        out = {}
+        for f in (fields or self.fields) + ['mask']:
+            block = self[f][r0:r1]
+            out[f] = block if cols is None else block[:, cols]
+        return out
+
+    def to_long_frame(self, start=None, end=None, fields: Optional[List[str]] = None,
+                      symbols: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        窗口转为 (timestamp, symbol) 长表, 只保留存在的K线
+        可直接作为 TechnicalIndicators.get_cross_section_features 的输入
+        """
+        win = self.window(start, end, fields, symbols)
+        names = [s.replace('/', '-') for s in symbols] if symbols else self.symbols
+        r0 = 0 if start is None else self.row_of(start)
+        rows, cols = np.nonzero(win['mask'])
+        df = pd.DataFrame({'timestamp': self.timestamps(r0, r0 + win['mask'].shape[0])[rows],
+                           'symbol': np.asarray(names, dtype=object)[cols]})
+        for f in (fields or self.fields):
+            df[f] = win[f][rows, cols]
+        return df
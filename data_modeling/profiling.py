@@ -0,0 +1,171 @@
+import functools
+import inspect
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# === CONFIG ===
+# Off unless asked for; a disabled hook costs one attribute check per call.
+#   CRYPXO_PROFILE=1            print per-span totals at exit
+#   CRYPXO_PROFILE=prof.json    write them as JSON instead
+#   CRYPXO_TRACE=trace.json     also record every span as a Chrome trace event
+#                               (open in chrome://tracing or ui.perfetto.dev)
+PROFILE_ENV = 'CRYPXO_PROFILE'
+TRACE_ENV = 'CRYPXO_TRACE'
+MAX_TRACE_EVENTS = 1_000_000
+
+
+class Profiler:
+    """Per-span call counts and wall time, optionally a full event trace; thread safe."""
+
+    def __init__(self):
+        self.enabled = False
+        self.tracing = False
+        self.spans = {}
+        self.events = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def enable(self, trace=False):
+        self.enabled = True
+        self.tracing = self.tracing or trace
+
+    def disable(self):
+        self.enabled = False
+        self.tracing = False
+
+    def reset(self):
+        with self._lock:
+            self.spans = {}
+            self.events = []
+
+    def add(self, name, started, ended=None):
+        ended = ended if ended is not None else time.perf_counter()
+        seconds = ended - started
+        with self._lock:
+            span = self.spans.get(name)
+            if span is None:
+                span = self.spans[name] = {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0}
+            span['calls'] += 1
+            span['seconds'] += seconds
+            span['max_seconds'] = max(span['max_seconds'], seconds)
+            if self.tracing and len(self.events) < MAX_TRACE_EVENTS:
+                self.events.append({'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                                    'ts': (started - self._origin) * 1e6, 'dur': seconds * 1e6})
+
+    def report(self):
+        """{span: {calls, seconds, max_seconds, mean_ms}}, slowest total first."""
+        with self._lock:
+            spans = {name: dict(s) for name, s in self.spans.items()}
+        for s in spans.values():
+            s['mean_ms'] = s['seconds'] / s['calls'] * 1000 if s['calls'] else 0.0
+        return dict(sorted(spans.items(), key=lambda item: -item[1]['seconds']))
+
+    def summary(self):
+        lines = [f"{'span':<40} {'calls':>8} {'total s':>9} {'mean ms':>9} {'max ms':>9}"]
+        for name, s in self.report().items():
+            lines.append(f"{name:<40} {s['calls']:8d} {s['seconds']:9.3f} {s['mean_ms']:9.3f} "
+                         f"{s['max_seconds'] * 1000:9.3f}")
+        return '\n'.join(lines)
+
+    def write_trace(self, path):
+        with self._lock:
+            events = list(self.events)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+PROFILER = Profiler()
+
+
+@contextmanager
+def span(name):
+    """Time a block under `name` when profiling is on."""
+    if not PROFILER.enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PROFILER.add(name, started)
+
+
+def timed(name=None):
+    """Decorator recording each call of a function (sync or async) as a span, by default module.qualname."""
+    def decorate(func):
+        label = name or f"{func.__module__}.{func.__qualname__}"
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not PROFILER.enabled:
+                    return await func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    PROFILER.add(label, started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.add(label, started)
+        return wrapper
+    return decorate
+
+
+def _report_at_exit(profile_target, trace_target):
+    if not PROFILER.spans:
+        return
+    if profile_target and profile_target.endswith('.json'):
+        with open(profile_target, 'w') as f:
+            json.dump(PROFILER.report(), f, indent=2)
+    else:
+        worker = f" pid {os.getpid()}" if multiprocessing.parent_process() is not None else ''
+        print(f"[⏱️ Profile{worker}]\n{PROFILER.summary()}")
+    if trace_target:
+        PROFILER.write_trace(trace_target)
+
+
+def _per_process(path):
+    # pool workers inherit the environment: give each its own file instead of overwriting the parent's
+    if not path or multiprocessing.parent_process() is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{os.getpid()}{ext}"
+
+
+def _install(profile_target, trace_target):
+    if profile_target and profile_target.endswith('.json'):
+        profile_target = _per_process(profile_target)
+    # unlike atexit, multiprocessing finalizers also run when a pool worker exits
+    multiprocessing.util.Finalize(None, _report_at_exit, args=(profile_target, _per_process(trace_target)),
+                                  exitpriority=0)
+
+
+def _after_fork(profile_target, trace_target, profiler):
+    # forkserver workers inherit this module already imported, but with the finalizers cleared
+    profiler.reset()
+    _install(profile_target, trace_target)
+
+
+def _configure_from_env():
+    profile_target, trace_target = os.environ.get(PROFILE_ENV), os.environ.get(TRACE_ENV)
+    if not profile_target and not trace_target:
+        return
+    PROFILER.enable(trace=bool(trace_target))
+    _install(profile_target, trace_target)
+    multiprocessing.util.register_after_fork(PROFILER, functools.partial(_after_fork, profile_target, trace_target))
+
+
+_configure_from_env()
@@ -0,0 +1,448 @@
+import argparse
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from manifest import DAY_MS, HIVE_COMPACTED_RE, INTERVAL_MS, day_start_ms, parse_partition_key
+from workers import pool_context
+
+# === CONFIG ===
+WORKERS = os.cpu_count() or 1
+BATCH_FILES = 256               # files per worker task
+ZERO_VOLUME_MIN_RUN = 3         # single zero-volume minutes are normal on thin pairs
+OUTLIER_Z = 25.0                # robust z-score of a 1-bar log return (median / MAD)
+MAX_RANGE_RATIO = 1.5           # footer: high.max / low.min above this in one file -> read the file
+QUEUE_PATH = './data/_repairs.sqlite'
+WORKER_PRELOAD = ['quality', 'pandas', 'pyarrow.parquet']
+
+ISSUE_COLUMNS = ['exchange', 'interval', 'symbol', 'path', 'kind', 'start_ms', 'end_ms', 'count']
+# what a repair does per issue kind: refetch the bad bars, or rewrite the day from what is on disk
+REFETCH_KINDS = ('missing', 'ohlc', 'outlier')
+REWRITE_KINDS = ('duplicate', 'unsorted', 'off_grid', 'out_of_range')
+YEAR_MONTH_RE = re.compile(r'/year=(?P<year>\d{4})/(?:month=(?P<month>\d{2})/)?data\.parquet$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repairs (
+    id       INTEGER PRIMARY KEY,
+    exchange TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    symbol   TEXT NOT NULL,
+    path     TEXT NOT NULL,
+    action   TEXT NOT NULL,
+    start_ms INTEGER NOT NULL,
+    end_ms   INTEGER NOT NULL,
+    status   TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated  REAL,
+    UNIQUE (exchange, interval, symbol, action, start_ms, end_ms)
+);
+"""
+
+
+def _month_bounds(year, month):
+    lo = datetime(year, month, 1, tzinfo=timezone.utc)
+    hi = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(lo.timestamp() * 1000), int(hi.timestamp() * 1000)
+
+
+def list_partitions(root, now_ms=None):
+    """
+    Every daily or compacted parquet file under `root` with the span it should
+    cover: (exchange, interval, symbol, path, lo_ms, hi_ms, compacted). The
+    span is clipped at the last closed bar, so the open day is not "missing".
+    """
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    parts = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if not name.endswith('.parquet') or name.startswith('.'):
+                continue
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, root).replace(os.sep, '/')
+            key = parse_partition_key(rel)
+            if key is not None:
+                exchange_id, interval, symbol, day = key
+                lo = day_start_ms(day)
+                hi, compacted = lo + DAY_MS, False
+            else:
+                m, ym = HIVE_COMPACTED_RE.search(rel), YEAR_MONTH_RE.search('/' + rel)
+                if m is None or ym is None:
+                    continue
+                exchange_id, interval, symbol = m.group('exchange'), m.group('interval'), m.group('symbol')
+                year = int(ym.group('year'))
+                lo, hi = _month_bounds(year, int(ym.group('month'))) if ym.group('month') else \
+                    (_month_bounds(year, 1)[0], _month_bounds(year + 1, 1)[0])
+                compacted = True
+            step = INTERVAL_MS.get(interval, 60_000)
+            hi = min(hi, now_ms // step * step)
+            if hi > lo:
+                parts.append((exchange_id, interval, symbol, path, lo, hi, compacted))
+    return parts
+
+
+# === FOOTER TIER ===
+def footer_check(path, lo, hi, step, compacted):
+    """
+    Decide from the parquet footer alone whether a file is clean.
+
+    Clean means: row count equals the number of slots in [lo, hi), min/max
+    timestamp sit on the first/last slot, every volume is > 0 and the price
+    range is plausible. For compacted lake files (written by sort_dedupe and
+    flagged with sorting_columns) that proves no gaps or duplicates; for day
+    files a duplicate exactly offset by a gap would slip through, which the
+    full tier catches. OHLC relations always need the data.
+    """
+    meta = pq.read_metadata(path)
+    names = meta.schema.names
+    stats = {}
+    for col in ('timestamp', 'volume', 'high', 'low'):
+        if col not in names:
+            return False
+        idx = names.index(col)
+        lows, highs = [], []
+        for i in range(meta.num_row_groups):
+            s = meta.row_group(i).column(idx).statistics
+            if s is None or not s.has_min_max:
+                return False
+            lows.append(s.min)
+            highs.append(s.max)
+        stats[col] = (min(lows), max(highs)) if lows else (None, None)
+    expected = (hi - lo) // step
+    ts_min, ts_max = stats['timestamp']
+    if meta.num_rows != expected or ts_min != lo or ts_max != hi - step:
+        return False
+    if compacted and not meta.row_group(0).sorting_columns:
+        return False
+    if not stats['volume'][0] > 0:
+        return False
+    low_min, high_max = stats['low'][0], stats['high'][1]
+    return low_min > 0 and high_max / low_min <= MAX_RANGE_RATIO
+
+
+# === FULL TIER ===
+def _runs(ts, mask, step):
+    """Contiguous on-grid runs of flagged bars as [(start_ms, end_ms, count)]."""
+    t = ts[mask]
+    if len(t) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(t) != step)
+    starts, ends = np.r_[0, breaks + 1], np.r_[breaks, len(t) - 1]
+    return [(int(t[s]), int(t[e]) + step, int(e - s + 1)) for s, e in zip(starts, ends)]
+
+
+def check_bars(ts, open_, high, low, close, volume, lo, hi, step):
+    """
+    Vectorized checks of one partition's bars (in file order) against the
+    [lo, hi) grid of `step` ms. Returns [(kind, start_ms, end_ms, count)].
+    """
+    issues = []
+    n = len(ts)
+    if n == 0:
+        return [('missing', lo, hi, (hi - lo) // step)]
+    descents = int(np.count_nonzero(np.diff(ts) < 0))
+    if descents:
+        issues.append(('unsorted', lo, hi, descents))
+
+    order = np.argsort(ts, kind='stable')
+    ts_sorted = ts[order]
+    repeated = ts_sorted[1:] == ts_sorted[:-1]
+    if repeated.any():
+        dup_ts = np.unique(ts_sorted[1:][repeated])
+        issues += [('duplicate', s, e, c) for s, e, c in _runs(dup_ts, np.ones(len(dup_ts), bool), step)]
+    # keep the last row per timestamp, as lake.sort_dedupe does
+    keep = order[np.r_[~repeated, True]]
+    ts, open_, high, low, close, volume = (a[keep] for a in (ts, open_, high, low, close, volume))
+
+    off_grid = ts % step != 0
+    outside = (ts < lo) | (ts >= hi)
+    if off_grid.any():
+        issues.append(('off_grid', int(ts[off_grid][0]), int(ts[off_grid][-1]) + 1, int(off_grid.sum())))
+    if outside.any():
+        issues.append(('out_of_range', int(ts[outside][0]), int(ts[outside][-1]) + 1, int(outside.sum())))
+    valid = ~off_grid & ~outside
+    ts, open_, high, low, close, volume = (a[valid] for a in (ts, open_, high, low, close, volume))
+
+    edges = np.r_[lo - step, ts, hi]
+    gaps = np.flatnonzero(np.diff(edges) > step)
+    issues += [('missing', int(edges[g] + step), int(edges[g + 1]), int((edges[g + 1] - edges[g]) // step - 1))
+               for g in gaps]
+
+    zero = volume == 0
+    if zero.any():
+        issues += [('zero_volume', s, e, c) for s, e, c in _runs(ts, zero, step) if c >= ZERO_VOLUME_MIN_RUN]
+
+    with np.errstate(invalid='ignore'):
+        bad = ~((low <= np.minimum(open_, close)) & (high >= np.maximum(open_, close)) & (low > 0))
+    if bad.any():
+        issues += [('ohlc', s, e, c) for s, e, c in _runs(ts, bad, step)]
+
+    if len(close) > 2 and (close > 0).all():
+        r = np.diff(np.log(close))
+        med = np.median(r)
+        mad = np.median(np.abs(r - med)) * 1.4826
+        if mad > 0:
+            spike = np.r_[False, np.abs(r - med) / mad > OUTLIER_Z]
+            issues += [('outlier', s, e, c) for s, e, c in _runs(ts, spike, step)]
+    return issues
+
+
+def scan_file(part, full=False):
+    """Footer tier first (unless `full`), then the vectorized data checks."""
+    exchange_id, interval, symbol, path, lo, hi, compacted = part
+    step = INTERVAL_MS.get(interval, 60_000)
+    if not full and footer_check(path, lo, hi, step, compacted):
+        return [], False
+    table = pq.read_table(path, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    arrays = [table.column('timestamp').to_numpy().astype(np.int64)] + \
+        [table.column(c).to_numpy().astype(np.float64) for c in ('open', 'high', 'low', 'close', 'volume')]
+    issues = check_bars(*arrays, lo, hi, step)
+    return [(exchange_id, interval, symbol, path, *issue) for issue in issues], True
+
+
+def _scan_batch(parts, full):
+    issues, read = [], 0
+    for part in parts:
+        try:
+            found, was_read = scan_file(part, full)
+        except Exception as e:
+            found, was_read = [(*part[:4], 'unreadable', part[4], part[5], 0)], False
+            print(f"[❌ Quality] {part[3]} : {e}")
+        issues += found
+        read += was_read
+    return issues, read
+
+
+def scan(root, full=False, workers=WORKERS, now_ms=None):
+    """
+    Scan every partition under `root`. Returns (issues, stats): issues has
+    ISSUE_COLUMNS, one row per contiguous bad range.
+    """
+    started = time.monotonic()
+    parts = list_partitions(root, now_ms)
+    batches = [parts[i:i + BATCH_FILES] for i in range(0, len(parts), BATCH_FILES)]
+    rows, read = [], 0
+    if workers <= 1 or len(batches) <= 1:
+        for batch in batches:
+            found, n = _scan_batch(batch, full)
+            rows += found
+            read += n
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(WORKER_PRELOAD)) as pool:
+            for found, n in pool.map(_scan_batch, batches, [full] * len(batches)):
+                rows += found
+                read += n
+    issues = pd.DataFrame(rows, columns=ISSUE_COLUMNS)
+    stats = {'files': len(parts), 'files_read': read, 'issues': len(issues),
+             'seconds': time.monotonic() - started}
+    print(f"[🔎 Quality] {stats['files']} files ({stats['files_read']} read past the footer), "
+          f"{stats['issues']} issues in {stats['seconds']:.1f}s")
+    return issues, stats
+
+
+def daily_report(issues):
+    """
+    Bars affected per symbol/day and issue kind. Missing ranges that span
+    midnight are split across their days; other kinds count on their first day.
+    """
+    if issues.empty:
+        return pd.DataFrame()
+    rows = []
+    for r in issues.itertuples(index=False):
+        step = INTERVAL_MS.get(r.interval, 60_000)
+        start = r.start_ms
+        while True:
+            end = min(r.end_ms, (start // DAY_MS + 1) * DAY_MS) if r.kind == 'missing' else r.end_ms
+            count = (end - start) // step if r.kind == 'missing' else r.count
+            rows.append((r.symbol, datetime.fromtimestamp(start / 1000, timezone.utc).date().isoformat(),
+                         r.kind, count))
+            if end >= r.end_ms:
+                break
+            start = end
+    report = pd.DataFrame(rows, columns=['symbol', 'day', 'kind', 'count'])
+    return report.pivot_table(index=['symbol', 'day'], columns='kind', values='count', aggfunc='sum',
+                              fill_value=0)
+
+
+# === REPAIR QUEUE ===
+class RepairQueue:
+    """
+    Persistent queue of bad ranges. 'refetch' items name the bars to pull
+    from the exchange again; 'rewrite' items name a day whose file has to be
+    re-sorted / de-duplicated from its own rows. Re-scans do not enqueue the
+    same range twice.
+    """
+
+    def __init__(self, path=QUEUE_PATH):
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def enqueue(self, issues):
+        entries = []
+        for r in issues.itertuples(index=False):
+            if r.kind in REFETCH_KINDS:
+                entries.append((r.exchange, r.interval, r.symbol, r.path, 'refetch', r.start_ms, r.end_ms))
+            elif r.kind in REWRITE_KINDS:
+                # whole days: the rewrite re-sorts everything the file holds for them
+                lo, hi = r.start_ms // DAY_MS * DAY_MS, -(-r.end_ms // DAY_MS) * DAY_MS
+                entries += [(r.exchange, r.interval, r.symbol, r.path, 'rewrite', d, d + DAY_MS)
+                            for d in range(lo, hi, DAY_MS)]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO repairs (exchange, interval, symbol, path, action, "
+                                   "start_ms, end_ms) VALUES (?, ?, ?, ?, ?, ?, ?)", entries)
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def pending(self, limit=None):
+        sql = ("SELECT id, exchange, interval, symbol, path, action, start_ms, end_ms FROM repairs "
+               "WHERE status = 'pending' ORDER BY symbol, start_ms")
+        with self._lock:
+            rows = self._conn.execute(sql + (f" LIMIT {int(limit)}" if limit else '')).fetchall()
+        return pd.DataFrame(rows, columns=['id', 'exchange', 'interval', 'symbol', 'path', 'action',
+                                           'start_ms', 'end_ms'])
+
+    def mark(self, ids, status):
+        with self._lock:
+            self._conn.executemany("UPDATE repairs SET status = ?, attempts = attempts + 1, updated = ? "
+                                   "WHERE id = ?", [(status, time.time(), int(i)) for i in ids])
+            self._conn.commit()
+
+    def counts(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM repairs GROUP BY status").fetchall())
+
+
+def _day_bars(path, day_ms, step):
+    """The on-grid (`step` ms) bars a partition file holds for one day, sorted and de-duplicated (last row wins)."""
+    from lake import _read_data_columns, sort_dedupe
+    from scraper import CandleBuffer
+
+    table = sort_dedupe(_read_data_columns(path))
+    ts = table.column('timestamp').to_numpy()
+    lo, hi = np.searchsorted(ts, [day_ms, day_ms + DAY_MS])
+    keep = np.arange(lo, hi)
+    keep = keep[ts[keep] % step == 0] if len(keep) else keep
+    bars = CandleBuffer(max(len(keep), 1))
+    bars.size = len(keep)
+    bars.timestamp[:bars.size] = ts[keep]
+    for i, col in enumerate(['open', 'high', 'low', 'close', 'volume']):
+        bars.values[i, :bars.size] = table.column(col).to_numpy()[keep]
+    return bars
+
+
+def _layout_of(path):
+    return 'hive' if '/exchange=' in path.replace(os.sep, '/') else 'flat'
+
+
+def _lake_root(path):
+    path = path.replace(os.sep, '/')
+    return path[:path.index('/exchange=')] if '/exchange=' in path else os.path.dirname(path)
+
+
+async def run_repairs(queue, exchange=None, bucket=None, limit=None):
+    """
+    Work the pending queue: refetch only the queued ranges over REST, merge
+    them into the day's bars on disk and rewrite that day through the
+    scraper's writer (hive lakes get a day-*.parquet delta that lake.compact()
+    folds in). Ranges the exchange returns nothing for are marked
+    'unavailable', so they are not retried forever.
+
+    Each item is fetched and written at its own interval and exchange, so
+    issues in the resampled 5m/1h/... partitions are repaired in place. Items
+    of another exchange than `exchange` are left pending.
+    """
+    from backfill import TokenBucket, fetch_range_ohlcv_async, make_exchange
+    from scraper import page_limit, save_daily_parquet_to_s3
+    from stream_ingest import merge_bars
+
+    own_exchange = exchange is None
+    exchange = exchange or make_exchange()
+    bucket = bucket or TokenBucket.from_weight_budget()
+    limit_rows = page_limit(exchange)
+    items = queue.pending(limit)
+    done = {'done': 0, 'unavailable': 0, 'failed': 0}
+    try:
+        for item in items.itertuples(index=False):
+            symbol = item.symbol.replace('-', '/')
+            step = INTERVAL_MS.get(item.interval, 60_000)
+            fetched = None
+            try:
+                if item.action == 'refetch':
+                    if item.exchange != exchange.id:
+                        raise ValueError(f"queued for {item.exchange}, repairing with {exchange.id}")
+                    fetched = await fetch_range_ohlcv_async(exchange, bucket, symbol, item.start_ms, item.end_ms,
+                                                            limit_rows, interval=item.interval)
+                    if len(fetched) == 0:
+                        queue.mark([item.id], 'unavailable')
+                        done['unavailable'] += 1
+                        continue
+                for day_ms in range(item.start_ms // DAY_MS * DAY_MS, item.end_ms, DAY_MS):
+                    bars = await asyncio.to_thread(_day_bars, item.path, day_ms, step)
+                    if fetched is not None:
+                        lo, hi = np.searchsorted(fetched.timestamp[:len(fetched)], [day_ms, day_ms + DAY_MS])
+                        bars = merge_bars(bars, fetched.timestamp[lo:hi], fetched.values[:, lo:hi])
+                    day = datetime.fromtimestamp(day_ms / 1000, timezone.utc).date().isoformat()
+                    await asyncio.to_thread(save_daily_parquet_to_s3, symbol, day, bars, _layout_of(item.path),
+                                            _lake_root(item.path), item.exchange, item.interval)
+                queue.mark([item.id], 'done')
+                done['done'] += 1
+            except Exception as e:
+                print(f"[❌ Repair] {item.symbol} {item.action} {item.start_ms}..{item.end_ms} : {e}")
+                queue.mark([item.id], 'pending')
+                done['failed'] += 1
+    finally:
+        if own_exchange:
+            await exchange.close()
+    print(f"[🔧 Repair] {done['done']} repaired, {done['unavailable']} unavailable, {done['failed']} failed")
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Data-quality scan and repair queue for the kline lake')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_scan = sub.add_parser('scan', help='scan partitions and enqueue repairs')
+    p_scan.add_argument('root')
+    p_scan.add_argument('--full', action='store_true', help='read every file instead of trusting clean footers')
+    p_scan.add_argument('--workers', type=int, default=WORKERS)
+    p_scan.add_argument('--queue', default=QUEUE_PATH)
+    p_scan.add_argument('--report', help='write the per symbol/day report to this csv')
+    p_repair = sub.add_parser('repair', help='refetch / rewrite queued ranges')
+    p_repair.add_argument('--queue', default=QUEUE_PATH)
+    p_repair.add_argument('--limit', type=int)
+    args = parser.parse_args()
+
+    queue = RepairQueue(args.queue)
+    if args.command == 'scan':
+        issues, _ = scan(args.root, args.full, args.workers)
+        report = daily_report(issues)
+        if args.report:
+            report.to_csv(args.report)
+        print(issues.groupby(['symbol', 'kind'])['count'].sum().unstack(fill_value=0) if len(issues) else
+              "no issues")
+        print(f"[🗂️ Repairs] {queue.enqueue(issues)} new, {queue.counts()}")
+    else:
+        asyncio.run(run_repairs(queue, limit=args.limit))
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()
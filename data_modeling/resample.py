@@ -0,0 +1,165 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from lake import COMPACTED_NAME, _read_data_columns, sort_dedupe, write_compacted
+from manifest import DAY_MS, INTERVAL_MS
+from profiling import timed
+
+# === CONFIG ===
+SOURCE_INTERVAL = '1m'
+TIMEFRAMES = ['5m', '15m', '1h', '1d']
+METADATA_KEY = b'crypxo.resample'
+
+# Every timeframe divides a UTC day, so no bar straddles a day (or month)
+# boundary: each 1m partition resamples on its own, and a changed partition
+# only rewrites the same partition of each higher timeframe.
+#   .../interval=1m/symbol=BTC-USDT/year=2024/month=01/{data,day-*}.parquet
+#   -> .../interval=5m/symbol=BTC-USDT/year=2024/month=01/data.parquet, ...
+
+
+def resample_bars(ts: np.ndarray, values: np.ndarray, step_ms: int):
+    """
+    Resample sorted, de-duplicated bars to `step_ms` with segment reductions.
+
+    `values` is (5, n) open/high/low/close/volume. Returns (bucket_ts,
+    (5, m) values, bars per bucket): open is the first bar of each bucket,
+    high/low the max/min, close the last bar and volume the sum, all via one
+    reduceat per column. Buckets with missing source bars are still emitted;
+    their bar count is below step_ms / source step.
+    """
+    if len(ts) == 0:
+        return ts, values[:, :0], np.zeros(0, dtype=np.int64)
+    bucket = ts - ts % step_ms
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(ts)]
+    out = np.empty((5, len(starts)), dtype=np.float64)
+    out[0] = values[0, starts]
+    out[1] = np.maximum.reduceat(values[1], starts)
+    out[2] = np.minimum.reduceat(values[2], starts)
+    out[3] = values[3, ends - 1]
+    out[4] = np.add.reduceat(values[4], starts)
+    return bucket[starts], out, ends - starts
+
+
+def _to_table(ts: np.ndarray, values: np.ndarray) -> pa.Table:
+    return pa.table({'timestamp': ts, 'open': values[0], 'high': values[1], 'low': values[2],
+                     'close': values[3], 'volume': values[4]})
+
+
+def source_partitions(lake_root, interval=SOURCE_INTERVAL, symbols: Optional[List[str]] = None) -> Dict[str, List]:
+    """Partition dir (relative to the lake root) -> its `interval` files: data.parquet plus day deltas."""
+    partitions = {}
+    marker = f'interval={interval}'
+    for dirpath, _, filenames in os.walk(lake_root):
+        rel = os.path.relpath(dirpath, lake_root).replace(os.sep, '/')
+        parts = rel.split('/')
+        if marker not in parts:
+            continue
+        symbol = next((p.split('=', 1)[1] for p in parts if p.startswith('symbol=')), None)
+        if symbols is not None and symbol not in symbols:
+            continue
+        files = sorted(os.path.join(dirpath, n) for n in filenames if n.endswith('.parquet') and not n.startswith('.'))
+        if files:
+            partitions[rel] = files
+    return partitions
+
+
+def source_fingerprint(files: List[str]) -> str:
+    h = hashlib.sha1()
+    for path in files:
+        st = os.stat(path)
+        h.update(f'{os.path.basename(path)}|{st.st_size}|{st.st_mtime_ns}\n'.encode())
+    return h.hexdigest()
+
+
+def target_path(lake_root, partition: str, source_interval: str, timeframe: str) -> str:
+    parts = [f'interval={timeframe}' if p == f'interval={source_interval}' else p for p in partition.split('/')]
+    return os.path.join(lake_root, *parts, COMPACTED_NAME)
+
+
+def _is_up_to_date(path, fingerprint: str) -> bool:
+    if not os.path.exists(path):
+        return False
+    try:
+        meta = pq.read_schema(path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    return json.loads(meta.get(METADATA_KEY, b'{}')).get('source') == fingerprint
+
+
+@timed()
+def resample_partition(lake_root, partition: str, files: List[str], timeframes: Sequence[str] = TIMEFRAMES,
+                       source_interval: str = SOURCE_INTERVAL, fingerprint: Optional[str] = None) -> Dict[str, tuple]:
+    """
+    Read one 1m partition once (compacted file + deltas, last write wins) and
+    write every timeframe's partition from the same arrays. Returns
+    {timeframe: (bars, partial bars)}.
+    """
+    fingerprint = fingerprint or source_fingerprint(files)
+    table = sort_dedupe(pa.concat_tables([_read_data_columns(path) for path in files]))
+    ts = table.column('timestamp').to_numpy()
+    values = np.vstack([table.column(c).to_numpy() for c in ('open', 'high', 'low', 'close', 'volume')])
+    full = {tf: INTERVAL_MS[tf] // INTERVAL_MS[source_interval] for tf in timeframes}
+    written = {}
+    for tf in timeframes:
+        bucket_ts, out, counts = resample_bars(ts, values, INTERVAL_MS[tf])
+        meta = {'source': fingerprint, 'source_interval': source_interval, 'source_rows': len(ts)}
+        result = _to_table(bucket_ts, out).replace_schema_metadata({METADATA_KEY: json.dumps(meta).encode()})
+        write_compacted(result, target_path(lake_root, partition, source_interval, tf))
+        written[tf] = (len(bucket_ts), int((counts < full[tf]).sum()))
+    return written
+
+
+def resample_lake(lake_root, timeframes: Sequence[str] = TIMEFRAMES, symbols: Optional[List[str]] = None,
+                  source_interval: str = SOURCE_INTERVAL, force: bool = False) -> Dict:
+    """
+    Derive every timeframe in `timeframes` from the 1m lake, in one read per
+    1m partition. Incremental: a partition is redone only when one of its
+    source files (a new or rewritten day delta, or a fresh compaction)
+    differs from the fingerprint stored in the outputs.
+    """
+    for tf in timeframes:
+        if INTERVAL_MS[tf] % INTERVAL_MS[source_interval] or DAY_MS % INTERVAL_MS[tf]:
+            raise ValueError(f"{tf} does not evenly split days into {source_interval} bars")
+    started = time.monotonic()
+    symbols = [s.replace('/', '-') for s in symbols] if symbols else None
+    partitions = source_partitions(lake_root, source_interval, symbols)
+    stats = {'partitions': len(partitions), 'resampled': 0, 'skipped': 0, 'bars': 0, 'partial': 0}
+    for partition, files in sorted(partitions.items()):
+        fingerprint = source_fingerprint(files)
+        if not force and all(_is_up_to_date(target_path(lake_root, partition, source_interval, tf), fingerprint)
+                             for tf in timeframes):
+            stats['skipped'] += 1
+            continue
+        for bars, partial in resample_partition(lake_root, partition, files, timeframes, source_interval,
+                                                  fingerprint).values():
+            stats['bars'] += bars
+            stats['partial'] += partial
+        stats['resampled'] += 1
+    stats['seconds'] = time.monotonic() - started
+    print(f"[🕯️ Resample] {stats['resampled']} partitions resampled to {','.join(timeframes)}, "
+          f"{stats['skipped']} up to date, {stats['bars']} bars ({stats['partial']} partial) "
+          f"in {stats['seconds']:.1f}s")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Derive higher timeframes from the 1m lake')
+    parser.add_argument('lake', help='hive lake root (run lake.compact first for flat day files)')
+    parser.add_argument('--timeframes', nargs='*', default=TIMEFRAMES)
+    parser.add_argument('--symbols', nargs='*', help='e.g. BTC/USDT, default all')
+    parser.add_argument('--force', action='store_true', help='ignore fingerprints and redo every partition')
+    args = parser.parse_args()
+    resample_lake(args.lake, args.timeframes, args.symbols, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,47 @@
 import os
 import time
-import ccxt
-import boto3
+import numpy as np
 import pyarrow as pa
-import pyarrow.parquet as pq
 from datetime import datetime, timezone, timedelta
 
+import lake
+from profiling import timed
+
 # === CONFIG ===
 START_DATE = '2020-01-01'
+EXCHANGE_ID = 'binance'
 INTERVAL = '1m'
 BUCKET = 'crypto.kline.data'
+UPLOAD = False              # True: days go through uploader.UploadPipeline to S3 instead of local files
 LOCAL_TMP_DIR = './data'
 SYMBOL_DIR = 'symbols.txt'
+MANIFEST_PATH = os.path.join(LOCAL_TMP_DIR, '_manifest.sqlite')
+LAYOUT = 'flat'             # 'flat': ./data/{exchange}_{interval}_{symbol}_{day}.parquet, 'hive': see lake.py
+LAKE_DIR = os.path.join(LOCAL_TMP_DIR, 'lake')
+CANDLE_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume", "symbol", "exchange", "interval"]
+
+# ccxt (~0.6s) and the exchange client are only needed to fetch; file naming
+# uses exchange_id(), so workers that just read or write days never import it.
+# S3 clients come from uploader.make_s3_client when UPLOAD is on.
+
+def get_exchange():
+    """The module's ccxt client, created on first use; assign `scraper.exchange` to swap it."""
+    ex = globals().get('exchange')
+    if ex is None:
+        import ccxt
 
-# AWS client
-# s3 = boto3.client('s3')
-exchange = ccxt.binance()
+        ex = globals()['exchange'] = getattr(ccxt, EXCHANGE_ID)()
+    return ex
+
+def exchange_id():
+    ex = globals().get('exchange')
+    return ex.id if ex is not None else EXCHANGE_ID
+
+def __getattr__(name):
+    # `scraper.exchange` keeps working for callers that read it directly
+    if name == 'exchange':
+        return get_exchange()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # === HELPERS ===
 def ensure_dir(path):
@@ -27,88 +53,257 @@ def read_symbols(loc):
         symbols = f.readlines()
     return [i.strip() for i in symbols if len(i.strip()) > 0]
 
-# def s3_file_exists(symbol, day):
-#     normalized_symbol = symbol.replace("/", "-")
-#     s3_key = f"{exchange.id}/{INTERVAL}/{normalized_symbol}/{day}.parquet"
-#     try:
-#         s3.head_object(Bucket=BUCKET, Key=s3_key)
-#         return True
-#     except s3.exceptions.ClientError as e:
-#         if e.response['Error']['Code'] == "404":
-#             return False
-#         raise
-
-def fetch_day_ohlcv(symbol, since_ts, until_ts):
-    all_candles = []
+class FetchStats:
+    """Request/candle/byte counters for judging how well pages are packed."""
+
+    def __init__(self):
+        self.requests = 0
+        self.candles = 0
+        self.bytes = 0
+        self.days = 0
+
+    def add_page(self, candles, nbytes=0):
+        self.requests += 1
+        self.candles += len(candles)
+        self.bytes += nbytes
+
+    @property
+    def requests_per_day(self):
+        return self.requests / self.days if self.days else 0.0
+
+    @property
+    def bytes_per_candle(self):
+        return self.bytes / self.candles if self.candles else 0.0
+
+    def __repr__(self):
+        return (f"FetchStats(requests={self.requests}, days={self.days}, candles={self.candles}, "
+                f"requests_per_day={self.requests_per_day:.2f}, bytes_per_candle={self.bytes_per_candle:.1f})")
+
+
+def page_limit(ex=None, default=1000):
+    """Largest OHLCV page the exchange serves, from ccxt's feature table when it has one."""
+    ex = ex or get_exchange()
+    features = getattr(ex, 'features', None) or {}
+    market_type = (getattr(ex, 'options', None) or {}).get('defaultType', 'spot')
+    section = features.get(market_type) or {}
+    # futures sections are keyed one level deeper, e.g. features['swap']['linear']
+    if 'fetchOHLCV' not in section:
+        section = next((v for v in section.values() if isinstance(v, dict) and 'fetchOHLCV' in v), {})
+    return (section.get('fetchOHLCV') or {}).get('limit') or default
+
+
+def response_bytes(ex):
+    # ccxt keeps the raw body of the last response; under concurrency this is approximate
+    body = getattr(ex, 'last_http_response', None)
+    return len(body) if isinstance(body, (str, bytes)) else 0
+
+
+class CandleBuffer:
+    """
+    Preallocated column buffers for candles: an int64 timestamp array and a
+    float64 (5, capacity) block holding open/high/low/close/volume rows.
+    Pages are appended in place and `to_table` wraps the buffers without
+    copying. Indexing mimics the old list of [ts, o, h, l, c, v] rows.
+    """
+
+    def __init__(self, capacity=1440):
+        self.timestamp = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty((5, capacity), dtype=np.float64)
+        self.size = 0
+
+    @classmethod
+    def from_rows(cls, rows):
+        buf = cls(max(len(rows), 1))
+        buf.extend(rows)
+        return buf
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.size)
+            if step != 1:
+                raise ValueError("CandleBuffer slices must be contiguous")
+            return self._view(start, max(start, stop))
+        if key < 0:
+            key += self.size
+        if not 0 <= key < self.size:
+            raise IndexError(key)
+        return [int(self.timestamp[key])] + self.values[:, key].tolist()
+
+    def _view(self, start, stop):
+        view = CandleBuffer.__new__(CandleBuffer)
+        view.timestamp = self.timestamp[start:stop]
+        view.values = self.values[:, start:stop]
+        view.size = stop - start
+        return view
+
+    def _reserve(self, needed):
+        capacity = len(self.timestamp)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        timestamp = np.empty(capacity, dtype=np.int64)
+        values = np.empty((5, capacity), dtype=np.float64)
+        timestamp[:self.size] = self.timestamp[:self.size]
+        values[:, :self.size] = self.values[:, :self.size]
+        self.timestamp, self.values = timestamp, values
+
+    def extend(self, rows, until_ts=None):
+        """Append a page of [ts, o, h, l, c, v] rows, dropping rows at/after `until_ts`."""
+        if len(rows) == 0:
+            return 0
+        try:
+            page = np.asarray(rows, dtype=np.float64)
+        except TypeError:
+            # ccxt reports missing fields as None
+            page = np.array([[np.nan if v is None else v for v in row[:6]] for row in rows], dtype=np.float64)
+        ts = page[:, 0].astype(np.int64)
+        n = len(ts) if until_ts is None else int(np.searchsorted(ts, until_ts))
+        self._reserve(self.size + n)
+        self.timestamp[self.size:self.size + n] = ts[:n]
+        self.values[:, self.size:self.size + n] = page[:n, 1:6].T
+        self.size += n
+        return n
+
+    def to_table(self, symbol, exchange_id, interval):
+        n = self.size
+        # numeric columns wrap the numpy memory directly; constant string
+        # columns are filled in C++ and dictionary-encoded by the writer
+        arrays = [pa.array(self.timestamp[:n])] + [pa.array(self.values[i, :n]) for i in range(5)]
+        arrays += [pa.repeat(symbol, n), pa.repeat(exchange_id, n), pa.repeat(interval, n)]
+        schema = pa.schema(
+            [(name, arr.type) for name, arr in zip(CANDLE_COLUMNS, arrays)],
+            metadata={'symbol': symbol, 'exchange': exchange_id, 'interval': interval},
+        )
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def split_by_day(candles, first_day, last_day):
+    """
+    Split a contiguous candle span into daily partitions (zero-copy views).
+    Every day in [first_day, last_day] is yielded, empty when it has no candles.
+    """
+    since_ts = int(datetime.combine(first_day, datetime.min.time(), tzinfo=timezone.utc).timestamp() * 1000)
+    day_ms = 24 * 60 * 60 * 1000
+    n_days = (last_day - first_day).days + 1
+    edges = np.searchsorted(candles.timestamp[:len(candles)], since_ts + day_ms * np.arange(n_days + 1))
+    for k in range(n_days):
+        yield first_day + timedelta(days=k), candles[int(edges[k]):int(edges[k + 1])]
+
+
+@timed()
+def fetch_range_ohlcv(symbol, since_ts, until_ts, limit=None, stats=None):
+    """
+    Fetch [since_ts, until_ts) as one contiguous walk of max-size pages, so a
+    page that crosses midnight is used for both days instead of refetched.
+    """
+    limit = limit or page_limit()
+    all_candles = CandleBuffer(int((until_ts - since_ts) // 60_000))
+    ex = get_exchange()
     ts = since_ts
     while ts < until_ts:
         try:
-            candles = exchange.fetch_ohlcv(symbol, timeframe=INTERVAL, since=ts, limit=1000)
+            candles = ex.fetch_ohlcv(symbol, timeframe=INTERVAL, since=ts, limit=limit)
+            if stats is not None:
+                stats.add_page(candles, response_bytes(ex))
             if not candles:
                 break
-            for c in candles:
-                if c[0] >= until_ts:
-                    break
-                all_candles.append(c)
+            all_candles.extend(candles, until_ts)
             ts = candles[-1][0] + 60_000
+            if len(candles) < limit:
+                # a short page means the exchange has nothing newer yet
+                break
             time.sleep(0.25)
         except Exception as e:
             print(f"[Error] {symbol} @ {datetime.fromtimestamp(ts / 1000, timezone.utc)} : {e}")
             time.sleep(3)
     return all_candles
 
-def save_daily_parquet_to_s3(symbol, day, candles):
+@timed()
+def fetch_day_ohlcv(symbol, since_ts, until_ts, stats=None):
+    candles = fetch_range_ohlcv(symbol, since_ts, until_ts, stats=stats)
+    if stats is not None:
+        stats.days += 1
+    return candles
+
+def daily_path(symbol, day, layout=None, root=None, exchange=None, interval=None):
+    """
+    Local file of one symbol-day in the given layout (defaults to LAYOUT and its directory).
+    `exchange` (an exchange id) and `interval` default to exchange_id() and INTERVAL.
+    """
+    layout = layout or LAYOUT
+    exchange, interval = exchange or exchange_id(), interval or INTERVAL
+    if layout == 'hive':
+        return lake.daily_file(root or LAKE_DIR, exchange, interval, symbol, day)
+    normalized_symbol = symbol.replace("/", "-")
+    return os.path.join(root or LOCAL_TMP_DIR, f"{exchange}_{interval}_{normalized_symbol}_{day}.parquet")
+
+def s3_key(symbol, day, layout=None, exchange=None, interval=None):
+    """Object key of one symbol-day; hive keys mirror the lake layout relative to its root."""
+    exchange, interval = exchange or exchange_id(), interval or INTERVAL
+    if (layout or LAYOUT) == 'hive':
+        return os.path.relpath(lake.daily_file('', exchange, interval, symbol, day)).replace(os.sep, "/")
+    normalized_symbol = symbol.replace("/", "-")
+    return f"{exchange}/{interval}/{normalized_symbol}/{day}.parquet"
+
+def day_table(symbol, candles, layout=None, exchange=None, interval=None):
+    """(table, write_table kwargs) for one symbol-day in the given layout."""
+    if not isinstance(candles, CandleBuffer):
+        candles = CandleBuffer.from_rows(candles)
+    table = candles.to_table(symbol, exchange or exchange_id(), interval or INTERVAL)
+    if (layout or LAYOUT) == 'hive':
+        # partition keys are in the path; lake.compact() later folds the day into data.parquet
+        return table.select(lake.DATA_COLUMNS), {'compression': lake.COMPRESSION}
+    return table, {'compression': 'snappy', 'use_dictionary': ['symbol', 'exchange', 'interval']}
+
+@timed()
+def save_daily_parquet_to_s3(symbol, day, candles, layout=None, root=None, exchange=None, interval=None):
     if not candles:
         print(f"[⚠️ Empty] No data for {symbol} on {day}")
         return
 
-    normalized_symbol = symbol.replace("/", "-")
-    s3_key = f"{exchange.id}/{INTERVAL}/{normalized_symbol}/{day}.parquet"
-    local_path = os.path.join(LOCAL_TMP_DIR, s3_key.replace("/", "_"))
-    ensure_dir(os.path.dirname(local_path))
-
-    table = pa.Table.from_arrays(
-        [
-            pa.array([row[0] for row in candles], type=pa.int64()),     # timestamp
-            pa.array([row[1] for row in candles], type=pa.float64()),   # open
-            pa.array([row[2] for row in candles], type=pa.float64()),   # high
-            pa.array([row[3] for row in candles], type=pa.float64()),   # low
-            pa.array([row[4] for row in candles], type=pa.float64()),   # close
-            pa.array([row[5] for row in candles], type=pa.float64()),   # volume
-            pa.array([symbol] * len(candles)),                          # symbol
-            pa.array([exchange.id] * len(candles)),                     # exchange
-            pa.array([INTERVAL] * len(candles)),                        # interval
-        ],
-        names=["timestamp", "open", "high", "low", "close", "volume", "symbol", "exchange", "interval"]
-    )
-
-    pq.write_table(table, local_path, compression='snappy')
-    # s3.upload_file(local_path, BUCKET, s3_key)
-    # print(f"[S3 ✅] {symbol} {day} → {s3_key}")
+    table, options = day_table(symbol, candles, layout, exchange, interval)
+    # atomic: the live ingester rewrites today's file while readers may be loading it
+    lake.write_atomic(table, daily_path(symbol, day, layout, root, exchange, interval), **options)
+    # uploads go through uploader.UploadPipeline (UPLOAD = True), which encodes in memory
 
 # === MAIN ===
 def main():
+    import asyncio
+    from backfill import CONCURRENCY, run_backfill
+    from manifest import Manifest
+
     ensure_dir(LOCAL_TMP_DIR)
     symbols = read_symbols(SYMBOL_DIR)
     symbols = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT']
     start_date = datetime.strptime(START_DATE, '%Y-%m-%d').date()
     end_date = datetime.now(timezone.utc).date()
 
-    for symbol in symbols:
-        print(f"==> Processing {symbol}")
-        current_date = end_date
-        while current_date >= start_date:
-            day_str = current_date.isoformat()
-            # if s3_file_exists(symbol, day_str):
-            #     print(f"[🛑 Skip] {symbol} {day_str} already exists in S3")
-            #     current_date -= timedelta(days=1)
-            #     continue
-            since_ts = int(datetime.combine(current_date, datetime.min.time(), tzinfo=timezone.utc).timestamp() * 1000)
-            until_ts = since_ts + 24 * 60 * 60 * 1000
-            print(f"[📥 Fetching] {symbol} {day_str}")
-            candles = fetch_day_ohlcv(symbol, since_ts, until_ts)
-            save_daily_parquet_to_s3(symbol, day_str, candles)
-            current_date -= timedelta(days=1)
+    manifest = Manifest(MANIFEST_PATH)
+    if manifest.is_empty():
+        manifest.reconcile_local(LOCAL_TMP_DIR)
+        # manifest.reconcile_s3(uploader.make_s3_client(), BUCKET, f"{exchange_id()}/{INTERVAL}/")
+    items = [(symbol, day) for symbol in symbols
+             for day in manifest.missing_days(exchange_id(), INTERVAL, symbol, start_date, end_date)]
+
+    print(f"==> Processing {len(symbols)} symbols, {len(items)} missing days with concurrency {CONCURRENCY}")
+    if UPLOAD:
+        from uploader import UploadPipeline
+
+        def on_uploaded(symbol, day, candles):
+            manifest.record_candles(exchange_id(), INTERVAL, symbol, day, candles, fetched=True)
+
+        # submit() only enqueues: days are recorded once stored in S3, not when fetched
+        with UploadPipeline(BUCKET, on_uploaded=on_uploaded) as pipeline:
+            asyncio.run(run_backfill(symbols, start_date, end_date, concurrency=CONCURRENCY,
+                                     items=items, on_day=pipeline.submit))
+        print(f"[📊 Upload] {pipeline.stats()}")
+    else:
+        asyncio.run(run_backfill(symbols, start_date, end_date, concurrency=CONCURRENCY,
+                                 items=items, manifest=manifest))
+    manifest.close()
 
 if __name__ == "__main__":
     main()
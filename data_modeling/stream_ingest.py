@@ -0,0 +1,444 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+import pyarrow.parquet as pq
+
+import lake
+from backfill import DAY_MS, TokenBucket, fetch_range_ohlcv_async, make_exchange
+from manifest import INTERVAL_MS
+from scraper import INTERVAL, CandleBuffer, daily_path, page_limit, save_daily_parquet_to_s3
+from scraper import exchange_id as scraper_exchange_id
+
+# === CONFIG ===
+WS_URL = 'wss://stream.binance.com:9443/stream'
+FLUSH_SECONDS = 5.0             # closed bars are written at most this long after they arrive
+MAX_PENDING_BARS = 10_000       # ...or as soon as this many are buffered
+SUBSCRIBE_BATCH = 200           # streams per SUBSCRIBE message (binance caps messages at 5/s)
+MAX_STREAMS = 1024              # binance limit per connection
+RECONNECT_MAX_SECONDS = 30
+LATENCY_WINDOW = 10_000         # recent bars kept for latency percentiles
+METRICS_PORT = 9108
+
+
+def stream_name(symbol, interval=INTERVAL):
+    return f"{symbol.replace('/', '').lower()}@kline_{interval}"
+
+
+def utc_day(ts_ms):
+    return datetime.fromtimestamp(ts_ms / 1000, timezone.utc).date().isoformat()
+
+
+def merge_bars(candles, ts, values):
+    """
+    Merge new bars (int64 `ts`, float64 (5, n) `values`) into a CandleBuffer.
+    Result is sorted by timestamp; on duplicates the new bar wins.
+    """
+    n = len(candles)
+    all_ts = np.concatenate([candles.timestamp[:n], ts])
+    all_values = np.concatenate([candles.values[:, :n], values], axis=1)
+    order = np.argsort(all_ts, kind='stable')
+    all_ts = all_ts[order]
+    keep = np.ones(len(all_ts), dtype=bool)
+    keep[:-1] = all_ts[1:] != all_ts[:-1]
+    merged = CandleBuffer(max(int(keep.sum()), 1))
+    merged.size = int(keep.sum())
+    merged.timestamp[:merged.size] = all_ts[keep]
+    merged.values[:, :merged.size] = all_values[:, order][:, keep]
+    return merged
+
+
+class IngestMetrics:
+    """
+    Counters, latencies and backlog (closed bars received but not yet written).
+    e2e latency runs from the bar's close on the exchange to the bar being
+    visible on disk; write latency from receiving the bar to it being on disk.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.messages = 0
+        self.updates = 0
+        self.closed_bars = 0
+        self.gap_filled_bars = 0
+        self.gaps = 0
+        self.flushes = 0
+        self.written_bars = 0
+        self.connects = 0
+        self.disconnects = 0
+        self.write_errors = 0
+        self.backlog = 0
+        self.oldest_pending = None
+        self.receive_lag_ms = deque(maxlen=window)
+        self.e2e_latency_ms = deque(maxlen=window)
+        self.write_latency_ms = deque(maxlen=window)
+
+    def snapshot(self):
+        def pct(values, q):
+            return float(np.percentile(np.fromiter(values, float), q)) if values else None
+
+        return {
+            'messages': self.messages, 'updates': self.updates, 'closed_bars': self.closed_bars,
+            'gaps': self.gaps, 'gap_filled_bars': self.gap_filled_bars, 'flushes': self.flushes,
+            'written_bars': self.written_bars, 'connects': self.connects, 'disconnects': self.disconnects,
+            'write_errors': self.write_errors, 'backlog_bars': self.backlog,
+            'backlog_age_s': time.monotonic() - self.oldest_pending if self.oldest_pending else 0.0,
+            'receive_lag_ms_p50': pct(self.receive_lag_ms, 50),
+            'e2e_latency_ms_p50': pct(self.e2e_latency_ms, 50),
+            'e2e_latency_ms_p99': pct(self.e2e_latency_ms, 99),
+            'e2e_latency_ms_max': max(self.e2e_latency_ms) if self.e2e_latency_ms else None,
+            'write_latency_ms_p50': pct(self.write_latency_ms, 50),
+            'write_latency_ms_p99': pct(self.write_latency_ms, 99),
+        }
+
+    def __repr__(self):
+        s = self.snapshot()
+        return (f"IngestMetrics(closed={s['closed_bars']}, written={s['written_bars']}, "
+                f"gap_filled={s['gap_filled_bars']}, backlog={s['backlog_bars']}, "
+                f"e2e_p50={s['e2e_latency_ms_p50']}, write_p50={s['write_latency_ms_p50']}, "
+                f"write_p99={s['write_latency_ms_p99']}, connects={s['connects']})")
+
+
+class _SymbolState:
+    def __init__(self, last_ts=None):
+        self.last_ts = last_ts      # newest closed bar seen (stream or REST)
+        self.pending = {}           # ts -> ([o, h, l, c, v], received), not yet written
+        self.day = None             # day currently held in `bars`
+        self.bars = None            # every bar of `day`, rewritten on each flush
+
+
+class KlineIngester:
+    """
+    Live kline ingestion for many symbols over one multiplexed websocket.
+
+    Closed bars are buffered per symbol and flushed in micro-batches through
+    `on_day(symbol, day, candles)` (default: the scraper's daily writer, so the
+    files land in the same flat/hive layout). Each flush rewrites the day's
+    file atomically from memory with every bar of that day so far; readers see
+    either the previous or the new file, and lake.compact() folds finished
+    days into data.parquet as usual.
+
+    Missing bars are filled over REST: after a reconnect the first closed bar
+    exposes the hole since the last bar seen, and the same check catches bars
+    the stream skipped. Pass `since` to fill from a point in time on startup.
+    """
+
+    def __init__(self, symbols, url=WS_URL, rest=None, bucket=None, on_day=save_daily_parquet_to_s3,
+                 layout=None, root=None, interval=INTERVAL, since=None, flush_seconds=FLUSH_SECONDS,
+                 max_pending_bars=MAX_PENDING_BARS, manifest=None, exchange_id=None):
+        if len(symbols) > MAX_STREAMS:
+            raise ValueError(f"At most {MAX_STREAMS} streams per connection, got {len(symbols)}")
+        self.symbols = list(symbols)
+        self.url = url
+        self.rest = rest
+        self.bucket = bucket or TokenBucket.from_weight_budget()
+        self.on_day = on_day
+        self.layout = layout
+        self.root = root
+        self.interval = interval
+        self.interval_ms = INTERVAL_MS[interval]
+        self.flush_seconds = flush_seconds
+        self.max_pending_bars = max_pending_bars
+        self.manifest = manifest
+        # same id as the day files on_day names, so the manifest and missing_days agree
+        self.exchange_id = exchange_id or scraper_exchange_id()
+        self.metrics = IngestMetrics()
+        start = None if since is None else since - self.interval_ms
+        self._states = {s: _SymbolState(start) for s in self.symbols}
+        self._by_stream = {s.replace('/', '').upper(): s for s in self.symbols}
+        self._wake = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._gap_tasks = set()
+        self._ws = None
+
+    # === buffering ===
+    def _add(self, symbol, ts, values, from_stream=True):
+        state = self._states[symbol]
+        if from_stream and state.last_ts is not None and ts > state.last_ts + self.interval_ms:
+            self._schedule_gap_fill(symbol, state.last_ts + self.interval_ms, ts)
+        if state.last_ts is None or ts > state.last_ts:
+            state.last_ts = ts
+        if ts not in state.pending:
+            self.metrics.backlog += 1
+        received = time.monotonic()
+        state.pending[ts] = (values, received)
+        if self.metrics.oldest_pending is None:
+            self.metrics.oldest_pending = received
+        if self.metrics.backlog >= self.max_pending_bars:
+            self._wake.set()
+
+    def _handle(self, raw):
+        self.metrics.messages += 1
+        msg = json.loads(raw)
+        data = msg.get('data', msg)
+        if data.get('e') != 'kline':
+            return
+        k = data['k']
+        if not k['x']:
+            self.metrics.updates += 1
+            return
+        symbol = self._by_stream.get(data['s'].upper())
+        if symbol is None:
+            return
+        self.metrics.closed_bars += 1
+        self.metrics.receive_lag_ms.append(time.time() * 1000 - data['E'])
+        self._add(symbol, int(k['t']), [float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v'])])
+
+    # === REST gap fill ===
+    def _schedule_gap_fill(self, symbol, since_ts, until_ts):
+        if self.rest is None:
+            print(f"[⚠️ Gap] {symbol} missing {(until_ts - since_ts) // self.interval_ms} bars, no REST client")
+            return
+        self.metrics.gaps += 1
+        task = asyncio.create_task(self._gap_fill(symbol, since_ts, until_ts))
+        self._gap_tasks.add(task)
+        task.add_done_callback(self._gap_tasks.discard)
+
+    async def _gap_fill(self, symbol, since_ts, until_ts):
+        try:
+            candles = await fetch_range_ohlcv_async(self.rest, self.bucket, symbol, since_ts, until_ts,
+                                                    page_limit(self.rest), interval=self.interval)
+        except Exception as e:
+            print(f"[❌ Gap] {symbol} {utc_day(since_ts)} : {e}")
+            return
+        for i in range(len(candles)):
+            self._add(symbol, int(candles.timestamp[i]), candles.values[:, i].tolist(), from_stream=False)
+        self.metrics.gap_filled_bars += len(candles)
+
+    # === writing ===
+    def _day_bars(self, symbol, day):
+        """Bars of `day` written so far: kept in memory for the current day, else read from disk."""
+        state = self._states[symbol]
+        if state.day == day:
+            return state.bars
+        path = daily_path(symbol, day, self.layout, self.root)
+        if not os.path.exists(path):
+            return CandleBuffer()
+        table = pq.read_table(path, columns=lake.DATA_COLUMNS)
+        bars = CandleBuffer(max(table.num_rows, 1))
+        bars.size = table.num_rows
+        bars.timestamp[:bars.size] = table.column('timestamp').to_numpy()
+        for i, name in enumerate(lake.DATA_COLUMNS[1:]):
+            bars.values[i, :bars.size] = table.column(name).to_numpy()
+        return bars
+
+    def _write_symbol(self, symbol, pending):
+        """Merge `pending` (ts -> (values, received)) into the day files; runs in a worker thread."""
+        state = self._states[symbol]
+        ts = np.fromiter(sorted(pending), dtype=np.int64)
+        values = np.array([pending[t][0] for t in ts.tolist()], dtype=np.float64).T
+        day_index = ts // DAY_MS
+        starts = np.flatnonzero(np.r_[True, day_index[1:] != day_index[:-1]])
+        written = []
+        for lo, hi in zip(starts, np.r_[starts[1:], len(ts)]):
+            day = utc_day(ts[lo])
+            bars = merge_bars(self._day_bars(symbol, day), ts[lo:hi], values[:, lo:hi])
+            self.on_day(symbol, day, bars, **self._writer_options())
+            if self.manifest is not None:
+                self.manifest.record_candles(self.exchange_id, self.interval, symbol, day, bars)
+            if state.day is None or day >= state.day:
+                state.day, state.bars = day, bars
+            written.append(ts[lo:hi])
+        return np.concatenate(written) if written else ts[:0]
+
+    def _writer_options(self):
+        options = {}
+        if self.layout is not None:
+            options['layout'] = self.layout
+        if self.root is not None:
+            options['root'] = self.root
+        return options
+
+    async def flush(self):
+        """
+        Write every pending bar. Bars leave `pending` only once their write
+        succeeded: a failed symbol keeps them (bars that arrived meanwhile
+        still win) for the next flush, and the first error is raised after the
+        other symbols have been written.
+        """
+        batches = {s: dict(st.pending) for s, st in self._states.items() if st.pending}
+        if not batches:
+            return 0
+        written, error = 0, None
+        for symbol, pending in batches.items():
+            try:
+                # parquet encoding is CPU/disk bound, keep it off the event loop
+                ts = await asyncio.to_thread(self._write_symbol, symbol, pending)
+            except Exception as e:
+                self.metrics.write_errors += 1
+                print(f"[❌ Flush] {symbol} {len(pending)} bars kept pending: {e!r}")
+                error = error or e
+                continue
+            state = self._states[symbol]
+            for t, entry in pending.items():
+                # a bar re-sent during the write is newer than what was written
+                if state.pending.get(t) is entry:
+                    del state.pending[t]
+            now_ms, now = time.time() * 1000, time.monotonic()
+            self.metrics.e2e_latency_ms.extend((now_ms - (ts + self.interval_ms)).tolist())
+            self.metrics.write_latency_ms.extend((now - pending[t][1]) * 1000 for t in ts.tolist())
+            written += len(ts)
+        self.metrics.backlog = sum(len(st.pending) for st in self._states.values())
+        self.metrics.oldest_pending = min((received for st in self._states.values()
+                                           for _, received in st.pending.values()), default=None)
+        self.metrics.flushes += 1
+        self.metrics.written_bars += written
+        if error is not None:
+            raise error
+        return written
+
+    async def _flusher(self):
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # bars stay pending, the next tick retries them
+                print(f"[⚠️ Flush] retrying in {self.flush_seconds}s: {e!r}")
+
+    # === connection ===
+    async def _subscribe(self, ws):
+        streams = [stream_name(s, self.interval) for s in self.symbols]
+        for i in range(0, len(streams), SUBSCRIBE_BATCH):
+            await ws.send(json.dumps({'method': 'SUBSCRIBE', 'params': streams[i:i + SUBSCRIBE_BATCH],
+                                      'id': i // SUBSCRIBE_BATCH + 1}))
+            await asyncio.sleep(0.25)
+
+    async def _connect_loop(self):
+        from websockets.asyncio.client import connect
+        from websockets.exceptions import ConnectionClosed
+
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                async with connect(self.url, max_size=2 ** 22) as ws:
+                    self._ws = ws
+                    self.metrics.connects += 1
+                    attempt = 0
+                    await self._subscribe(ws)
+                    async for raw in ws:
+                        self._handle(raw)
+            except (OSError, ConnectionClosed, asyncio.TimeoutError) as e:
+                print(f"[⚠️ Stream] disconnected: {e!r}")
+            finally:
+                self._ws = None
+            if self._stop.is_set():
+                break
+            self.metrics.disconnects += 1
+            attempt += 1
+            await asyncio.sleep(min(0.5 * 2 ** (attempt - 1), RECONNECT_MAX_SECONDS) if attempt > 1 else 0)
+
+    async def run(self, duration=None):
+        """Ingest until stop() (or `duration` seconds); pending bars are flushed on the way out."""
+        flusher = asyncio.create_task(self._flusher())
+        connection = asyncio.create_task(self._connect_loop())
+        try:
+            if duration is not None:
+                await asyncio.wait([connection, asyncio.create_task(self._stop.wait())], timeout=duration)
+            else:
+                await self._stop.wait()
+        finally:
+            await self.stop()
+            connection.cancel()
+            await asyncio.gather(connection, return_exceptions=True)
+            await asyncio.gather(*self._gap_tasks, return_exceptions=True)
+            flusher.cancel()
+            await asyncio.gather(flusher, return_exceptions=True)
+            await self.flush()
+        return self.metrics
+
+    async def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._ws is not None:
+            await self._ws.close()
+
+    # === metrics endpoint ===
+    async def serve_metrics(self, port=METRICS_PORT, host='127.0.0.1'):
+        """Minimal HTTP endpoint: any GET returns metrics.snapshot() as JSON."""
+        async def handle(reader, writer):
+            await reader.readuntil(b'\r\n\r\n')
+            body = json.dumps(self.metrics.snapshot()).encode()
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                         + f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+            await writer.drain()
+            writer.close()
+
+        return await asyncio.start_server(handle, host, port)
+
+
+async def run_fake(root, symbols=('BTC/USDT', 'ETH/USDT', 'SOL/USDT'), bars=2000, bars_per_second=500.0):
+    """
+    End-to-end check against FakeKlineServer + FakeExchange: the stream drops
+    every 500 bars and skips 50, which REST gap-fill must recover. Returns
+    (metrics, rows on disk, rows expected).
+    """
+    from fake_exchange import FakeExchange, FakeKlineServer, synthetic_candles
+    from loader import load_ohlcv
+
+    start = int(datetime(2024, 1, 1, 23, 0, tzinfo=timezone.utc).timestamp() * 1000)
+    candles = {s: synthetic_candles(start, start + bars * 60_000, seed=i) for i, s in enumerate(symbols)}
+    server = await FakeKlineServer(candles, bars_per_second=bars_per_second, drop_every=500, skip_bars=50).start()
+    ingester = KlineIngester(symbols, url=server.url, rest=FakeExchange(candles), layout='hive', root=root,
+                             since=start, flush_seconds=0.2,
+                             bucket=TokenBucket(rate=1e6, capacity=1e6))
+    task = asyncio.create_task(ingester.run())
+    await server.done.wait()
+    await asyncio.sleep(0.5)
+    await ingester.stop()
+    metrics = await task
+    await server.close()
+    df = load_ohlcv(root, time_columns=False)
+    return metrics, len(df), bars * len(symbols)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Live kline ingestion over a multiplexed websocket')
+    parser.add_argument('--symbols', nargs='*', help='default: symbols.txt')
+    parser.add_argument('--layout', choices=['flat', 'hive'])
+    parser.add_argument('--root', help='output directory (default: the scraper layout dir)')
+    parser.add_argument('--since', help='YYYY-MM-DD: gap-fill from this day on startup (default: today)')
+    parser.add_argument('--flush-seconds', type=float, default=FLUSH_SECONDS)
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT)
+    parser.add_argument('--fake', action='store_true', help='run against a local fake server and verify')
+    args = parser.parse_args()
+
+    if args.fake:
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as root:
+            metrics, rows, expected = asyncio.run(run_fake(args.root or root))
+        print(f"[🧪 Fake] {rows}/{expected} bars on disk, {metrics}")
+        return
+
+    from scraper import SYMBOL_DIR, read_symbols
+
+    symbols = args.symbols or read_symbols(SYMBOL_DIR)
+    since = datetime.strptime(args.since, '%Y-%m-%d') if args.since else datetime.now(timezone.utc)
+    since_ms = int(datetime(since.year, since.month, since.day, tzinfo=timezone.utc).timestamp() * 1000)
+
+    async def _run():
+        rest = make_exchange()
+        ingester = KlineIngester(symbols, rest=rest, layout=args.layout, root=args.root, since=since_ms,
+                                 flush_seconds=args.flush_seconds)
+        server = await ingester.serve_metrics(args.metrics_port)
+        print(f"==> Streaming {len(symbols)} symbols, metrics on :{args.metrics_port}")
+        try:
+            await ingester.run()
+        finally:
+            server.close()
+            await rest.close()
+
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,999 @@
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import talib
+from talib import abstract
+
+from features import PATTERN_FUNCTIONS, TechnicalIndicators
+
+NAN = float('nan')
+EPSILON = 1e-14                 # TA-Lib 的 TA_IS_ZERO 阈值
+WARMUP_BARS = 2000              # 热启动时回放的历史K线数
+RECURSIVE_WINDOW = 1000         # HT_* / MAMA / STOCHRSI 尾部重算窗口, 递归状态在窗口内收敛
+PATTERN_MARGIN = 16             # K线形态在 lookback 之外多留的K线数
+
+# 依赖全历史 close.max() 的数学变换: 批量版本带前视, 流式只能用截至当前的最大值
+LOOKAHEAD_FEATURES = ['ACOS', 'ASIN', 'COSH', 'EXP', 'SINH', 'TAN', 'TANH']
+# 从序列起点累积的指标: 热启动时直接用批量结果作为初值
+CUMULATIVE_FEATURES = ['AD', 'OBV']
+
+
+def _is_zero(x):
+    return -EPSILON < x < EPSILON
+
+
+# === 基础状态 ===
+class _Ring:
+    """定长环形缓冲区"""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.buf = np.zeros(n)
+        self.count = 0
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.n
+
+    def push(self, x: float) -> float:
+        """写入新值, 返回被挤出的最旧值 (未满时为 nan)"""
+        i = self.count % self.n
+        old = self.buf[i] if self.full else NAN
+        self.buf[i] = x
+        self.count += 1
+        return old
+
+    def oldest(self) -> float:
+        return self.buf[self.count % self.n] if self.full else self.buf[0]
+
+    def values(self) -> np.ndarray:
+        """按时间从旧到新排列的当前内容"""
+        if not self.full:
+            return self.buf[:self.count]
+        i = self.count % self.n
+        return np.concatenate((self.buf[i:], self.buf[:i]))
+
+
+class _SMA:
+    """与 TA-Lib 相同的累加顺序: 先加新值, 输出后再减去最旧值"""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.ring = _Ring(n)
+        self.total = 0.0
+
+    def update(self, x: float) -> float:
+        self.ring.push(x)
+        if not self.ring.full:
+            self.total += x
+            return NAN
+        out = (self.total + x) / self.n
+        self.total = self.total + x - self.ring.oldest()
+        return out
+
+
+class _EMA:
+    """前 n 个值的 SMA 作为种子, 之后 prev + k * (x - prev)"""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.k = 2.0 / (n + 1)
+        self.count = 0
+        self.total = 0.0
+        self.value = NAN
+
+    def seed(self, value: float):
+        self.value = value
+        self.count = self.n
+
+    def update(self, x: float) -> float:
+        if x != x:
+            return NAN
+        self.count += 1
+        if self.count < self.n:
+            self.total += x
+            return NAN
+        if self.count == self.n:
+            self.value = (self.total + x) / self.n
+        else:
+            self.value = (x - self.value) * self.k + self.value
+        return self.value
+
+
+class _RunningVar:
+    """TA-Lib TA_INT_VAR: 滑动的 sum 与 sum of squares"""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.ring = _Ring(n)
+        self.total1 = 0.0
+        self.total2 = 0.0
+
+    def update(self, x: float):
+        """返回 (mean, mean of squares)"""
+        self.ring.push(x)
+        self.total1 += x
+        self.total2 += x * x
+        if not self.ring.full:
+            return NAN, NAN
+        mean1, mean2 = self.total1 / self.n, self.total2 / self.n
+        old = self.ring.oldest()
+        self.total1 -= old
+        self.total2 -= old * old
+        return mean1, mean2
+
+
+# === 指标节点: update(o, h, l, c, v) -> {name: value} ===
+class _Node:
+    outputs: List[str] = []
+
+    def update(self, o, h, l, c, v) -> Dict[str, float]:
+        raise NotImplementedError
+
+
+def _ufunc(func):
+    """
+    numpy 逐元素函数的标量版本: NaN 和定义域外的输入 (如 close <= 0 取对数) 得到 NaN / ±inf,
+    与 TA-Lib 批量结果一致; math.* 在这些输入上会抛异常
+    """
+    def apply(x):
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            return float(func(x))
+    return apply
+
+
+_ACOS, _ASIN, _COSH, _EXP, _SINH, _TAN, _TANH = map(_ufunc, [np.arccos, np.arcsin, np.cosh, np.exp, np.sinh,
+                                                            np.tan, np.tanh])
+_ATAN, _CEIL, _COS, _FLOOR, _LN, _LOG10, _SIN, _SQRT = map(_ufunc, [np.arctan, np.ceil, np.cos, np.floor, np.log,
+                                                                    np.log10, np.sin, np.sqrt])
+
+
+class _Func(_Node):
+    """无状态的逐K线变换"""
+
+    def __init__(self, name, func):
+        self.outputs = [name]
+        self.func = func
+
+    def update(self, o, h, l, c, v):
+        return {self.outputs[0]: self.func(o, h, l, c, v)}
+
+
+class _MovingAverages(_Node):
+    def __init__(self, periods):
+        self.periods = periods
+        self.sma = {p: _SMA(p) for p in periods}
+        self.ema = {p: _EMA(p) for p in periods}
+        self.wma_ring = {p: _Ring(p) for p in periods}
+        self.weights = {p: np.arange(1, p + 1, dtype=float) for p in periods}
+        self.outputs = [f'{k}_{p}' for p in periods for k in ('SMA', 'EMA', 'WMA')]
+
+    def update(self, o, h, l, c, v):
+        out = {}
+        for p in self.periods:
+            out[f'SMA_{p}'] = self.sma[p].update(c)
+            out[f'EMA_{p}'] = self.ema[p].update(c)
+            ring = self.wma_ring[p]
+            ring.push(c)
+            out[f'WMA_{p}'] = float(ring.values() @ self.weights[p]) / (p * (p + 1) / 2) if ring.full else NAN
+        return out
+
+
+class _DemaTema(_Node):
+    def __init__(self, n):
+        self.n = n
+        self.e1, self.e2, self.e3 = _EMA(n), _EMA(n), _EMA(n)
+        self.outputs = [f'DEMA_{n}', f'TEMA_{n}']
+
+    def update(self, o, h, l, c, v):
+        e1 = self.e1.update(c)
+        e2 = self.e2.update(e1)
+        e3 = self.e3.update(e2)
+        return {f'DEMA_{self.n}': 2 * e1 - e2, f'TEMA_{self.n}': 3 * e1 - 3 * e2 + e3}
+
+
+class _TRIMA(_Node):
+    def __init__(self, n):
+        self.name = f'TRIMA_{n}'
+        self.outputs = [self.name]
+        if n % 2:
+            self.first, self.second = _SMA((n + 1) // 2), _SMA((n + 1) // 2)
+        else:
+            self.first, self.second = _SMA(n // 2), _SMA(n // 2 + 1)
+
+    def update(self, o, h, l, c, v):
+        x = self.first.update(c)
+        return {self.name: self.second.update(x) if x == x else NAN}
+
+
+class _KAMA(_Node):
+    """TA-Lib KAMA, 包括其 sumROC1 <= periodROC 的比较方式"""
+
+    def __init__(self, n):
+        self.n = n
+        self.name = f'KAMA_{n}'
+        self.outputs = [self.name]
+        self.ring = _Ring(n + 1)
+        self.sum_roc = 0.0
+        self.kama = NAN
+        self.const_max = 2.0 / (n + 1.0)
+        self.const_diff = 2.0 / 3.0 - self.const_max
+
+    def update(self, o, h, l, c, v):
+        ring = self.ring
+        prev = ring.values()[-1] if ring.count else NAN
+        trailing = ring.push(c)
+        if ring.count > 1 and ring.count <= self.n + 1:
+            self.sum_roc += abs(prev - c)
+        if ring.count <= self.n:
+            return {self.name: NAN}
+        if ring.count == self.n + 1:
+            self.kama = prev
+        else:
+            # 滑窗: 去掉最旧的一段变化, 加上最新一段
+            self.sum_roc -= abs(trailing - ring.oldest())
+            self.sum_roc += abs(c - prev)
+        period_roc = c - ring.oldest()
+        er = 1.0 if (self.sum_roc <= period_roc or _is_zero(self.sum_roc)) else abs(period_roc / self.sum_roc)
+        sc = (er * self.const_diff + self.const_max) ** 2
+        self.kama = (c - self.kama) * sc + self.kama
+        return {self.name: self.kama}
+
+
+class _SAR(_Node):
+    """TA-Lib SAR(acceleration=0.02, maximum=0.2), 方向由前两根K线的 -DM 决定"""
+    outputs = ['SAR']
+
+    def __init__(self, acceleration=0.02, maximum=0.2):
+        self.acc = acceleration
+        self.max = maximum
+        self.count = 0
+
+    def update(self, o, h, l, c, v):
+        self.count += 1
+        if self.count == 1:
+            self.first = (h, l)
+            return {'SAR': NAN}
+        if self.count == 2:
+            prev_h, prev_l = self.first
+            diff_m, diff_p = prev_l - l, h - prev_h
+            minus_dm = diff_m if (diff_m > 0 and diff_p < diff_m) else 0.0
+            self.is_long = not minus_dm > 0
+            self.af = self.acc
+            if self.is_long:
+                self.ep, self.sar = h, prev_l
+            else:
+                self.ep, self.sar = l, prev_h
+            self.new_h, self.new_l = h, l
+        prev_h, prev_l = self.new_h, self.new_l
+        self.new_h, self.new_l = h, l
+        new_h, new_l = h, l
+        if self.is_long:
+            if new_l <= self.sar:
+                self.is_long = False
+                self.sar = max(self.ep, prev_h, new_h)
+                out = self.sar
+                self.af = self.acc
+                self.ep = new_l
+                self.sar = max(self.sar + self.af * (self.ep - self.sar), prev_h, new_h)
+            else:
+                out = self.sar
+                if new_h > self.ep:
+                    self.ep = new_h
+                    self.af = min(self.af + self.acc, self.max)
+                self.sar = min(self.sar + self.af * (self.ep - self.sar), prev_l, new_l)
+        else:
+            if new_h >= self.sar:
+                self.is_long = True
+                self.sar = min(self.ep, prev_l, new_l)
+                out = self.sar
+                self.af = self.acc
+                self.ep = new_h
+                self.sar = min(self.sar + self.af * (self.ep - self.sar), prev_l, new_l)
+            else:
+                out = self.sar
+                if new_l < self.ep:
+                    self.ep = new_l
+                    self.af = min(self.af + self.acc, self.max)
+                self.sar = max(self.sar + self.af * (self.ep - self.sar), prev_h, new_h)
+        return {'SAR': out}
+
+
+class _Window(_Node):
+    """需要最近 n 根K线整体的指标 (极值/回归/相关), 每根K线 O(n)"""
+
+    def __init__(self, n, fields, outputs, func):
+        self.rings = {f: _Ring(n) for f in fields}
+        self.outputs = outputs
+        self.func = func
+        self.fields = fields
+
+    def update(self, o, h, l, c, v):
+        bar = {'open': o, 'high': h, 'low': l, 'close': c, 'volume': v}
+        for f in self.fields:
+            self.rings[f].push(bar[f])
+        if not self.rings[self.fields[0]].full:
+            return {name: NAN for name in self.outputs}
+        values = self.func(*[self.rings[f].values() for f in self.fields])
+        return dict(zip(self.outputs, values))
+
+
+def _midpoint(c):
+    return ((c.max() + c.min()) / 2,)
+
+
+def _midprice(h, l):
+    return ((h.max() + l.min()) / 2,)
+
+
+def _linreg(c):
+    n = len(c)
+    x = np.arange(n, dtype=float)
+    sum_x, sum_xx = x.sum(), (x * x).sum()
+    sum_y, sum_xy = c.sum(), (x * c).sum()
+    m = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x * sum_x)
+    b = (sum_y - m * sum_x) / n
+    return b + m * (n - 1), math.atan(m) * (180.0 / math.pi), b, m, b + m * n
+
+
+def _aroon(h, l):
+    n = len(h) - 1
+    # 并列时取最近的一根, 与 TA-Lib 一致
+    hi = n - int(np.argmax(h[::-1]))
+    lo = n - int(np.argmin(l[::-1]))
+    up, down = 100.0 * hi / n, 100.0 * lo / n
+    # talib.AROON 返回 (aroondown, aroonup), 批量版本按位置赋给了 AROON_UP / AROON_DOWN, 这里保持同样的列含义
+    return down, up, up - down
+
+
+def _willr(h, l, c):
+    hh, ll = h.max(), l.min()
+    return (-100.0 * (hh - c[-1]) / (hh - ll) if hh != ll else 0.0,)
+
+
+def _cci(h, l, c):
+    tp = (h + l + c) / 3
+    avg = tp.sum() / len(tp)
+    mean_dev = np.abs(tp - avg).sum()
+    diff = tp[-1] - avg
+    return (diff / (0.015 * (mean_dev / len(tp))) if diff != 0 and mean_dev != 0 else 0.0,)
+
+
+class _Correl(_Window):
+    """TA-Lib CORREL 的滑动累加和"""
+
+    def __init__(self, n):
+        self.n = n
+        self.outputs = ['CORREL']
+        self.ring = _Ring(n)
+        self.sx = self.sy = self.sxx = self.syy = self.sxy = 0.0
+        self.old = []
+
+    def update(self, o, h, l, c, v):
+        self.old.append((h, l))
+        if len(self.old) > self.n:
+            x0, y0 = self.old.pop(0)
+            self.sx -= x0
+            self.sxx -= x0 * x0
+            self.sxy -= x0 * y0
+            self.sy -= y0
+            self.syy -= y0 * y0
+        self.sx += h
+        self.sxx += h * h
+        self.sxy += h * l
+        self.sy += l
+        self.syy += l * l
+        if len(self.old) < self.n:
+            return {'CORREL': NAN}
+        n = self.n
+        temp = (self.sxx - self.sx * self.sx / n) * (self.syy - self.sy * self.sy / n)
+        return {'CORREL': (self.sxy - self.sx * self.sy / n) / math.sqrt(temp) if temp >= EPSILON else 0.0}
+
+
+class _BBands(_Node):
+    outputs = ['BB_UPPER', 'BB_MIDDLE', 'BB_LOWER']
+
+    def __init__(self, n=20, nbdev=2.0):
+        self.sma = _SMA(n)
+        self.var = _RunningVar(n)
+        self.nbdev = nbdev
+
+    def update(self, o, h, l, c, v):
+        mid = self.sma.update(c)
+        _, mean2 = self.var.update(c)
+        if mid != mid:
+            return dict.fromkeys(self.outputs, NAN)
+        var = mean2 - mid * mid
+        sd = math.sqrt(var) if var >= EPSILON else 0.0
+        return {'BB_UPPER': mid + sd * self.nbdev, 'BB_MIDDLE': mid, 'BB_LOWER': mid - sd * self.nbdev}
+
+
+class _StdVar(_Node):
+    outputs = ['STDDEV', 'VAR']
+
+    def __init__(self, n=5):
+        self.var = _RunningVar(n)
+
+    def update(self, o, h, l, c, v):
+        mean1, mean2 = self.var.update(c)
+        var = mean2 - mean1 * mean1
+        if var != var:
+            return {'STDDEV': NAN, 'VAR': NAN}
+        return {'STDDEV': math.sqrt(var) if var >= EPSILON else 0.0, 'VAR': var}
+
+
+class _GainLoss(_Node):
+    """RSI / CMO 共用的 Wilder 平均涨跌幅"""
+    outputs = ['CMO', 'RSI']
+
+    def __init__(self, n=14):
+        self.n = n
+        self.prev = NAN
+        self.count = 0
+        self.gain = self.loss = 0.0
+
+    def update(self, o, h, l, c, v):
+        prev, self.prev = self.prev, c
+        if prev != prev:
+            return {'CMO': NAN, 'RSI': NAN}
+        d = c - prev
+        g, lo = (d, 0.0) if d > 0 else (0.0, -d)
+        self.count += 1
+        n = self.n
+        if self.count < n:
+            self.gain += g
+            self.loss += lo
+            return {'CMO': NAN, 'RSI': NAN}
+        if self.count == n:
+            self.gain = (self.gain + g) / n
+            self.loss = (self.loss + lo) / n
+        else:
+            self.gain = (self.gain * (n - 1) + g) / n
+            self.loss = (self.loss * (n - 1) + lo) / n
+        total = self.gain + self.loss
+        if _is_zero(total):
+            return {'CMO': 0.0, 'RSI': 0.0}
+        return {'CMO': 100.0 * ((self.gain - self.loss) / total), 'RSI': 100.0 * (self.gain / total)}
+
+
+class _DirectionalSystem(_Node):
+    """
+    ADX/ADXR/DX/±DI/±DM 共用一套 Wilder 平滑的 +DM/-DM/TR 状态
+    各输出的起始位置与 TA-Lib 各自的 lookback 一致
+    """
+    outputs = ['ADX', 'ADXR', 'DX', 'MINUS_DI', 'MINUS_DM', 'PLUS_DI', 'PLUS_DM']
+
+    def __init__(self, n=14):
+        self.n = n
+        self.count = 0
+        self.prev = None
+        self.plus_dm = self.minus_dm = self.tr = 0.0
+        self.dx = NAN
+        self.sum_dx = 0.0
+        self.adx = NAN
+        self.adx_hist = _Ring(n)
+
+    def update(self, o, h, l, c, v):
+        n = self.n
+        out = dict.fromkeys(self.outputs, NAN)
+        if self.prev is None:
+            self.prev = (h, l, c)
+            return out
+        ph, pl, pc = self.prev
+        self.prev = (h, l, c)
+        self.count += 1
+        diff_p, diff_m = h - ph, pl - l
+        pdm = diff_p if (diff_p > 0 and diff_p > diff_m) else 0.0
+        mdm = diff_m if (diff_m > 0 and diff_p < diff_m) else 0.0
+        tr = max(h - l, abs(h - pc), abs(l - pc))
+
+        if self.count < n:
+            self.plus_dm += pdm
+            self.minus_dm += mdm
+            self.tr += tr
+            if self.count == n - 1:
+                out['PLUS_DM'], out['MINUS_DM'] = self.plus_dm, self.minus_dm
+            return out
+        self.plus_dm = self.plus_dm - self.plus_dm / n + pdm
+        self.minus_dm = self.minus_dm - self.minus_dm / n + mdm
+        self.tr = self.tr - self.tr / n + tr
+        out['PLUS_DM'], out['MINUS_DM'] = self.plus_dm, self.minus_dm
+
+        dx_valid = False
+        if not _is_zero(self.tr):
+            plus_di = 100.0 * (self.plus_dm / self.tr)
+            minus_di = 100.0 * (self.minus_dm / self.tr)
+            out['PLUS_DI'], out['MINUS_DI'] = plus_di, minus_di
+            total = minus_di + plus_di
+            if not _is_zero(total):
+                self.dx = 100.0 * (abs(minus_di - plus_di) / total)
+                dx_valid = True
+            elif self.count == n:
+                self.dx = 0.0
+        else:
+            out['PLUS_DI'] = out['MINUS_DI'] = 0.0
+            if self.count == n:
+                self.dx = 0.0
+        out['DX'] = self.dx
+
+        # ADX: n 个 DX 的均值作为种子, 之后 Wilder 平滑
+        k = self.count - n + 1
+        if k <= n:
+            if dx_valid:
+                self.sum_dx += self.dx
+            if k == n:
+                self.adx = self.sum_dx / n
+        elif dx_valid:
+            self.adx = (self.adx * (n - 1) + self.dx) / n
+        if k >= n:
+            out['ADX'] = self.adx
+            self.adx_hist.push(self.adx)
+            # ADXR = (ADX + ADX[n-1 根之前]) / 2
+            if self.adx_hist.full:
+                out['ADXR'] = (self.adx + self.adx_hist.oldest()) / 2.0
+        return out
+
+
+class _DualEMA:
+    """
+    TA-Lib MACD 在同一起点计算快慢两条 EMA: 两者都在第 slow 根K线处播种,
+    快线的种子是慢线种子窗口里最后 fast 根的均值
+    """
+
+    def __init__(self, fast, slow):
+        self.fast, self.slow = fast, slow
+        self.ring = _Ring(slow)
+        self.fast_ema, self.slow_ema = _EMA(fast), _EMA(slow)
+
+    def update(self, c):
+        self.ring.push(c)
+        if self.ring.count < self.slow:
+            return NAN, NAN
+        if self.ring.count == self.slow:
+            window = self.ring.values()
+            self.slow_ema.seed(window.sum() / self.slow)
+            self.fast_ema.seed(window[-self.fast:].sum() / self.fast)
+            return self.fast_ema.value, self.slow_ema.value
+        return self.fast_ema.update(c), self.slow_ema.update(c)
+
+
+class _MACD(_Node):
+    outputs = ['MACD', 'MACD_SIGNAL', 'MACD_HIST']
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.ema = _DualEMA(fast, slow)
+        self.signal = _EMA(signal)
+
+    def update(self, o, h, l, c, v):
+        fast, slow = self.ema.update(c)
+        if slow != slow:
+            return dict.fromkeys(self.outputs, NAN)
+        macd = fast - slow
+        sig = self.signal.update(macd)
+        if sig != sig:
+            return dict.fromkeys(self.outputs, NAN)
+        return {'MACD': macd, 'MACD_SIGNAL': sig, 'MACD_HIST': macd - sig}
+
+
+class _PriceOscillators(_Node):
+    """APO / PPO, talib 的默认 matype=1 (EMA); 与 MACD 不同, 两条 EMA 各自独立播种"""
+    outputs = ['APO', 'PPO']
+
+    def __init__(self, fast=12, slow=26):
+        self.fast, self.slow = _EMA(fast), _EMA(slow)
+
+    def update(self, o, h, l, c, v):
+        f, s = self.fast.update(c), self.slow.update(c)
+        if s != s:
+            return {'APO': NAN, 'PPO': NAN}
+        return {'APO': f - s, 'PPO': ((f - s) / s) * 100.0 if not _is_zero(s) else 0.0}
+
+
+class _RateOfChange(_Node):
+    outputs = ['MOM', 'ROC', 'ROCP', 'ROCR', 'ROCR100']
+
+    def __init__(self, n=10):
+        self.ring = _Ring(n + 1)
+
+    def update(self, o, h, l, c, v):
+        self.ring.push(c)
+        if not self.ring.full:
+            return dict.fromkeys(self.outputs, NAN)
+        p = self.ring.oldest()
+        if p == 0:
+            return {'MOM': c - p, 'ROC': 0.0, 'ROCP': 0.0, 'ROCR': 0.0, 'ROCR100': 0.0}
+        return {'MOM': c - p, 'ROC': ((c / p) - 1.0) * 100.0, 'ROCP': (c - p) / p,
+                'ROCR': c / p, 'ROCR100': (c / p) * 100.0}
+
+
+class _Stochastics(_Node):
+    """STOCH(5,3,3) 与 STOCHF(5,3) 共用同一个 fast %K"""
+    outputs = ['STOCH_K', 'STOCH_D', 'STOCHF_K', 'STOCHF_D']
+
+    def __init__(self, fastk=5, slowk=3, slowd=3, fastd=3):
+        self.h, self.l = _Ring(fastk), _Ring(fastk)
+        self.slowk, self.slowd, self.fastd = _SMA(slowk), _SMA(slowd), _SMA(fastd)
+
+    def update(self, o, h, l, c, v):
+        self.h.push(h)
+        self.l.push(l)
+        out = dict.fromkeys(self.outputs, NAN)
+        if not self.h.full:
+            return out
+        hh, ll = self.h.values().max(), self.l.values().min()
+        diff = (hh - ll) / 100.0
+        k = (c - ll) / diff if diff != 0 else 0.0
+        fastd = self.fastd.update(k)
+        if fastd == fastd:
+            out['STOCHF_K'], out['STOCHF_D'] = k, fastd
+        slowk = self.slowk.update(k)
+        slowd = self.slowd.update(slowk) if slowk == slowk else NAN
+        if slowd == slowd:
+            out['STOCH_K'], out['STOCH_D'] = slowk, slowd
+        return out
+
+
+class _TRIX(_Node):
+    outputs = ['TRIX']
+
+    def __init__(self, n=30):
+        self.e1, self.e2, self.e3 = _EMA(n), _EMA(n), _EMA(n)
+        self.prev = NAN
+
+    def update(self, o, h, l, c, v):
+        e3 = self.e3.update(self.e2.update(self.e1.update(c)))
+        prev, self.prev = self.prev, e3
+        if prev != prev or e3 != e3:
+            return {'TRIX': NAN}
+        return {'TRIX': ((e3 - prev) / prev) * 100.0 if prev != 0 else 0.0}
+
+
+class _UltOsc(_Node):
+    outputs = ['ULTOSC']
+
+    def __init__(self, p1=7, p2=14, p3=28):
+        self.periods = (p1, p2, p3)
+        self.rings = [(_Ring(p), _Ring(p)) for p in self.periods]
+        self.sums = [[0.0, 0.0] for _ in self.periods]
+        self.prev_close = NAN
+        self.count = 0
+
+    def update(self, o, h, l, c, v):
+        pc, self.prev_close = self.prev_close, c
+        self.count += 1
+        if pc != pc:
+            return {'ULTOSC': NAN}
+        true_low = min(l, pc)
+        bp = c - true_low
+        tr = max(h - l, abs(pc - h), abs(pc - l))
+        for (rb, rt), s in zip(self.rings, self.sums):
+            old_b, old_t = rb.push(bp), rt.push(tr)
+            if old_b == old_b:
+                s[0] -= old_b
+                s[1] -= old_t
+            s[0] += bp
+            s[1] += tr
+        if self.count <= self.periods[2]:
+            return {'ULTOSC': NAN}
+        out = 0.0
+        for weight, (a, b) in zip((4.0, 2.0, 1.0), self.sums):
+            if not _is_zero(b):
+                out += weight * (a / b)
+        return {'ULTOSC': 100.0 * (out / 7.0)}
+
+
+class _MFI(_Node):
+    outputs = ['MFI']
+
+    def __init__(self, n=14):
+        self.n = n
+        self.pos, self.neg = _Ring(n), _Ring(n)
+        self.pos_sum = self.neg_sum = 0.0
+        self.prev_tp = NAN
+
+    def update(self, o, h, l, c, v):
+        tp = (h + l + c) / 3.0
+        prev, self.prev_tp = self.prev_tp, tp
+        if prev != prev:
+            return {'MFI': NAN}
+        flow = tp * v
+        pos, neg = (flow, 0.0) if tp > prev else ((0.0, flow) if tp < prev else (0.0, 0.0))
+        old_p, old_n = self.pos.push(pos), self.neg.push(neg)
+        self.pos_sum += pos
+        self.neg_sum += neg
+        if old_p == old_p:
+            self.pos_sum -= old_p
+            self.neg_sum -= old_n
+        if not self.pos.full:
+            return {'MFI': NAN}
+        total = self.pos_sum + self.neg_sum
+        return {'MFI': 100.0 * (self.pos_sum / total) if total >= 1.0 else 0.0}
+
+
+class _VolumeFlow(_Node):
+    """AD / ADOSC(3,10) / OBV; ADOSC 的两条 EMA 以第一根 AD 为种子 (TA-Lib 的做法)"""
+    outputs = ['AD', 'ADOSC', 'OBV']
+
+    def __init__(self, fast=3, slow=10):
+        self.fast_k, self.slow_k = 2.0 / (fast + 1), 2.0 / (slow + 1)
+        self.lookback = max(fast, slow) - 1
+        self.ad = 0.0
+        self.obv = NAN
+        self.prev_close = NAN
+        self.fast = self.slow = NAN
+        self.count = 0
+
+    def seed(self, ad, obv):
+        self.ad, self.obv = ad, obv
+
+    def update(self, o, h, l, c, v):
+        rng = h - l
+        if rng > 0.0:
+            self.ad += (((c - l) - (h - c)) / rng) * v
+        if self.count == 0:
+            self.fast = self.slow = self.ad
+            if self.obv != self.obv:
+                self.obv = v
+        else:
+            self.fast = self.fast_k * self.ad + (1 - self.fast_k) * self.fast
+            self.slow = self.slow_k * self.ad + (1 - self.slow_k) * self.slow
+            if c > self.prev_close:
+                self.obv += v
+            elif c < self.prev_close:
+                self.obv -= v
+        self.prev_close = c
+        self.count += 1
+        adosc = self.fast - self.slow if self.count > self.lookback else NAN
+        return {'AD': self.ad, 'ADOSC': adosc, 'OBV': self.obv}
+
+
+class _Volatility(_Node):
+    outputs = ['ATR', 'NATR', 'TRANGE']
+
+    def __init__(self, n=14):
+        self.n = n
+        self.prev_close = NAN
+        self.count = 0
+        self.atr = 0.0
+
+    def update(self, o, h, l, c, v):
+        pc, self.prev_close = self.prev_close, c
+        if pc != pc:
+            return dict.fromkeys(self.outputs, NAN)
+        tr = max(h - l, abs(h - pc), abs(l - pc))
+        self.count += 1
+        n = self.n
+        if self.count < n:
+            self.atr += tr
+            return {'ATR': NAN, 'NATR': NAN, 'TRANGE': tr}
+        self.atr = (self.atr + tr) / n if self.count == n else (self.atr * (n - 1) + tr) / n
+        return {'ATR': self.atr, 'NATR': (self.atr / c) * 100.0 if c != 0 else 0.0, 'TRANGE': tr}
+
+
+class _History:
+    """最近 size 根K线的连续数组, 供尾部窗口重算使用"""
+
+    def __init__(self, size):
+        self.size = size
+        self.data = {f: np.empty(2 * size) for f in ('open', 'high', 'low', 'close', 'volume')}
+        self.start = self.stop = 0
+        self.total = 0
+
+    def push(self, o, h, l, c, v):
+        if self.stop == 2 * self.size:
+            # 满了就把后半段挪到开头, 摊销 O(1)
+            keep = self.stop - self.size
+            for arr in self.data.values():
+                arr[:self.size] = arr[keep:self.stop]
+            self.start, self.stop = max(self.start - keep, 0), self.size
+        for f, x in zip(('open', 'high', 'low', 'close', 'volume'), (o, h, l, c, v)):
+            self.data[f][self.stop] = x
+        self.stop += 1
+        self.total += 1
+
+    def tail(self, field, n):
+        return self.data[field][max(self.stop - n, 0):self.stop]
+
+
+class _TailRecompute(_Node):
+    """
+    对复杂递归或多K线形态的指标, 在最近 window 根K线上调用 TA-Lib 并取最后一个值
+    window 足够长时与全量计算的差异在容差以内; HT_* 依赖下标奇偶, 窗口起点与全局下标对齐
+    """
+
+    def __init__(self, history, func, inputs, outputs, window, align_even=False):
+        self.history = history
+        self.func = func
+        self.inputs = inputs
+        self.outputs = outputs
+        self.window = window
+        self.align_even = align_even
+
+    def update(self, o, h, l, c, v):
+        n = min(self.window, self.history.total)
+        if self.align_even and (self.history.total - n) % 2:
+            n -= 1
+        values = self.func(*[self.history.tail(f, n) for f in self.inputs])
+        if not isinstance(values, tuple):
+            values = (values,)
+        return {name: float(arr[-1]) for name, arr in zip(self.outputs, values)}
+
+
+class _RunningMaxMath(_Node):
+    """close / close.max() 的数学变换, 流式下用截至当前的最大值"""
+    outputs = ['ACOS', 'ASIN', 'COSH', 'EXP', 'SINH', 'TAN', 'TANH']
+
+    def __init__(self):
+        self.max = -math.inf
+
+    def update(self, o, h, l, c, v):
+        # 同 close.max(), 跳过 NaN
+        self.max = float(np.fmax(self.max, c))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            x = float(np.float64(c) / self.max)
+        return {'ACOS': _ACOS(x), 'ASIN': _ASIN(x), 'COSH': _COSH(x), 'EXP': _EXP(x),
+                'SINH': _SINH(x), 'TAN': _TAN(x), 'TANH': _TANH(x)}
+
+
+class StreamingIndicators:
+    """
+    流式技术指标计算器, 与 TechnicalIndicators.calculate_all_indicators 输出同名的指标
+
+    每个指标只保存 O(1) 或 O(window) 的状态 (环形缓冲区, EMA/Wilder 递推, 滑动方差),
+    每来一根新K线调用 update 得到这一根的特征行
+    """
+
+    def __init__(self, history: Optional[pd.DataFrame] = None, warmup_bars: int = WARMUP_BARS):
+        self.history = _History(RECURSIVE_WINDOW + 64)
+        h = self.history
+        self.volume_flow = _VolumeFlow()
+
+        def tail(func, inputs, outputs, window, align_even=False, **params):
+            return _TailRecompute(h, lambda *a: func(*a, **params), inputs, outputs, window, align_even)
+
+        c1 = ['close']
+        hl = ['high', 'low']
+        ohlc = ['open', 'high', 'low', 'close']
+        self.nodes: List[_Node] = [
+            # 1. 重叠研究
+            _MovingAverages([5, 10, 20, 30, 50, 100, 200]),
+            _DemaTema(30), _TRIMA(30), _KAMA(30),
+            tail(talib.MAMA, c1, ['MAMA', 'FAMA'], RECURSIVE_WINDOW),
+            _Window(14, ['close'], ['MIDPOINT'], _midpoint),
+            _Window(14, hl, ['MIDPRICE'], _midprice),
+            _SAR(),
+            _BBands(20, 2.0),
+            tail(talib.HT_TRENDLINE, c1, ['HT_TRENDLINE'], RECURSIVE_WINDOW, True),
+            # 2. 动量指标
+            _DirectionalSystem(14),
+            _PriceOscillators(12, 26),
+            _Window(15, hl, ['AROON_UP', 'AROON_DOWN', 'AROONOSC'], _aroon),
+            _Func('BOP', lambda o, h, l, c, v: (c - o) / (h - l) if h - l >= EPSILON else 0.0),
+            _Window(14, ['high', 'low', 'close'], ['CCI'], _cci),
+            _GainLoss(14),
+            _MACD(12, 26, 9),
+            _MFI(14),
+            _RateOfChange(10),
+            _Stochastics(),
+            tail(talib.STOCHRSI, c1, ['STOCHRSI_K', 'STOCHRSI_D'], RECURSIVE_WINDOW,
+                 timeperiod=14, fastk_period=5, fastd_period=3),
+            _TRIX(30),
+            _UltOsc(7, 14, 28),
+            _Window(14, ['high', 'low', 'close'], ['WILLR'], _willr),
+            # 3. 成交量指标
+            self.volume_flow,
+            # 4. 波动率指标
+            _Volatility(14),
+            # 5. 价格变换
+            _Func('AVGPRICE', lambda o, h, l, c, v: (o + h + l + c) / 4.0),
+            _Func('MEDPRICE', lambda o, h, l, c, v: (h + l) / 2.0),
+            _Func('TYPPRICE', lambda o, h, l, c, v: (h + l + c) / 3.0),
+            _Func('WCLPRICE', lambda o, h, l, c, v: (h + l + c * 2.0) / 4.0),
+            # 6. 周期指标
+            tail(talib.HT_DCPERIOD, c1, ['HT_DCPERIOD'], RECURSIVE_WINDOW, True),
+            tail(talib.HT_DCPHASE, c1, ['HT_DCPHASE'], RECURSIVE_WINDOW, True),
+            tail(talib.HT_PHASOR, c1, ['HT_PHASOR_INPHASE', 'HT_PHASOR_QUAD'], RECURSIVE_WINDOW, True),
+            tail(talib.HT_SINE, c1, ['HT_SINE', 'HT_LEADSINE'], RECURSIVE_WINDOW, True),
+            tail(talib.HT_TRENDMODE, c1, ['HT_TRENDMODE'], RECURSIVE_WINDOW, True),
+        ]
+        # 7. 模式识别
+        for pattern in PATTERN_FUNCTIONS:
+            if hasattr(talib, pattern):
+                window = abstract.Function(pattern).lookback + PATTERN_MARGIN
+                self.nodes.append(tail(getattr(talib, pattern), ohlc, [pattern], window))
+        # 8. 数学变换
+        self.nodes += [
+            _RunningMaxMath(),
+            _Func('ATAN', lambda o, h, l, c, v: _ATAN(c)),
+            _Func('CEIL', lambda o, h, l, c, v: _CEIL(c)),
+            _Func('COS', lambda o, h, l, c, v: _COS(c)),
+            _Func('FLOOR', lambda o, h, l, c, v: _FLOOR(c)),
+            _Func('LN', lambda o, h, l, c, v: _LN(c)),
+            _Func('LOG10', lambda o, h, l, c, v: _LOG10(c)),
+            _Func('SIN', lambda o, h, l, c, v: _SIN(c)),
+            _Func('SQRT', lambda o, h, l, c, v: _SQRT(c)),
+        ]
+        # 9. 统计函数
+        self.nodes += [
+            _Correl(30),
+            _Window(14, ['close'], ['LINEARREG', 'LINEARREG_ANGLE', 'LINEARREG_INTERCEPT',
+                                    'LINEARREG_SLOPE', 'TSF'], _linreg),
+            _StdVar(5),
+        ]
+        self.columns = [name for node in self.nodes for name in node.outputs]
+        if history is not None:
+            self.warm_start(history, warmup_bars)
+
+    def update(self, bar) -> Dict[str, float]:
+        """
+        输入一根K线 (含 open/high/low/close/volume 的 dict 或 Series), 返回这一根的全部特征
+        """
+        o, h, l, c, v = (float(bar[k]) for k in ('open', 'high', 'low', 'close', 'volume'))
+        self.history.push(o, h, l, c, v)
+        row = {}
+        for node in self.nodes:
+            row.update(node.update(o, h, l, c, v))
+        return row
+
+    def warm_start(self, df: pd.DataFrame, warmup_bars: int = WARMUP_BARS):
+        """
+        用历史数据的尾部初始化状态: 回放最后 warmup_bars 根K线;
+        AD / OBV 这类从起点累积的指标, 用全量批量结果的值作为初值
+        """
+        tail = df.iloc[-warmup_bars:]
+        head = df.iloc[:len(df) - len(tail)]
+        if len(head):
+            ad = talib.AD(head['high'], head['low'], head['close'], head['volume']).iloc[-1]
+            obv = talib.OBV(head['close'], head['volume']).iloc[-1]
+            self.volume_flow.seed(float(ad), float(obv))
+            self.volume_flow.prev_close = float(head['close'].iloc[-1])
+            # 以最后一根 AD 作为 ADOSC 的 EMA 种子, 与全量计算的差异会按 EMA 速度衰减
+            self.volume_flow.fast = self.volume_flow.slow = float(ad)
+            self.volume_flow.count = 1
+        for bar in tail[['open', 'high', 'low', 'close', 'volume']].itertuples(index=False):
+            self.update(bar._asdict())
+        return self
+
+    def run(self, df: pd.DataFrame) -> pd.DataFrame:
+        """逐根回放整段数据, 返回与输入同索引的特征表"""
+        rows = [self.update(bar._asdict()) for bar in
+                df[['open', 'high', 'low', 'close', 'volume']].itertuples(index=False)]
+        return pd.DataFrame(rows, index=df.index, columns=self.columns)
+
+
+def check_parity(df: pd.DataFrame, rtol: float = 1e-6, atol: float = 1e-8) -> pd.DataFrame:
+    """
+    流式与批量 TA-Lib 结果的一致性检查, 覆盖 calculate_all_indicators 的全部指标
+
+    返回每个指标的最大绝对/相对偏差以及是否在容差内; LOOKAHEAD_FEATURES 单独标注
+    """
+    batch = TechnicalIndicators(df).calculate_all_indicators()
+    stream = StreamingIndicators().run(df)
+    rows = []
+    for name in stream.columns:
+        b = batch[name].to_numpy(dtype=float)
+        s = stream[name].to_numpy(dtype=float)
+        both = ~np.isnan(b) & ~np.isnan(s)
+        nan_mismatch = int((np.isnan(b) != np.isnan(s)).sum())
+        # 相同的 ±inf (如 close 为 0 时的 LN) 算作一致
+        abs_dev = np.where(b[both] == s[both], 0.0, np.abs(b[both] - s[both]))
+        rel_dev = abs_dev / np.maximum(np.abs(b[both]), atol)
+        max_abs = float(abs_dev.max()) if both.any() else 0.0
+        max_rel = float(rel_dev.max()) if both.any() else 0.0
+        ok = nan_mismatch == 0 and bool(np.all(np.isclose(s[both], b[both], rtol=rtol, atol=atol)))
+        rows.append({'feature': name, 'max_abs_dev': max_abs, 'max_rel_dev': max_rel,
+                     'nan_mismatch': nan_mismatch, 'lookahead': name in LOOKAHEAD_FEATURES, 'ok': ok})
+    return pd.DataFrame(rows).set_index('feature')
+
+
+if __name__ == "__main__":
+    from fake_exchange import synthetic_candles
+
+    candles = synthetic_candles(0, 3000 * 60_000, 60_000, price=30000.0, seed=1)
+    report = check_parity(pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume']))
+    checked = report[~report['lookahead']]
+    print(checked.sort_values('max_rel_dev', ascending=False).head(20))
+    print(f"[🔁 Parity] {int(checked['ok'].sum())}/{len(checked)} features match "
+          f"({int(report['lookahead'].sum())} look-ahead features excluded)")
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+import scraper
+from backfill import TokenBucket, plan_spans, run_backfill, work_items
+from fake_exchange import FakeExchange, synthetic_candles
+from loader import load_ohlcv
+from manifest import DAY_MS, Manifest, day_start_ms
+
+SYMBOLS = ['BTC/USDT', 'ETH/USDT']
+FIRST, LAST = date(2024, 1, 1), date(2024, 1, 3)
+TODAY = date(2024, 2, 1)
+
+
+def _candles(days=3, holes=()):
+    start = day_start_ms(FIRST)
+    rows = {}
+    for i, symbol in enumerate(SYMBOLS):
+        candles = synthetic_candles(start, start + days * DAY_MS, seed=i)
+        rows[symbol] = [row for row in candles if row[0] not in holes]
+    return rows
+
+
+def _backfill(tmp_path, exchange, manifest=None, items=None):
+    def on_day(symbol, day, candles):
+        scraper.save_daily_parquet_to_s3(symbol, day, candles, 'flat', str(tmp_path))
+
+    return asyncio.run(run_backfill(SYMBOLS, FIRST, LAST, exchange=exchange, concurrency=4,
+                                    bucket=TokenBucket(1e9, 1e9), on_day=on_day, items=items, manifest=manifest))
+
+
+def test_plan_spans_groups_consecutive_days():
+    items = work_items(['BTC/USDT'], FIRST, date(2024, 1, 10))
+    items.remove(('BTC/USDT', date(2024, 1, 5)))
+    assert plan_spans(items, max_days=3) == [('BTC/USDT', date(2024, 1, 8), date(2024, 1, 10)),
+                                             ('BTC/USDT', date(2024, 1, 6), date(2024, 1, 7)),
+                                             ('BTC/USDT', date(2024, 1, 2), date(2024, 1, 4)),
+                                             ('BTC/USDT', date(2024, 1, 1), date(2024, 1, 1))]
+
+
+def test_backfill_writes_every_day(tmp_path):
+    exchange = FakeExchange(_candles())
+    results = _backfill(tmp_path, exchange)
+    assert results['done'] == 6 and not results['failed']
+    assert results['candles'] == 6 * 1440
+    # spans are fetched as contiguous pages: 3 days of 1440 bars in 1000-bar pages
+    assert results['stats'].requests == len(SYMBOLS) * 5
+    df = load_ohlcv(str(tmp_path), time_columns=False)
+    assert len(df) == 6 * 1440
+    assert sorted(df['symbol'].unique()) == SYMBOLS
+    assert (df.groupby('symbol')['timestamp'].diff().dropna() == '60s').all()
+
+
+def test_backfill_retries_failed_pages(tmp_path):
+    exchange = FakeExchange(_candles(), fail_every=3)
+    results = _backfill(tmp_path, exchange)
+    assert results['done'] == 6 and not results['failed']
+    assert len(load_ohlcv(str(tmp_path), time_columns=False)) == 6 * 1440
+
+
+def test_manifest_uses_file_exchange_id(tmp_path):
+    manifest = Manifest(str(tmp_path / '_manifest.sqlite'))
+    # the client's own id differs from the one the files are named after
+    _backfill(tmp_path / 'data', FakeExchange(_candles(), id='fake'), manifest)
+    assert manifest.missing_days(scraper.exchange_id(), '1m', 'BTC/USDT', FIRST, LAST, TODAY) == []
+    rebuilt = Manifest(str(tmp_path / '_rebuilt.sqlite'))
+    rebuilt.reconcile_local(str(tmp_path / 'data'))
+    assert rebuilt.entries(scraper.exchange_id(), '1m', 'BTC/USDT') == \
+        {day: (rows, first, last, False) for day, (rows, first, last, _) in
+         manifest.entries(scraper.exchange_id(), '1m', 'BTC/USDT').items()}
+
+
+@pytest.mark.parametrize('hole_bars', [200, 1440])
+def test_short_day_is_refetched_until_confirmed(tmp_path, hole_bars):
+    manifest = Manifest(str(tmp_path / '_manifest.sqlite'))
+    second_day = day_start_ms(date(2024, 1, 2))
+    holes = set(range(second_day + 600 * 60_000, second_day + (600 + hole_bars) * 60_000, 60_000)) \
+        if hole_bars < 1440 else set(range(second_day, second_day + DAY_MS, 60_000))
+    exchange = FakeExchange(_candles(holes=holes))
+    _backfill(tmp_path / 'data', exchange, manifest)
+    missing = manifest.missing_days(scraper.exchange_id(), '1m', 'BTC/USDT', FIRST, LAST, TODAY)
+    assert missing == [date(2024, 1, 2)]
+    # the exchange returns the same short day again: it is its gap, not a transient error
+    _backfill(tmp_path / 'data', exchange, manifest, items=[('BTC/USDT', day) for day in missing])
+    assert manifest.missing_days(scraper.exchange_id(), '1m', 'BTC/USDT', FIRST, LAST, TODAY) == []
@@ -0,0 +1,91 @@
+import asyncio
+import glob
+import os
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+
+import lake
+import scraper
+from backfill import TokenBucket
+from fake_exchange import FakeExchange, synthetic_candles
+from manifest import DAY_MS, day_start_ms
+from quality import RepairQueue, run_repairs, scan
+from resample import resample_lake
+
+DAY = date(2024, 1, 1)
+NOW_MS = day_start_ms(date(2024, 3, 1))
+
+
+@pytest.fixture
+def hourly_lake(tmp_path):
+    """A hive lake with one day of 1m bars and its resampled 1h partition."""
+    root = str(tmp_path / 'lake')
+    start = day_start_ms(DAY)
+    scraper.save_daily_parquet_to_s3('BTC/USDT', DAY.isoformat(), synthetic_candles(start, start + DAY_MS),
+                                     'hive', root)
+    lake.compact(str(tmp_path / 'flat'), root)
+    resample_lake(root, ['1h'])
+    (path,) = glob.glob(os.path.join(root, '**', 'interval=1h', '**', 'data.parquet'), recursive=True)
+    return root, path
+
+
+def _files(root, interval):
+    return sorted(os.path.relpath(p, root) for p in
+                  glob.glob(os.path.join(root, '**', f'interval={interval}', '**', '*.parquet'), recursive=True))
+
+
+def _day_issues(root):
+    # the lake holds one day, the rest of its month is reported missing
+    issues, _ = scan(root, full=True, workers=1, now_ms=NOW_MS)
+    return issues[issues['start_ms'] < day_start_ms(DAY) + DAY_MS]
+
+
+def _repair(root, tmp_path, issues, exchange):
+    queue = RepairQueue(str(tmp_path / 'repairs.sqlite'))
+    queue.enqueue(issues)
+    done = asyncio.run(run_repairs(queue, exchange=exchange, bucket=TokenBucket(1e9, 1e9)))
+    queue.close()
+    return done
+
+
+def test_repairs_derived_interval_in_place(hourly_lake, tmp_path):
+    root, path = hourly_lake
+    hourly = pq.read_table(path)
+    rows = [[t, o, h, l, c, v] for t, o, h, l, c, v in zip(*(hourly.column(name).to_pylist()
+                                                           for name in lake.DATA_COLUMNS))]
+    # three hours go missing from the 1h partition, plus an off-grid row
+    hole = pc.and_(pc.greater_equal(hourly['timestamp'], rows[5][0]), pc.less(hourly['timestamp'], rows[8][0]))
+    broken = hourly.filter(pc.invert(hole))
+    off_grid = broken.slice(0, 1).set_column(0, 'timestamp', pc.add(broken.slice(0, 1)['timestamp'], 60_000))
+    pq.write_table(pa.concat_tables([broken, off_grid]), path)
+    source_files = _files(root, '1m')
+
+    issues = _day_issues(root)
+    assert set(issues['interval']) == {'1h'} and set(issues['kind']) >= {'missing', 'off_grid'}
+    done = _repair(root, tmp_path, issues, FakeExchange({'BTC/USDT': rows}, id=scraper.exchange_id()))
+    assert done['done'] > 0 and done['failed'] == 0
+
+    # the 1m partition is untouched, the 1h one got a delta of hourly bars
+    assert _files(root, '1m') == source_files
+    (delta,) = [p for p in _files(root, '1h') if os.path.basename(p).startswith(lake.DELTA_PREFIX)]
+    repaired = pq.read_table(os.path.join(root, delta))
+    assert repaired.num_rows == 24
+    assert (repaired['timestamp'].to_numpy() % 3_600_000 == 0).all()
+    lake.compact(str(tmp_path / 'flat'), root)
+    ts = pq.read_table(path)['timestamp'].to_numpy()
+    assert (ts % 3_600_000 == 0).sum() == 24
+    assert 'missing' not in set(_day_issues(root)['kind'])
+
+
+def test_refetch_from_another_exchange_stays_pending(hourly_lake, tmp_path):
+    root, path = hourly_lake
+    table = pq.read_table(path)
+    pq.write_table(table.slice(0, 20), path)
+    issues = _day_issues(root)
+    done = _repair(root, tmp_path, issues, FakeExchange({}, id='other'))
+    assert done['failed'] == len(issues) and not done['done']
+    assert RepairQueue(str(tmp_path / 'repairs.sqlite')).counts() == {'pending': len(issues)}
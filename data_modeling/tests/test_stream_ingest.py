@@ -0,0 +1,99 @@
+import asyncio
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+import scraper
+from backfill import TokenBucket
+from fake_exchange import synthetic_candles
+from loader import load_ohlcv
+from stream_ingest import KlineIngester, run_fake
+
+SYMBOLS = ['BTC/USDT', 'ETH/USDT']
+START = int(datetime(2024, 1, 1, 23, 0, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _ingester(tmp_path, on_day=None):
+    def save(symbol, day, candles, **options):
+        scraper.save_daily_parquet_to_s3(symbol, day, candles, **options)
+
+    return KlineIngester(SYMBOLS, on_day=on_day or save, layout='hive', root=str(tmp_path),
+                         bucket=TokenBucket(1e9, 1e9))
+
+
+def _queue(ingester, bars=120):
+    # 23:00 + 120 bars crosses midnight, so each symbol writes two days
+    for i, symbol in enumerate(SYMBOLS):
+        for row in synthetic_candles(START, START + bars * 60_000, seed=i):
+            ingester._add(symbol, row[0], row[1:])
+
+
+def test_fake_stream_recovers_dropped_bars(tmp_path):
+    pytest.importorskip('websockets')
+    metrics, rows, expected = asyncio.run(run_fake(str(tmp_path), SYMBOLS, bars=1200, bars_per_second=2000.0))
+    assert rows == expected
+    assert metrics.gaps > 0 and metrics.gap_filled_bars > 0
+    assert metrics.backlog == 0 and metrics.write_errors == 0
+
+
+def test_failed_flush_keeps_bars_pending(tmp_path):
+    calls = []
+
+    def flaky(symbol, day, candles, **options):
+        calls.append((symbol, day))
+        if len(calls) == 1:
+            raise OSError('disk full')
+        scraper.save_daily_parquet_to_s3(symbol, day, candles, **options)
+
+    ingester = _ingester(tmp_path, flaky)
+    _queue(ingester)
+    with pytest.raises(OSError):
+        asyncio.run(ingester.flush())
+    # the other symbol was still written, the failed one kept all of its bars
+    assert ingester.metrics.write_errors == 1
+    assert ingester.metrics.backlog == 120
+    assert len(ingester._states['BTC/USDT'].pending) == 120
+    assert not ingester._states['ETH/USDT'].pending
+
+    assert asyncio.run(ingester.flush()) == 120
+    assert ingester.metrics.backlog == 0 and ingester.metrics.oldest_pending is None
+    df = load_ohlcv(str(tmp_path), time_columns=False)
+    assert df.groupby('symbol').size().tolist() == [120] * len(SYMBOLS)
+
+
+def test_flusher_survives_write_errors(tmp_path):
+    failures = [OSError('timeout')] * 3
+
+    def flaky(symbol, day, candles, **options):
+        if failures:
+            raise failures.pop()
+        scraper.save_daily_parquet_to_s3(symbol, day, candles, **options)
+
+    async def run():
+        ingester = _ingester(tmp_path, flaky)
+        ingester.flush_seconds = 0.01
+        _queue(ingester)
+        flusher = asyncio.create_task(ingester._flusher())
+        for _ in range(200):
+            await asyncio.sleep(0.01)
+            if not ingester.metrics.backlog:
+                break
+        await ingester.stop()
+        await flusher
+        return ingester
+
+    ingester = asyncio.run(run())
+    assert ingester.metrics.write_errors == 3
+    assert ingester.metrics.backlog == 0
+    assert len(load_ohlcv(str(tmp_path), time_columns=False)) == 120 * len(SYMBOLS)
+
+
+def test_import_does_not_load_ccxt():
+    # the ingester and the repair job (quality imports merge_bars) must not pay for ccxt on import
+    code = "import sys, quality, stream_ingest; print(any(m.split('.')[0] == 'ccxt' for m in sys.modules))"
+    out = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.dirname(__file__)),
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == 'False'
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fake_exchange import synthetic_candles
+from features import TechnicalIndicators
+from streaming import LOOKAHEAD_FEATURES, StreamingIndicators, check_parity
+
+BARS = 3000
+SPLIT = 2500
+RTOL, ATOL = 1e-6, 1e-8
+
+
+@pytest.fixture(scope='module')
+def candles():
+    rows = synthetic_candles(0, BARS * 60_000, 60_000, price=30000.0, seed=1)
+    return pd.DataFrame(rows, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+
+
+@pytest.fixture(scope='module')
+def batch(candles):
+    return TechnicalIndicators(candles).calculate_all_indicators()
+
+
+@pytest.fixture(scope='module')
+def cold(candles):
+    return check_parity(candles, RTOL, ATOL)
+
+
+# 归一化用的是全历史 close 最大值, 批量结果本身带未来信息, 流式无法也不应复现
+STREAMED = [name for name in StreamingIndicators().columns if name not in LOOKAHEAD_FEATURES]
+
+
+def test_streams_every_batch_feature(batch):
+    assert set(StreamingIndicators().columns) <= set(batch.columns)
+
+
+@pytest.mark.parametrize('feature', STREAMED)
+def test_cold_start_parity(cold, feature):
+    row = cold.loc[feature]
+    assert row['nan_mismatch'] == 0
+    assert row['ok'], f"max abs {row['max_abs_dev']:.3g}, max rel {row['max_rel_dev']:.3g}"
+
+
+@pytest.fixture(scope='module')
+def warm(candles):
+    # 前 SPLIT 根作为历史热启动, 之后逐根更新
+    stream = StreamingIndicators(history=candles.iloc[:SPLIT])
+    rows = [stream.update(bar) for bar in candles.iloc[SPLIT:].to_dict('records')]
+    return pd.DataFrame(rows, index=candles.index[SPLIT:], columns=stream.columns)
+
+
+@pytest.mark.parametrize('feature', STREAMED)
+def test_warm_start_parity(batch, warm, feature):
+    expected = batch[feature].iloc[SPLIT:].to_numpy(dtype=float)
+    np.testing.assert_allclose(warm[feature].to_numpy(dtype=float), expected, rtol=RTOL, atol=ATOL)
+
+
+def test_lookahead_features_are_flagged(cold):
+    assert set(cold.index[cold['lookahead']]) == set(LOOKAHEAD_FEATURES)
+
+
+# 逐K线的数学变换没有跨K线状态, 坏数据只影响它自己那一根, 必须与批量逐值一致
+MATH_FEATURES = ['ATAN', 'CEIL', 'COS', 'FLOOR', 'LN', 'LOG10', 'SIN', 'SQRT']
+
+
+@pytest.fixture(scope='module')
+def bad_bars(candles):
+    # NaN、负数和 0 收盘价: TA-Lib 批量结果给 NaN / -inf, 流式不能因此抛异常
+    df = candles.iloc[:600].copy()
+    df.loc[400, 'close'] = np.nan
+    df.loc[450, 'close'] = -1.0
+    df.loc[451, 'close'] = 0.0
+    return df
+
+
+def test_bad_bars_do_not_raise(bad_bars):
+    stream = StreamingIndicators().run(bad_bars)
+    assert np.isnan(stream.loc[400, 'LN']) and np.isnan(stream.loc[450, 'SQRT'])
+    assert stream.loc[451, 'LN'] == -np.inf
+    assert stream.loc[400, LOOKAHEAD_FEATURES].isna().all()
+
+
+@pytest.fixture(scope='module')
+def bad_parity(bad_bars):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return check_parity(bad_bars, RTOL, ATOL)
+
+
+@pytest.mark.parametrize('feature', MATH_FEATURES)
+def test_bad_bar_parity(bad_parity, feature):
+    row = bad_parity.loc[feature]
+    assert row['nan_mismatch'] == 0 and row['ok']
@@ -0,0 +1,75 @@
+import io
+import os
+from datetime import date, timedelta
+
+import pyarrow.parquet as pq
+import pytest
+
+from backfill import day_bounds
+from fake_exchange import synthetic_candles
+from manifest import Manifest
+from scraper import BUCKET, CandleBuffer, s3_key
+from uploader import UploadPipeline, make_s3_client, run_moto
+
+pytest.importorskip('moto')
+SYMBOLS = ['BTC/USDT', 'ETH/USDT']
+FIRST = date(2024, 1, 1)
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    from moto import mock_aws
+
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.delenv('S3_ENDPOINT_URL', raising=False)
+    with mock_aws():
+        client = make_s3_client(4)
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def _day(k, seed=0):
+    since, until = day_bounds(FIRST + timedelta(days=k))
+    return (FIRST + timedelta(days=k)).isoformat(), CandleBuffer.from_rows(synthetic_candles(since, until, seed=seed))
+
+
+def test_run_moto_reads_every_object_back():
+    stats, objects, rows = run_moto(days=3, symbols=SYMBOLS, upload_workers=4)
+    assert objects == 3 * len(SYMBOLS) == stats['upload']['items']
+    assert rows == 3 * len(SYMBOLS) * 1440
+    assert stats['failed'] == 0
+
+
+def test_manifest_records_only_uploaded_days(s3, tmp_path):
+    manifest = Manifest(os.path.join(tmp_path, '_manifest.sqlite'))
+    failing_key = s3_key('ETH/USDT', _day(1)[0], 'hive')
+    put = s3.upload_fileobj
+
+    def upload_fileobj(fileobj, bucket, key, **kwargs):
+        if key == failing_key:
+            raise OSError('connection reset')
+        return put(fileobj, bucket, key, **kwargs)
+
+    s3.upload_fileobj = upload_fileobj
+
+    def on_uploaded(symbol, day, candles):
+        manifest.record_candles('binance', '1m', symbol, day, candles, fetched=True)
+
+    with UploadPipeline(BUCKET, s3=s3, layout='hive', upload_workers=4, max_retries=1,
+                        on_uploaded=on_uploaded) as pipeline:
+        for k in range(2):
+            for i, symbol in enumerate(SYMBOLS):
+                pipeline.submit(symbol, *_day(k, seed=k * 10 + i))
+    assert pipeline.failed == [('ETH/USDT', _day(1)[0])]
+    assert pipeline.retries == 1
+
+    recorded = {(symbol, day) for symbol in SYMBOLS
+                for day in manifest.entries('binance', '1m', symbol)}
+    assert recorded == {('BTC/USDT', '2024-01-01'), ('ETH/USDT', '2024-01-01'), ('BTC/USDT', '2024-01-02')}
+    # the failed day is still missing and gets fetched again
+    assert manifest.missing_days('binance', '1m', 'ETH/USDT', FIRST, FIRST + timedelta(days=1),
+                                 today=date(2024, 2, 1)) == [FIRST + timedelta(days=1)]
+    manifest.close()
+
+    key = s3_key('BTC/USDT', _day(1)[0], 'hive')
+    assert pq.read_table(io.BytesIO(s3.get_object(Bucket=BUCKET, Key=key)['Body'].read())).num_rows == 1440
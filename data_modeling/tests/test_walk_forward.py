@@ -0,0 +1,56 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('lightgbm')
+import walk_forward  # noqa: E402
+
+
+def _frame(n=600, seed=0, freq='min'):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 1e-3, n)))
+    df = pd.DataFrame({'timestamp': pd.date_range('2024-01-01', periods=n, freq=freq),
+                       'open': close, 'high': close * 1.001, 'low': close * 0.999, 'close': close,
+                       'volume': rng.uniform(1, 10, n)})
+    return df.assign(RSI=rng.normal(50, 10, n), ACOS=np.arccos(close / close.max()))
+
+
+def _run(df, features, monkeypatch):
+    used = []
+    design_matrix = walk_forward.design_matrix
+
+    def spy(df, features, *args, **kwargs):
+        used.extend(features)
+        return design_matrix(df, features, *args, **kwargs)
+
+    monkeypatch.setattr(walk_forward, 'design_matrix', spy)
+    report = walk_forward.walk_forward(df, features, horizons=[1], train_bars=300, test_bars=100,
+                                       num_boost_round=5, fold_workers=1, params={'min_data_in_leaf': 10})
+    return report, used
+
+
+def test_default_features_exclude_lookahead(monkeypatch):
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        report, used = _run(_frame(), None, monkeypatch)
+    assert 'ACOS' not in used and 'RSI' in used
+    assert len(report) > 0
+
+
+def test_explicit_lookahead_features_warn(monkeypatch):
+    with pytest.warns(UserWarning, match='ACOS'):
+        _, used = _run(_frame(), ['RSI', 'ACOS'], monkeypatch)
+    assert used == ['RSI', 'ACOS']
+
+
+def test_hourly_store_scales_windows_and_labels():
+    df = _frame(n=24 * 25, freq='h')
+    ts = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+    assert walk_forward.infer_step_ms(ts) == 3_600_000
+    report = walk_forward.walk_forward(df, ['RSI'], horizons=[1, 4], train_days=10, test_days=3,
+                                       num_boost_round=5, fold_workers=1, params={'min_data_in_leaf': 10})
+    # 10 / 3 days of hourly bars: 240-bar training windows, 72-bar test windows, every label present
+    assert (report['train_rows'] == 240).all() and (report['test_rows'] == 72).all()
+    assert sorted(report['horizon'].unique()) == [1, 4]
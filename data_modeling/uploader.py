@@ -0,0 +1,252 @@
+import io
+import os
+import queue
+import random
+import threading
+import time
+
+import boto3
+import pyarrow.parquet as pq
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+from scraper import BUCKET, daily_path, day_table, s3_key
+
+# === CONFIG ===
+ENCODE_WORKERS = 2
+UPLOAD_WORKERS = 16
+QUEUE_SIZE = 64                 # per stage; a full queue blocks the stage before it
+MAX_RETRIES = 5
+MULTIPART_THRESHOLD = 8 * 1024 ** 2
+MULTIPART_CHUNKSIZE = 8 * 1024 ** 2
+
+_DONE = object()
+
+
+def make_s3_client(max_pool_connections=UPLOAD_WORKERS, endpoint_url=None):
+    """One pooled, thread-safe client shared by all upload workers."""
+    return boto3.client('s3', endpoint_url=endpoint_url or os.environ.get('S3_ENDPOINT_URL'),
+                        config=Config(max_pool_connections=max_pool_connections,
+                                      retries={'max_attempts': 3, 'mode': 'standard'}))
+
+
+class StageStats:
+    """Items, busy time and queue depth (current and peak) of one pipeline stage."""
+
+    def __init__(self, name, q):
+        self.name = name
+        self.queue = q
+        self.items = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def observe_depth(self):
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def add(self, seconds, nbytes=0):
+        with self._lock:
+            self.items += 1
+            self.bytes += nbytes
+            self.busy += seconds
+
+    def snapshot(self, elapsed):
+        return {'items': self.items, 'bytes': self.bytes, 'busy_seconds': self.busy,
+                'depth': self.queue.qsize(), 'max_depth': self.max_depth,
+                'items_per_second': self.items / elapsed if elapsed else 0.0,
+                'mb_per_second': self.bytes / 1e6 / elapsed if elapsed else 0.0}
+
+
+class UploadPipeline:
+    """
+    fetch -> encode -> upload, decoupled by bounded queues.
+
+    `submit(symbol, day, candles)` has the on_day signature, so it plugs into
+    run_backfill / KlineIngester directly; it only enqueues and blocks when the
+    encode queue is full, which throttles fetching to what the uploads sustain.
+    Encoder threads write parquet into an in-memory buffer (no temp files);
+    upload threads share one pooled client and retry with jittered backoff.
+    Objects above MULTIPART_THRESHOLD go up as multipart uploads.
+
+    keep_local=True also writes the encoded bytes to the scraper's local layout.
+    `on_uploaded(symbol, day, candles)` runs in the upload thread once a day's
+    object is stored (e.g. to record it in the manifest); days that fail to
+    encode or upload never reach it and end up in `failed` instead. Empty days
+    have nothing to upload and go to `on_uploaded` straight from submit().
+    """
+
+    def __init__(self, bucket=BUCKET, s3=None, layout=None, encode_workers=ENCODE_WORKERS,
+                 upload_workers=UPLOAD_WORKERS, queue_size=QUEUE_SIZE, max_retries=MAX_RETRIES,
+                 keep_local=False, root=None, on_uploaded=None):
+        self.bucket = bucket
+        self.s3 = s3 or make_s3_client(upload_workers)
+        self.layout = layout
+        self.keep_local = keep_local
+        self.root = root
+        self.max_retries = max_retries
+        self.on_uploaded = on_uploaded
+        self.transfer_config = TransferConfig(multipart_threshold=MULTIPART_THRESHOLD,
+                                              multipart_chunksize=MULTIPART_CHUNKSIZE, use_threads=False)
+        self.encode_queue = queue.Queue(queue_size)
+        self.upload_queue = queue.Queue(queue_size)
+        self.encode_stats = StageStats('encode', self.encode_queue)
+        self.upload_stats = StageStats('upload', self.upload_queue)
+        self.submitted = 0
+        self.retries = 0
+        self.failed = []
+        self.started = None
+        self._encoders = [threading.Thread(target=self._encode_loop, daemon=True) for _ in range(encode_workers)]
+        self._uploaders = [threading.Thread(target=self._upload_loop, daemon=True) for _ in range(upload_workers)]
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        self.started = time.monotonic()
+        for t in self._encoders + self._uploaders:
+            t.start()
+        return self
+
+    def submit(self, symbol, day, candles):
+        if not candles:
+            print(f"[⚠️ Empty] No data for {symbol} on {day}")
+            self._uploaded(symbol, day, candles)
+            return
+        self.encode_queue.put((symbol, day, candles))
+        self.encode_stats.observe_depth()
+        with self._lock:
+            self.submitted += 1
+
+    def close(self):
+        """Drain both stages and stop the workers."""
+        for _ in self._encoders:
+            self.encode_queue.put(_DONE)
+        for t in self._encoders:
+            t.join()
+        for _ in self._uploaders:
+            self.upload_queue.put(_DONE)
+        for t in self._uploaders:
+            t.join()
+        print(f"[☁️ Upload] {self.upload_stats.items}/{self.submitted} objects, "
+              f"{self.upload_stats.bytes / 1e6:.1f} MB, {self.retries} retries, {len(self.failed)} failed")
+
+    def _encode_loop(self):
+        while True:
+            item = self.encode_queue.get()
+            if item is _DONE:
+                return
+            symbol, day, candles = item
+            started = time.monotonic()
+            try:
+                table, options = day_table(symbol, candles, self.layout)
+                sink = io.BytesIO()
+                pq.write_table(table, sink, **options)
+                data = sink.getvalue()
+                if self.keep_local:
+                    _write_bytes_atomic(daily_path(symbol, day, self.layout, self.root), data)
+            except Exception as e:
+                print(f"[❌ Encode] {symbol} {day} : {e}")
+                with self._lock:
+                    self.failed.append((symbol, day))
+                continue
+            self.encode_stats.add(time.monotonic() - started, len(data))
+            self.upload_queue.put((s3_key(symbol, day, self.layout), data, symbol, day, candles))
+            self.upload_stats.observe_depth()
+
+    def _upload_loop(self):
+        while True:
+            item = self.upload_queue.get()
+            if item is _DONE:
+                return
+            key, data, symbol, day, candles = item
+            started = time.monotonic()
+            if self._put(key, data):
+                self.upload_stats.add(time.monotonic() - started, len(data))
+                self._uploaded(symbol, day, candles)
+            else:
+                with self._lock:
+                    self.failed.append((symbol, day))
+
+    def _uploaded(self, symbol, day, candles):
+        if self.on_uploaded is None:
+            return
+        try:
+            self.on_uploaded(symbol, day, candles)
+        except Exception as e:
+            # the object is stored; an unrecorded day is only fetched again
+            print(f"[⚠️ Uploaded] {symbol} {day} callback failed: {e}")
+
+    def _put(self, key, data):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.s3.upload_fileobj(io.BytesIO(data), self.bucket, key, Config=self.transfer_config)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"[❌ Upload] {key} : {e}")
+                    return False
+                with self._lock:
+                    self.retries += 1
+                time.sleep(min(0.2 * 2 ** attempt, 10) * (0.5 + random.random()))
+        return False
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        return {'submitted': self.submitted, 'retries': self.retries, 'failed': len(self.failed),
+                'seconds': elapsed, 'encode': self.encode_stats.snapshot(elapsed),
+                'upload': self.upload_stats.snapshot(elapsed)}
+
+
+def _write_bytes_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp-{os.getpid()}-{threading.get_ident()}")
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def run_moto(days=60, symbols=('BTC/USDT', 'ETH/USDT', 'SOL/USDT'), upload_workers=UPLOAD_WORKERS):
+    """
+    Push synthetic days through the pipeline into moto's in-process S3 and
+    read every object back. Returns (stats, objects listed, rows read back).
+    """
+    from datetime import date, timedelta
+
+    from moto import mock_aws
+
+    from backfill import day_bounds
+    from fake_exchange import synthetic_candles
+    from scraper import CandleBuffer
+
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        s3 = make_s3_client(upload_workers)
+        s3.create_bucket(Bucket=BUCKET)
+        with UploadPipeline(BUCKET, s3=s3, layout='hive', upload_workers=upload_workers) as pipeline:
+            first = date(2024, 1, 1)
+            for k in range(days):
+                day = first + timedelta(days=k)
+                since, until = day_bounds(day)
+                for i, symbol in enumerate(symbols):
+                    pipeline.submit(symbol, day.isoformat(),
+                                    CandleBuffer.from_rows(synthetic_candles(since, until, seed=k * 10 + i)))
+        stats = pipeline.stats()
+        keys = [o['Key'] for page in s3.get_paginator('list_objects_v2').paginate(Bucket=BUCKET)
+                for o in page.get('Contents', [])]
+        rows = sum(pq.read_table(io.BytesIO(s3.get_object(Bucket=BUCKET, Key=key)['Body'].read())).num_rows
+                   for key in keys)
+    return stats, len(keys), rows
+
+
+if __name__ == "__main__":
+    stats, objects, rows = run_moto()
+    print(f"[🧪 Moto] {objects} objects, {rows} rows read back")
+    for stage in ('encode', 'upload'):
+        s = stats[stage]
+        print(f"  {stage:<7} {s['items']:5d} items  {s['items_per_second']:7.1f}/s  {s['mb_per_second']:6.2f} MB/s  "
+              f"busy {s['busy_seconds']:6.2f}s  max depth {s['max_depth']}")
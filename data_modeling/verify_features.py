@@ -0,0 +1,114 @@
+import argparse
+import time
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from build_features import (OHLCV, compute_chunk, index_sources, month_chunks, resolve_warmup,
+                            scan_anchors)
+from feature_registry import REGISTRY
+from features import TechnicalIndicators
+from loader import load_ohlcv, to_ms
+from manifest import normalize_symbol
+
+# === CONFIG ===
+RTOL = 1e-6                     # 相对误差在此以内视为一致 (float32 存储的精度量级)
+ATOL = 1e-9
+
+
+def single_pass(src_root, symbol, start_ms=None, end_ms=None, features=None, dtype='float64') -> pd.DataFrame:
+    """对照: end_ms 之前的整段历史一次性计算, 再取 [start_ms, end_ms)"""
+    df = load_ohlcv(src_root, symbols=[symbol], end=end_ms, columns=OHLCV, time_columns=False)
+    df = df[['timestamp'] + OHLCV]
+    result = TechnicalIndicators(df, dtype=np.dtype(dtype)).calculate_all_indicators(features)
+    if start_ms is not None:
+        result = result[df['timestamp'].to_numpy() >= np.datetime64(start_ms, 'ms')]
+    return result.reset_index(drop=True)
+
+
+def chunked(src_root, symbol, start_ms=None, end_ms=None, features=None, warmup_bars=None,
+            dtype='float64') -> pd.DataFrame:
+    """与 build_features 相同的按月分块计算, 拼回一张表"""
+    files = index_sources(src_root)[symbol]
+    chunks = month_chunks(files, start_ms, end_ms)
+    anchors = scan_anchors(src_root, symbol, files, [c[1] for c in chunks], chunks[-1][2] if chunks else None,
+                           features)
+    frames = [compute_chunk(src_root, symbol, chunk_start, chunk_end, warmup_bars, features, dtype,
+                            anchors.get(chunk_start))
+              for _, chunk_start, chunk_end in chunks]
+    return pd.concat(frames, ignore_index=True)
+
+
+def compare(reference: pd.DataFrame, result: pd.DataFrame, names: List[str], rtol: float = RTOL,
+            atol: float = ATOL) -> pd.DataFrame:
+    """
+    逐特征比较分块结果与整段结果
+
+    返回每个特征的最大绝对误差、相对误差 (相对该特征的最大绝对值, 避免接近 0 的值放大误差)、
+    超出容差的行数、NaN 位置不一致的行数, 以及最后一个超出容差的时间戳
+    (通常落在某个块的开头, 说明预热不够)
+    """
+    if not reference['timestamp'].equals(result['timestamp']):
+        raise ValueError("Chunked and single-pass results cover different bars")
+    ts = reference['timestamp'].to_numpy()
+    rows = []
+    for name in names:
+        a = reference[name].to_numpy(dtype=np.float64)
+        b = result[name].to_numpy(dtype=np.float64)
+        both = ~np.isnan(a) & ~np.isnan(b)
+        diff = np.where(both, np.abs(a - b), 0.0)
+        scale = np.abs(a[both]).max(initial=0.0)
+        bad = (diff > atol + rtol * scale) | (np.isnan(a) != np.isnan(b))
+        rows.append({
+            'feature': name,
+            'warmup_bars': REGISTRY.warmup([name])[name],
+            'max_abs': diff.max(initial=0.0),
+            'max_rel': diff.max(initial=0.0) / scale if scale > 0 else 0.0,
+            'bad_rows': int(bad.sum()),
+            'nan_mismatch': int((np.isnan(a) != np.isnan(b)).sum()),
+            'last_bad': ts[bad][-1] if bad.any() else pd.NaT,
+        })
+    return pd.DataFrame(rows).set_index('feature').sort_values(['bad_rows', 'max_rel'], ascending=False)
+
+
+def verify(src_root, symbol, start=None, end=None, features: Optional[List[str]] = None,
+           warmup_bars: Optional[int] = None, rtol: float = RTOL, atol: float = ATOL) -> pd.DataFrame:
+    symbol = normalize_symbol(symbol)
+    start_ms, end_ms = to_ms(start), to_ms(end)
+    names = REGISTRY.select(features)
+    warmup_bars = resolve_warmup(features, warmup_bars)
+
+    started = time.monotonic()
+    reference = single_pass(src_root, symbol, start_ms, end_ms, features)
+    single_seconds = time.monotonic() - started
+    started = time.monotonic()
+    result = chunked(src_root, symbol, start_ms, end_ms, features, warmup_bars)
+    chunked_seconds = time.monotonic() - started
+
+    report = compare(reference, result, names, rtol, atol)
+    failed = int((report['bad_rows'] > 0).sum())
+    print(f"[🔍 Verify] {symbol}: {len(names) - failed}/{len(names)} features within rtol={rtol:g}, "
+          f"{len(reference)} rows, warmup {warmup_bars} bars "
+          f"(single pass {single_seconds:.1f}s, chunked {chunked_seconds:.1f}s)")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分块计算与整段计算的逐特征误差')
+    parser.add_argument('src', help='K线 lake 或日文件目录')
+    parser.add_argument('symbol', help='如 BTC/USDT')
+    parser.add_argument('--start', help='YYYY-MM-DD')
+    parser.add_argument('--end', help='YYYY-MM-DD (不含)')
+    parser.add_argument('--features', nargs='*', help="特征名或通配符")
+    parser.add_argument('--warmup-bars', type=int, help='默认按所选特征自动决定')
+    parser.add_argument('--rtol', type=float, default=RTOL)
+    parser.add_argument('--all', action='store_true', help='列出全部特征, 默认只列前 30')
+    args = parser.parse_args()
+    report = verify(args.src, args.symbol, args.start, args.end, args.features, args.warmup_bars, args.rtol)
+    pd.set_option('display.width', 160)
+    print(report.to_string() if args.all else report.head(30).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+import argparse
+import glob
+import os
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from feature_registry import REGISTRY
+from feature_storage import read_features
+from loader import DAY_MS, MINUTE_MS, to_ms
+from manifest import INTERVAL_MS, normalize_symbol
+
+# === CONFIG ===
+HORIZONS = [1, 5, 15, 60]       # 预测未来 h 根K线的对数收益
+LAGS = 3                        # LAG_COLUMNS 各取前 1..LAGS 根的值作为额外特征
+LAG_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+TRAIN_DAYS = 30                 # 训练/测试窗口按天配置, 按特征库的K线周期换算成根数
+TEST_DAYS = 7
+EXPANDING = False               # True: 训练窗口从头开始累积; False: 固定长度滚动
+FOLD_WORKERS = os.cpu_count() or 1
+BIN_SAMPLE_ROWS = 200_000       # 分箱边界只在这么多行的抽样上计算
+NUM_BOOST_ROUND = 100
+LGB_PARAMS = {
+    'objective': 'regression',
+    'learning_rate': 0.1,
+    'num_leaves': 31,
+    'max_bin': 255,
+    'min_data_in_leaf': 100,
+    'feature_pre_filter': False,
+    'verbosity': -1,
+    'seed': 42,
+}
+STAGES = ('load', 'design', 'bin', 'dataset', 'train', 'predict')
+
+
+class StageTimer:
+    """各阶段累计耗时; train / predict 在多个线程里并行, 记的是各折耗时之和"""
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+
+    def add(self, stage: str, seconds: float):
+        self.seconds[stage] += seconds
+
+    def summary(self) -> str:
+        return ', '.join(f"{stage} {self.seconds[stage]:.1f}s" for stage in STAGES)
+
+
+def read_feature_store(out_root, symbol, start=None, end=None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """读 build_features 输出的某个 symbol 的全部月份, 按时间拼接"""
+    paths = sorted(glob.glob(os.path.join(out_root, f'symbol={normalize_symbol(symbol)}', '**', '*.parquet'),
+                             recursive=True))
+    if not paths:
+        raise FileNotFoundError(f"No feature files for {symbol} under {out_root}")
+    df = pd.concat([read_features(p) for p in paths], ignore_index=True)
+    ts = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+    start_ms, end_ms = to_ms(start), to_ms(end)
+    keep = np.ones(len(df), dtype=bool)
+    if start_ms is not None:
+        keep &= ts >= start_ms
+    if end_ms is not None:
+        keep &= ts < end_ms
+    df = df[keep] if not keep.all() else df
+    if columns is not None:
+        df = df[['timestamp'] + [c for c in columns if c != 'timestamp']]
+    return df.reset_index(drop=True)
+
+
+def lag_view(values: np.ndarray, lags: int) -> np.ndarray:
+    """
+    (n, k) -> (n - lags, k, lags) 的只读视图, [t, j, i] 为第 j 列在 t + lags 之前第 i + 1 根的值
+    不复制数据, 只改 strides
+    """
+    windows = sliding_window_view(values, lags + 1, axis=0)     # (n - lags, k, lags + 1), 最后一维时间正序
+    return windows[:, :, -2::-1]
+
+
+def infer_step_ms(timestamps: np.ndarray) -> int:
+    """相邻K线时间差的中位数, 即特征库的K线周期 (毫秒); 少于两根时按 1m"""
+    steps = np.diff(timestamps)
+    steps = steps[steps > 0]
+    return int(np.median(steps)) if len(steps) else MINUTE_MS
+
+
+def horizon_targets(timestamps: np.ndarray, close: np.ndarray, horizons: Sequence[int],
+                    step_ms: int = MINUTE_MS) -> np.ndarray:
+    """
+    (n, len(horizons)) 的未来对数收益 log(close[t+h] / close[t])
+
+    t 与 t+h 两侧都是切片视图, 只有结果本身分配内存;
+    末尾不足 h 根、或 t..t+h 之间有缺失K线 (时间差不等于 h 根) 的位置为 NaN
+    """
+    log_close = np.log(close)
+    out = np.full((len(close), len(horizons)), np.nan)
+    for j, h in enumerate(horizons):
+        if h >= len(close):
+            continue
+        contiguous = timestamps[h:] - timestamps[:-h] == h * step_ms
+        out[:-h, j] = np.where(contiguous, log_close[h:] - log_close[:-h], np.nan)
+    return out
+
+
+def design_matrix(df: pd.DataFrame, features: List[str], lag_columns: List[str] = LAG_COLUMNS,
+                  lags: int = LAGS) -> Tuple[np.ndarray, List[str]]:
+    """
+    特征 + 滞后列的 float32 设计矩阵 (列优先, LightGBM 可直接读取不再转换)
+
+    与逐列 shift(i) 结果相同, 开头不足 i 根的位置为 NaN (LightGBM 把 NaN 当缺失处理);
+    滞后值由 lag_view 的视图一次写入, 不经过逐列 shift 产生的中间 DataFrame
+    """
+    n = len(df)
+    lag_columns = [c for c in lag_columns if c in df.columns] if lags else []
+    names = list(features) + [f'{c}_lag{i}' for i in range(1, lags + 1) for c in lag_columns]
+    X = np.empty((n, len(names)), dtype=np.float32, order='F')
+    for j, name in enumerate(features):
+        X[:, j] = df[name].to_numpy()
+    if lag_columns:
+        base = df[lag_columns].to_numpy(dtype=np.float64)
+        # 列优先的视图: [t, j, i] 正好是 names 里 f'{lag_columns[j]}_lag{i + 1}' 那一列
+        lagged = X[:, len(features):].reshape(n, len(lag_columns), lags, order='F')
+        lagged[:lags] = np.nan
+        if n > lags:
+            lagged[lags:] = lag_view(base, lags)
+        for i in range(1, min(lags, n)):
+            lagged[i:lags, :, i - 1] = base[:lags - i]
+    return X, names
+
+
+def walk_forward_folds(n: int, train_bars: int, test_bars: int, gap: int = 0,
+                       expanding: bool = EXPANDING) -> List[Tuple[slice, slice]]:
+    """
+    (train, test) 行区间; 测试窗口依次后移 test_bars, 训练窗口紧挨在 gap 根之前
+    gap 至少取最大预测跨度, 否则训练集最后几行的标签会用到测试期的价格
+    """
+    folds = []
+    test_start = train_bars + gap
+    while test_start + test_bars <= n:
+        train_end = test_start - gap
+        folds.append((slice(0 if expanding else train_end - train_bars, train_end),
+                      slice(test_start, test_start + test_bars)))
+        test_start += test_bars
+    return folds
+
+
+def binned_dataset(X: np.ndarray, feature_names: List[str], params: Dict,
+                   sample_rows: int = BIN_SAMPLE_ROWS) -> lgb.Dataset:
+    """
+    整段设计矩阵装箱一次 (分箱边界取自 sample_rows 行的抽样), 之后每个 (horizon, fold) 的训练集
+    都是它的 subset: 直接拷贝已装箱的行, 不再重新计算分位点, 也不再转换原始浮点数据
+
+    分箱只看特征取值不看标签, 用到后面各折的数据不会泄露目标
+    """
+    params = {**params, 'bin_construct_sample_cnt': sample_rows}
+    return lgb.Dataset(X, label=np.zeros(len(X)), feature_name=feature_names, params=params,
+                       free_raw_data=True).construct()
+
+
+def _metrics(y: np.ndarray, pred: np.ndarray) -> Dict[str, float]:
+    resid = ((y - pred) ** 2).sum()
+    total = ((y - y.mean()) ** 2).sum()
+    return {
+        'r2': 1.0 - resid / total if total > 0 else np.nan,
+        'ic': np.corrcoef(y, pred)[0, 1] if len(y) > 1 and pred.std() > 0 else np.nan,
+        'hit_rate': float(np.mean(np.sign(pred) == np.sign(y))),
+    }
+
+
+def _fit_fold(train: lgb.Dataset, X_test: np.ndarray, y_test: np.ndarray, params: Dict,
+              num_boost_round: int) -> Dict:
+    started = time.perf_counter()
+    booster = lgb.train(params, train, num_boost_round=num_boost_round)
+    trained = time.perf_counter()
+    pred = booster.predict(X_test, num_threads=params.get('num_threads', 0))
+    done = time.perf_counter()
+    return {**_metrics(y_test, pred), 'train_seconds': trained - started, 'predict_seconds': done - trained}
+
+
+def walk_forward(df: pd.DataFrame, features: Optional[List[str]] = None, horizons: Sequence[int] = HORIZONS,
+                 lags: int = LAGS, lag_columns: List[str] = LAG_COLUMNS, train_bars: Optional[int] = None,
+                 test_bars: Optional[int] = None, gap: Optional[int] = None, expanding: bool = EXPANDING,
+                 params: Optional[Dict] = None, num_boost_round: int = NUM_BOOST_ROUND,
+                 fold_workers: int = FOLD_WORKERS, timer: Optional[StageTimer] = None,
+                 interval: Optional[str] = None, train_days: float = TRAIN_DAYS,
+                 test_days: float = TEST_DAYS) -> pd.DataFrame:
+    """
+    一个 symbol 的特征表上做滚动前向验证, 每个 (horizon, fold) 一行结果
+
+    features 为 None 时用全部数值列, 不含 REGISTRY.lookahead(); 显式传入前视特征时照常使用, 但给出警告
+    interval: 特征库的K线周期 (如 '1h'), 默认由时间戳推断; horizons / lags / gap 以根计,
+    train_bars / test_bars 未给出时由 train_days / test_days 按该周期换算
+
+    设计矩阵和装箱各做一次, 每个 (horizon, fold) 的训练集是装箱结果的行子集, 只换标签;
+    各折在线程池中并行训练 (LightGBM 训练时释放 GIL), 每个模型的线程数为 CPU 数 / fold_workers
+    """
+    timer = timer or StageTimer()
+    params = {**LGB_PARAMS, **(params or {})}
+    params.setdefault('num_threads', max(1, (os.cpu_count() or 1) // max(fold_workers, 1)))
+    # 前视特征 (ACOS 等按整段历史 close.max() 缩放) 的每个值都用到了测试期之后的数据
+    lookahead = set(REGISTRY.lookahead())
+    if not features:
+        features = [c for c in df.columns if c not in ('timestamp', 'symbol') and c not in lookahead
+                    and pd.api.types.is_numeric_dtype(df[c])]
+    elif lookahead.intersection(features):
+        warnings.warn(f"前视特征 {sorted(lookahead.intersection(features))} 依赖整段历史, 回测结果会偏乐观",
+                      stacklevel=2)
+    gap = max(horizons) if gap is None else gap
+
+    started = time.perf_counter()
+    X, names = design_matrix(df, features, lag_columns, lags)
+    ts = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+    step_ms = INTERVAL_MS[interval] if interval else infer_step_ms(ts)
+    train_bars = train_bars or int(train_days * DAY_MS // step_ms)
+    test_bars = test_bars or int(test_days * DAY_MS // step_ms)
+    Y = horizon_targets(ts, df['close'].to_numpy(dtype=np.float64), horizons, step_ms)
+    folds = walk_forward_folds(len(df), train_bars, test_bars, gap, expanding)
+    timer.add('design', time.perf_counter() - started)
+    if not folds:
+        return pd.DataFrame()
+
+    started = time.perf_counter()
+    binned = binned_dataset(X[:folds[-1][0].stop], names, params)
+    timer.add('bin', time.perf_counter() - started)
+
+    # 子集在主线程里依次构建, 训练时各线程只碰自己的 Dataset
+    started = time.perf_counter()
+    jobs = []
+    for j, h in enumerate(horizons):
+        for k, (train, test) in enumerate(folds):
+            rows_train = train.start + np.flatnonzero(~np.isnan(Y[train, j]))
+            rows_test = test.start + np.flatnonzero(~np.isnan(Y[test, j]))
+            if len(rows_train) == 0 or len(rows_test) == 0:
+                continue
+            dataset = binned.subset(rows_train).construct()
+            dataset.set_label(Y[rows_train, j])
+            jobs.append(({'horizon': h, 'fold': k, 'train_start': ts[train.start], 'test_start': ts[test.start],
+                          'test_end': ts[test.stop - 1], 'train_rows': len(rows_train), 'test_rows': len(rows_test)},
+                         dataset, X[rows_test], Y[rows_test, j]))
+    timer.add('dataset', time.perf_counter() - started)
+
+    with ThreadPoolExecutor(max_workers=fold_workers) as pool:
+        results = list(pool.map(lambda job: _fit_fold(job[1], job[2], job[3], params, num_boost_round), jobs))
+    rows = []
+    for (info, *_), result in zip(jobs, results):
+        timer.add('train', result['train_seconds'])
+        timer.add('predict', result['predict_seconds'])
+        rows.append({**info, **result})
+    report = pd.DataFrame(rows)
+    for col in ('train_start', 'test_start', 'test_end'):
+        report[col] = pd.to_datetime(report[col], unit='ms')
+    return report
+
+
+def run(out_root, symbols: List[str], start=None, end=None, features: Optional[List[str]] = None,
+        horizons: Sequence[int] = HORIZONS, **options) -> pd.DataFrame:
+    """多个 symbol 依次读取特征并做滚动验证, 合并结果并打印各阶段耗时"""
+    timer = StageTimer()
+    started = time.perf_counter()
+    reports = []
+    for symbol in symbols:
+        t = time.perf_counter()
+        columns = None if features is None else list(dict.fromkeys(features + ['close'] + LAG_COLUMNS))
+        df = read_feature_store(out_root, symbol, start, end, columns)
+        timer.add('load', time.perf_counter() - t)
+        report = walk_forward(df, features, horizons, timer=timer, **options)
+        if len(report):
+            reports.append(report.assign(symbol=normalize_symbol(symbol)))
+        print(f"[🚶 WalkForward] {symbol}: {len(report)} (horizon, fold) models")
+    wall = time.perf_counter() - started
+    print(f"[⏱️ WalkForward] {wall:.1f}s wall; {timer.summary()}")
+    return pd.concat(reports, ignore_index=True) if reports else pd.DataFrame()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='特征库上的 LightGBM 滚动前向验证')
+    parser.add_argument('out_root', help='build_features 的输出目录')
+    parser.add_argument('symbols', nargs='+', help='如 BTC/USDT')
+    parser.add_argument('--start', help='YYYY-MM-DD')
+    parser.add_argument('--end', help='YYYY-MM-DD (不含)')
+    parser.add_argument('--features', nargs='*', help='默认使用全部数值列, 不含前视特征 (REGISTRY.lookahead())')
+    parser.add_argument('--horizons', nargs='*', type=int, default=HORIZONS)
+    parser.add_argument('--lags', type=int, default=LAGS)
+    parser.add_argument('--interval', help='特征库的K线周期, 如 1h (默认由时间戳推断)')
+    parser.add_argument('--train-days', type=float, default=TRAIN_DAYS)
+    parser.add_argument('--test-days', type=float, default=TEST_DAYS)
+    parser.add_argument('--expanding', action='store_true')
+    parser.add_argument('--rounds', type=int, default=NUM_BOOST_ROUND)
+    parser.add_argument('--workers', type=int, default=FOLD_WORKERS)
+    parser.add_argument('--out', help='结果写入 csv')
+    args = parser.parse_args()
+    report = run(args.out_root, args.symbols, args.start, args.end, args.features, args.horizons,
+                 lags=args.lags, interval=args.interval, train_days=args.train_days, test_days=args.test_days,
+                 expanding=args.expanding, num_boost_round=args.rounds, fold_workers=args.workers)
+    if args.out:
+        report.to_csv(args.out, index=False)
+    if len(report):
+        print(report.groupby(['symbol', 'horizon'])[['r2', 'ic', 'hit_rate']].mean().to_string())
+
+
+if __name__ == "__main__":
+    main()
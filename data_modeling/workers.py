@@ -0,0 +1,18 @@
+import multiprocessing
+from typing import Sequence
+
+# Process pools start workers from a forkserver that has already imported the
+# heavy modules (pandas, pyarrow, talib, ...): each worker is a fork of that
+# warm process instead of a fresh interpreter paying the imports again, and
+# unlike plain fork it never inherits the parent's threads or large objects.
+# Falls back to spawn where forkserver is unavailable (Windows).
+
+
+def pool_context(preload: Sequence[str] = ()):
+    """multiprocessing context for ProcessPoolExecutor with `preload` imported once in the forkserver."""
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    ctx = multiprocessing.get_context('forkserver')
+    # only takes effect before the server's first start; later pools reuse the same server
+    ctx.set_forkserver_preload(list(preload))
+    return ctx